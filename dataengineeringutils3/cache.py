@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+import boto3
+import botocore
+
+from dataengineeringutils3.s3 import s3_path_to_bucket_key
+from dataengineeringutils3.storage import S3Backend, get_backend
+
+NOT_MODIFIED = ("304", "NotModified")
+
+
+class S3ObjectCache:
+    """
+    Opt-in read-through cache for small S3 objects such as config and metadata
+    files. Objects are held in memory with LRU eviction and can optionally be
+    persisted to a local folder so they survive between processes. The folder
+    can be bounded in size too, evicting the least recently used objects.
+
+    A cached object is returned without contacting S3 while it is younger than
+    ttl seconds. Once it is older than that (or straight away if ttl is None)
+    it is revalidated with a conditional GET on its ETag, which only transfers
+    the body if the object has changed.
+
+    cache = S3ObjectCache(max_items=256, ttl=60)
+    for _ in range(1000):
+        config = read_json_from_s3("s3://bucket/config.json", cache=cache)
+    print(cache.stats)
+
+    :param max_items: Maximum number of objects kept in memory (default 128)
+    :param ttl: Number of seconds an object is trusted without revalidation.
+        None (default) means revalidate on every read.
+    :param revalidate: If True (default) stale objects are revalidated with
+        IfNoneMatch. If False stale objects are always downloaded again.
+    :param cache_dir: Optional local folder used as a second cache tier
+    :param max_disk_bytes: Optional limit on the total size of the object
+        bodies in cache_dir. Objects this cache has used least recently are
+        removed to keep within it. The limit is checked against what this
+        instance has seen, so it is only exact if one cache at a time writes
+        to the folder.
+    :param s3_client: Optional boto3 s3 client to use. By default one client
+        is created for the cache when it first needs one.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 128,
+        ttl: Optional[float] = None,
+        revalidate: bool = True,
+        cache_dir: Optional[Union[Path, str]] = None,
+        max_disk_bytes: Optional[int] = None,
+        s3_client=None,
+    ):
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1")
+        if max_disk_bytes is not None and max_disk_bytes < 0:
+            raise ValueError("max_disk_bytes must not be negative")
+        self.max_items = max_items
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.max_disk_bytes = max_disk_bytes
+        self._client = s3_client
+        self._entries = OrderedDict()
+        # Size of the body of each object on disk, least recently used first
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "disk_hits": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    @property
+    def stats(self) -> dict:
+        """Return a copy of the hit/miss counters"""
+        with self._lock:
+            return dict(self._stats)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, s3_path):
+        return s3_path in self._entries
+
+    def get_object_bytes(self, s3_path: str) -> bytes:
+        """
+        Gets the body of the object at s3_path, from the cache where possible.
+        file:// and mem:// paths are read from their backend without caching.
+        :param s3_path: "s3://...."
+        :return: raw bytes of the object
+        """
+        backend = get_backend(s3_path)
+        if not isinstance(backend, S3Backend):
+            return backend.read_bytes(s3_path)
+
+        entry = self._get_entry(s3_path)
+
+        if entry is not None and self._is_fresh(entry):
+            self._count("hits")
+            return entry["body"]
+
+        bucket, key = s3_path_to_bucket_key(s3_path)
+        get_kwargs = {"Bucket": bucket, "Key": key}
+        if entry is not None and self.revalidate:
+            get_kwargs["IfNoneMatch"] = entry["etag"]
+
+        try:
+            resp = self._get_client().get_object(**get_kwargs)
+        except botocore.exceptions.ClientError as e:
+            if entry is not None and e.response["Error"]["Code"] in NOT_MODIFIED:
+                self._count("hits")
+                self._count("revalidations")
+                entry["fetched_at"] = time.time()
+                self._put_in_memory(s3_path, entry)
+                self._refresh_on_disk(s3_path, entry)
+                return entry["body"]
+            raise
+
+        self._count("misses")
+        entry = {
+            "body": resp["Body"].read(),
+            "etag": resp["ETag"],
+            "fetched_at": time.time(),
+        }
+        self._put_entry(s3_path, entry)
+        return entry["body"]
+
+    def invalidate(self, prefix: str = "") -> int:
+        """
+        Removes every cached object whose s3 path starts with prefix
+        :param prefix: "s3://...." (default "" removes everything)
+        :return: number of objects removed from the memory cache
+        """
+        with self._lock:
+            to_remove = [p for p in self._entries if p.startswith(prefix)]
+            for p in to_remove:
+                del self._entries[p]
+
+        if self.cache_dir is not None:
+            for meta_path in self.cache_dir.glob("*.json"):
+                with open(meta_path) as f:
+                    s3_path = json.load(f)["s3_path"]
+                if s3_path.startswith(prefix):
+                    self._remove_from_disk(s3_path)
+
+        return len(to_remove)
+
+    def clear(self):
+        """Removes everything from the cache"""
+        self.invalidate("")
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = boto3.client("s3")
+            return self._client
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _is_fresh(self, entry):
+        return self.ttl is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def _get_entry(self, s3_path):
+        with self._lock:
+            entry = self._entries.get(s3_path)
+            if entry is not None:
+                self._entries.move_to_end(s3_path)
+                return entry
+
+        entry = self._read_from_disk(s3_path)
+        if entry is not None:
+            self._count("disk_hits")
+            self._put_in_memory(s3_path, entry)
+        return entry
+
+    def _put_entry(self, s3_path, entry):
+        self._put_in_memory(s3_path, entry)
+        self._write_to_disk(s3_path, entry)
+
+    def _put_in_memory(self, s3_path, entry):
+        with self._lock:
+            self._entries[s3_path] = entry
+            self._entries.move_to_end(s3_path)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _disk_paths(self, s3_path):
+        name = hashlib.sha256(s3_path.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{name}.body", self.cache_dir / f"{name}.json"
+
+    def _read_from_disk(self, s3_path):
+        if self.cache_dir is None:
+            return None
+        body_path, meta_path = self._disk_paths(s3_path)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch_on_disk(s3_path, len(body))
+        return {"body": body, "etag": meta["etag"], "fetched_at": meta["fetched_at"]}
+
+    def _load_disk_index(self):
+        """Indexes the objects already in cache_dir, oldest used first"""
+        metas = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            try:
+                with open(meta_path) as f:
+                    s3_path = json.load(f)["s3_path"]
+                size = self._disk_paths(s3_path)[0].stat().st_size
+                metas.append((meta_path.stat().st_mtime, s3_path, size))
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+        for _, s3_path, size in sorted(metas):
+            self._disk_entries[s3_path] = size
+            self._disk_bytes += size
+        self._evict_from_disk()
+
+    def _touch_on_disk(self, s3_path, size):
+        """Records s3_path as the most recently used object on disk"""
+        with self._lock:
+            self._disk_bytes += size - self._disk_entries.pop(s3_path, 0)
+            self._disk_entries[s3_path] = size
+        # The meta file's mtime keeps the order for caches opened later
+        try:
+            os.utime(self._disk_paths(s3_path)[1])
+        except FileNotFoundError:
+            pass
+
+    def _evict_from_disk(self):
+        if self.max_disk_bytes is None:
+            return
+        to_remove = []
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes and self._disk_entries:
+                s3_path, size = self._disk_entries.popitem(last=False)
+                self._disk_bytes -= size
+                self._stats["disk_evictions"] += 1
+                to_remove.append(s3_path)
+        for s3_path in to_remove:
+            self._remove_from_disk(s3_path)
+
+    def _write_file(self, path, write):
+        # Write to a temporary file and rename so readers never see partial files
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _write_meta_to_disk(self, s3_path, entry):
+        if self.cache_dir is None:
+            return
+        meta = {
+            "s3_path": s3_path,
+            "etag": entry["etag"],
+            "fetched_at": entry["fetched_at"],
+        }
+        data = json.dumps(meta).encode("utf-8")
+        self._write_file(self._disk_paths(s3_path)[1], lambda f: f.write(data))
+
+    def _write_to_disk(self, s3_path, entry):
+        if self.cache_dir is None:
+            return
+        body = entry["body"]
+        self._write_file(self._disk_paths(s3_path)[0], lambda f: f.write(body))
+        self._write_meta_to_disk(s3_path, entry)
+        self._touch_on_disk(s3_path, len(body))
+        self._evict_from_disk()
+
+    def _refresh_on_disk(self, s3_path, entry):
+        """
+        Saves a revalidated entry. Its body is unchanged, so if it is already on
+        disk only its metadata is rewritten.
+        """
+        if self.cache_dir is None:
+            return
+        with self._lock:
+            size = self._disk_entries.get(s3_path)
+        if size is None:
+            self._write_to_disk(s3_path, entry)
+        else:
+            self._write_meta_to_disk(s3_path, entry)
+            self._touch_on_disk(s3_path, size)
+
+    def _remove_from_disk(self, s3_path):
+        with self._lock:
+            self._disk_bytes -= self._disk_entries.pop(s3_path, 0)
+        for path in self._disk_paths(s3_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
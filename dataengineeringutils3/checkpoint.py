@@ -0,0 +1,226 @@
+from datetime import datetime, timezone
+from operator import itemgetter
+
+from dataengineeringutils3.db import SelectQuerySet, _column_index
+from dataengineeringutils3.incremental import _decode_watermark, _encode_watermark
+from dataengineeringutils3.json import get_row_encoder
+from dataengineeringutils3.s3 import (
+    check_for_s3_file,
+    delete_s3_object,
+    read_json_from_s3,
+    write_json_to_s3,
+)
+from dataengineeringutils3.writer import JsonNlSplitFileWriter
+
+
+class ExportCheckpoint:
+    """
+    Progress of a resumable export, stored as a json object at
+    checkpoint_path: the number of files and lines written, where they were
+    written to, and the resume key (the key of the last row written). The
+    resume key is encoded like the watermarks of S3WatermarkStore, so dates,
+    datetimes and Decimals keep their type.
+
+    :param checkpoint_path: "s3://bucket/checkpoints/table.json"
+    """
+
+    def __init__(self, checkpoint_path: str):
+        self.checkpoint_path = checkpoint_path
+
+    def get(self):
+        """
+        :return: dict with num_files, total_lines, resume_key, s3_basepath and
+            filename_prefix, or None if there is no checkpoint
+        """
+        if not check_for_s3_file(self.checkpoint_path):
+            return None
+        state = read_json_from_s3(self.checkpoint_path)
+        state["resume_key"] = _decode_watermark(state["resume_key"])
+        return state
+
+    def set(self, num_files, total_lines, resume_key, s3_basepath, filename_prefix):
+        state = {
+            "num_files": num_files,
+            "total_lines": total_lines,
+            "resume_key": _encode_watermark(resume_key),
+            "s3_basepath": s3_basepath,
+            "filename_prefix": filename_prefix,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        write_json_to_s3(state, self.checkpoint_path)
+
+    def delete(self):
+        """Deletes the checkpoint, e.g. once the export has finished"""
+        delete_s3_object(self.checkpoint_path)
+
+
+class CheckpointedJsonNlSplitFileWriter(JsonNlSplitFileWriter):
+    """
+    JsonNlSplitFileWriter that saves an ExportCheckpoint after each file is
+    written, with the key of the last row in it. If the checkpoint exists
+    when the writer is created, num_files and total_lines carry on from it,
+    so file numbering continues after the last complete file. A file written
+    after the last save (e.g. the export died before saving) is overwritten
+    when the export resumes.
+
+    key_func is called with the last item passed to write_line or write_lines
+    (the row, before any line_transform). Use it with a
+    ResumableSelectQuerySet, whose key_func gets its key column.
+
+    :param s3_basepath: The base path to the s3 location you want to write to S3://...
+    :param filename_prefix: Every written file is prefixed with this string
+    :param checkpoint: ExportCheckpoint
+    :param key_func: Function returning the resume key of a row
+    :param max_bytes: As JsonNlSplitFileWriter
+    :param chunk_size: As JsonNlSplitFileWriter
+    """
+
+    def __init__(
+        self,
+        s3_basepath,
+        filename_prefix,
+        checkpoint,
+        key_func,
+        max_bytes=1000000000,
+        chunk_size=1000,
+    ):
+        super().__init__(s3_basepath, filename_prefix, max_bytes, chunk_size)
+        self.checkpoint = checkpoint
+        self.key_func = key_func
+        self.resume_key = None
+        self._last_item = None
+        self._restore()
+
+    def _restore(self):
+        state = self.checkpoint.get()
+        if state is None:
+            return
+        if (state["s3_basepath"], state["filename_prefix"]) != (
+            self.s3_basepath,
+            self.filename_prefix,
+        ):
+            raise ValueError(
+                f"{self.checkpoint.checkpoint_path} is the checkpoint of an export "
+                f"to {state['s3_basepath']} ({state['filename_prefix']})"
+            )
+        self.num_files = state["num_files"]
+        self.total_lines = state["total_lines"]
+        self.resume_key = state["resume_key"]
+
+    def __enter__(self):
+        super().__enter__()
+        self._restore()
+        return self
+
+    def write_line(self, line):
+        self._last_item = line
+        super().write_line(line)
+
+    def write_lines(self, lines, line_transform=lambda x: x):
+        if len(lines):
+            self._last_item = lines[-1]
+        super().write_lines(lines, line_transform)
+
+    def write_to_s3(self):
+        super().write_to_s3()
+        self.resume_key = self.key_func(self._last_item)
+        self.checkpoint.set(
+            self.num_files,
+            self.total_lines,
+            self.resume_key,
+            self.s3_basepath,
+            self.filename_prefix,
+        )
+
+
+class ResumableSelectQuerySet(SelectQuerySet):
+    """
+    SelectQuerySet ordered by key_column that starts after the resume key of
+    an ExportCheckpoint, if there is one, using a keyset predicate rather than
+    re-reading the rows already exported. key_column must be unique (e.g. a
+    primary key), or rows sharing the key of the last row of a file could be
+    skipped.
+
+    :param cursor: curser object: such as cx_Oracle.connect().cursor
+    :param select_query: string: "select * from table"
+    :param key_column: Column of the query results to order and resume by
+    :param checkpoint: ExportCheckpoint
+    :param fetch_size: int: 1000
+    :param query_kwargs: kwargs: kwargs for query formatting
+    """
+
+    def __init__(
+        self,
+        cursor,
+        select_query,
+        key_column,
+        checkpoint,
+        fetch_size=1000,
+        **query_kwargs,
+    ):
+        state = checkpoint.get()
+        self.resume_key = None if state is None else state["resume_key"]
+        select_query = f"SELECT * FROM ({select_query}) resumable_query"
+        if self.resume_key is not None:
+            select_query += f" WHERE {key_column} > :resume_key"
+            query_kwargs["resume_key"] = self.resume_key
+        select_query += f" ORDER BY {key_column}"
+        super().__init__(cursor, select_query, fetch_size, **query_kwargs)
+        self.key_func = itemgetter(_column_index(self.headers, key_column))
+
+
+def resumable_export_query_to_s3(
+    cursor,
+    select_query,
+    key_column,
+    s3_basepath,
+    filename_prefix,
+    checkpoint_path,
+    fetch_size=1000,
+    line_transform=None,
+    max_bytes=1000000000,
+    chunk_size=100000,
+    **query_kwargs,
+):
+    """
+    Exports the results of select_query to gzipped json line files, saving
+    a checkpoint after each file. If the export fails, running it again with
+    the same arguments carries on after the last file that was checkpointed.
+    The checkpoint is deleted when the export completes.
+
+    resumable_export_query_to_s3(
+        con.cursor(),
+        "select * from table",
+        key_column="id",
+        s3_basepath="s3://bucket/table/",
+        filename_prefix="table",
+        checkpoint_path="s3://bucket/checkpoints/table.json",
+    )
+
+    :param line_transform: Function converting a row to a json string. Defaults
+        to a RowEncoder for the cursor's description (see
+        dataengineeringutils3.json).
+    :return: dict with num_files, total_lines and resumed_from (the resume key
+        the export started after, None if it started from the beginning)
+    """
+    checkpoint = ExportCheckpoint(checkpoint_path)
+    select_queryset = ResumableSelectQuerySet(
+        cursor, select_query, key_column, checkpoint, fetch_size, **query_kwargs
+    )
+    if line_transform is None:
+        line_transform = get_row_encoder(select_queryset).encode_row
+    with CheckpointedJsonNlSplitFileWriter(
+        s3_basepath,
+        filename_prefix,
+        checkpoint,
+        select_queryset.key_func,
+        max_bytes,
+        chunk_size,
+    ) as writer:
+        select_queryset.write_to_file(writer, line_transform, raise_error=True)
+    checkpoint.delete()
+    return {
+        "num_files": writer.num_files,
+        "total_lines": writer.total_lines,
+        "resumed_from": select_queryset.resume_key,
+    }
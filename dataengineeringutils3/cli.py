@@ -0,0 +1,251 @@
+import argparse
+import os
+import sys
+import time
+
+from pathlib import Path
+
+import botocore
+
+from dataengineeringutils3.compaction import delete_keys
+from dataengineeringutils3.concurrency import AdaptiveConcurrencyLimiter
+from dataengineeringutils3.listing import S3Listing
+from dataengineeringutils3.s3 import (
+    _add_slash,
+    _filter_objects,
+    _list_local_folder,
+    copy_s3_folder_contents_to_new_folder,
+    get_bulk_client,
+    s3_path_to_bucket_key,
+    write_local_folder_to_s3,
+    write_s3_folder_to_local,
+)
+
+DEFAULT_CLI_CONCURRENCY = 32
+DEFAULT_CLI_INITIAL_CONCURRENCY = 8
+DELETE_BATCH_SIZE = 1000
+MB = 1024 * 1024
+
+
+def _list_s3(s3_folder_path, args):
+    """
+    Lists an S3 folder with the same filtering as get_filepaths_from_s3_folder
+    :return: list of (s3_path, size) tuples
+    """
+    listing = S3Listing.from_s3(
+        s3_folder_path,
+        file_extension=args.extension,
+        exclude_zero_byte_files=args.exclude_zero_byte_files,
+    )
+    return [(listing[i], listing.size(i)) for i in range(len(listing))]
+
+
+def _plan_copy(args):
+    from_folder = _add_slash(args.source)
+    to_folder = _add_slash(args.destination)
+    return [
+        (p, p.replace(from_folder, to_folder), size)
+        for p, size in _list_s3(from_folder, args)
+    ]
+
+
+def _plan_delete(args):
+    return [(p, None, size) for p, size in _list_s3(_add_slash(args.source), args)]
+
+
+def _plan_upload(args):
+    """Same layout as write_local_folder_to_s3"""
+    return [
+        (p, os.path.join(args.destination, os.path.relpath(p, args.source)), size)
+        for p, size in _filter_objects(
+            _list_local_folder(args.source, args.include_hidden_files),
+            args.extension,
+            args.exclude_zero_byte_files,
+        )
+    ]
+
+
+def _plan_download(args):
+    """Same layout as write_s3_folder_to_local"""
+    root = Path(args.destination)
+    return [
+        (p, str(root / s3_path_to_bucket_key(p)[1]), size)
+        for p, size in _list_s3(args.source, args)
+    ]
+
+
+def _run_copy(limiter, plan, args):
+    copy_s3_folder_contents_to_new_folder(
+        args.source,
+        args.destination,
+        exclude_zero_byte_files=args.exclude_zero_byte_files,
+        limiter=limiter,
+        file_extension=args.extension,
+    )
+
+
+def _run_delete(limiter, plan, args):
+    # DeleteObjects removes up to 1000 keys per request
+    s3_client = get_bulk_client(limiter)
+    batches = []
+    for source, _, _ in plan:
+        bucket, key = s3_path_to_bucket_key(source)
+        if (
+            not batches
+            or batches[-1][0] != bucket
+            or len(batches[-1][1]) == DELETE_BATCH_SIZE
+        ):
+            batches.append((bucket, []))
+        batches[-1][1].append(key)
+    limiter.map(lambda b: delete_keys(s3_client, b[0], b[1]), batches)
+
+
+def _run_upload(limiter, plan, args):
+    write_local_folder_to_s3(
+        args.source,
+        args.destination,
+        overwrite=args.overwrite,
+        include_hidden_files=args.include_hidden_files,
+        limiter=limiter,
+        file_extension=args.extension,
+        exclude_zero_byte_files=args.exclude_zero_byte_files,
+    )
+
+
+def _run_download(limiter, plan, args):
+    write_s3_folder_to_local(
+        args.source,
+        args.destination,
+        overwrite=args.overwrite,
+        limiter=limiter,
+        file_extension=args.extension,
+        exclude_zero_byte_files=args.exclude_zero_byte_files,
+    )
+
+
+COMMANDS = {
+    "copy": (_plan_copy, _run_copy, "copied"),
+    "delete": (_plan_delete, _run_delete, "deleted"),
+    "upload": (_plan_upload, _run_upload, "uploaded"),
+    "download": (_plan_download, _run_download, "downloaded"),
+}
+
+
+def _format_summary(verb, num_objects, num_bytes, elapsed):
+    summary = f"{verb} {num_objects} objects ({num_bytes / MB:.2f} MB)"
+    if elapsed is None:
+        return summary
+    rate = elapsed or float("inf")
+    return (
+        f"{summary} in {elapsed:.2f}s: {num_objects / rate:.1f} objects/sec, "
+        f"{num_bytes / MB / rate:.2f} MB/sec"
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Return the argument parser for the command line interface"""
+    parser = argparse.ArgumentParser(
+        prog="dataengineeringutils3",
+        description="Bulk S3 operations using the dataengineeringutils3 listing "
+        "and concurrency utilities",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    commands = [
+        ("copy", "Copy the contents of an S3 folder to another S3 folder", True),
+        ("delete", "Delete the contents of an S3 folder", False),
+        ("upload", "Upload a local folder to an S3 folder", True),
+        ("download", "Download the contents of an S3 folder", True),
+    ]
+    for name, help_text, has_destination in commands:
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.add_argument("source")
+        if has_destination:
+            sub.add_argument("destination")
+        sub.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CLI_CONCURRENCY,
+            help="Maximum number of S3 requests in flight "
+            f"(default {DEFAULT_CLI_CONCURRENCY})",
+        )
+        sub.add_argument(
+            "--initial-concurrency",
+            type=int,
+            default=DEFAULT_CLI_INITIAL_CONCURRENCY,
+            help="Number of S3 requests in flight at the start, which is raised "
+            "towards --concurrency while S3 keeps up (default "
+            f"{DEFAULT_CLI_INITIAL_CONCURRENCY}, or --concurrency if lower)",
+        )
+        sub.add_argument(
+            "--extension", default=None, help="Only include files ending with this"
+        )
+        sub.add_argument(
+            "--exclude-zero-byte-files",
+            action="store_true",
+            help="Skip files of zero size",
+        )
+        sub.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print what would be done without doing it",
+        )
+        if name in ("upload", "download"):
+            sub.add_argument(
+                "--overwrite", action="store_true", help="Replace existing files"
+            )
+        if name == "upload":
+            sub.add_argument(
+                "--include-hidden-files",
+                action="store_true",
+                help="Include files whose names start with a .",
+            )
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+    Entry point of the dataengineeringutils3 console script.
+
+    dataengineeringutils3 copy s3://bucket/from/ s3://bucket/to/ --concurrency 64
+    dataengineeringutils3 delete s3://bucket/old/ --extension json --dry-run
+
+    :param argv: Arguments to parse (default sys.argv[1:])
+    :return: exit code
+    """
+    args = get_parser().parse_args(argv)
+    plan_func, run_func, verb = COMMANDS[args.command]
+
+    try:
+        plan = plan_func(args)
+        num_bytes = sum(size for _, _, size in plan)
+        if args.dry_run:
+            for source, destination, _ in plan:
+                target = "" if destination is None else f" -> {destination}"
+                print(f"{args.command} {source}{target}")
+            print(_format_summary(f"would have {verb}", len(plan), num_bytes, None))
+            return 0
+
+        limiter = AdaptiveConcurrencyLimiter(
+            initial_concurrency=min(args.initial_concurrency, args.concurrency),
+            max_concurrency=args.concurrency,
+        )
+        start = time.monotonic()
+        if plan:
+            run_func(limiter, plan, args)
+        elapsed = time.monotonic() - start
+    except (
+        botocore.exceptions.BotoCoreError,
+        botocore.exceptions.ClientError,
+        OSError,
+        ValueError,
+    ) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    print(_format_summary(verb, len(plan), num_bytes, elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
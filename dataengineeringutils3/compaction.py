@@ -0,0 +1,284 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from dataengineeringutils3.s3 import (
+    _add_slash,
+    bucket_key_to_s3_path,
+    s3_path_to_bucket_key,
+)
+from dataengineeringutils3.reader import _natural_sort_key
+
+# S3 requires every part of a multipart upload except the last to be at least 5MB
+MIN_MULTIPART_BYTES = 5 * 1024 * 1024
+DEFAULT_TARGET_BYTES = 128 * 1024 * 1024
+# UploadPartCopy copies at most 5GB per part
+MAX_COPY_PART_BYTES = 5 * 1024 * 1024 * 1024
+
+
+def _group_objects(objects, target_bytes):
+    """
+    Greedily groups (key, size) tuples, in order, into groups whose total size
+    reaches target_bytes (the final group may be smaller)
+    """
+    groups = []
+    group = []
+    group_size = 0
+    for key, size in objects:
+        group.append((key, size))
+        group_size += size
+        if group_size >= target_bytes:
+            groups.append(group)
+            group = []
+            group_size = 0
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _read_objects(s3_client, bucket, keys):
+    """Downloads and concatenates the bodies of keys"""
+    return b"".join(
+        s3_client.get_object(Bucket=bucket, Key=k)["Body"].read() for k in keys
+    )
+
+
+def _copy_ranges(size):
+    """
+    Splits an object into the fewest equal inclusive byte ranges that are each
+    within the UploadPartCopy limit of MAX_COPY_PART_BYTES
+    """
+    num_parts = -(-size // MAX_COPY_PART_BYTES)
+    part_size = -(-size // num_parts)
+    return [
+        (start, min(start + part_size, size) - 1) for start in range(0, size, part_size)
+    ]
+
+
+def _plan_parts(group):
+    """
+    Splits the (key, size) tuples of group, in order, into the parts of a
+    multipart upload. Objects of at least MIN_MULTIPART_BYTES become
+    ("copy", key, byte_range) parts copied server-side, and runs of smaller
+    objects between them become ("upload", keys) parts. A run too small to be
+    a part on its own (only the last part may be under 5MB) takes in the large
+    object after it.
+    """
+    parts = []
+    run = []
+    run_size = 0
+    for key, size in group:
+        if size >= MIN_MULTIPART_BYTES and run_size >= MIN_MULTIPART_BYTES:
+            parts.append(("upload", run))
+            run = []
+            run_size = 0
+        if size >= MIN_MULTIPART_BYTES and not run:
+            parts.extend(
+                ("copy", key, f"bytes={start}-{end}")
+                for start, end in _copy_ranges(size)
+            )
+            continue
+        run.append(key)
+        run_size += size
+        if size >= MIN_MULTIPART_BYTES:
+            parts.append(("upload", run))
+            run = []
+            run_size = 0
+    if run:
+        parts.append(("upload", run))
+    return parts
+
+
+def _write_group(s3_client, bucket, group, out_key):
+    """
+    Writes the concatenation of the objects in group, in order, to out_key.
+    Objects of at least MIN_MULTIPART_BYTES are copied server-side with
+    UploadPartCopy and the small objects between them are downloaded and
+    uploaded as parts (see _plan_parts).
+    """
+    parts = _plan_parts(group)
+    if all(part[0] == "upload" for part in parts):
+        body = _read_objects(s3_client, bucket, [k for k, _ in group])
+        s3_client.put_object(Bucket=bucket, Key=out_key, Body=body)
+        return
+
+    resp = s3_client.create_multipart_upload(Bucket=bucket, Key=out_key)
+    upload_id = resp["UploadId"]
+    part_kwargs = {"Bucket": bucket, "Key": out_key, "UploadId": upload_id}
+    try:
+        etags = []
+        for part in parts:
+            part_number = len(etags) + 1
+            if part[0] == "upload":
+                resp = s3_client.upload_part(
+                    PartNumber=part_number,
+                    Body=_read_objects(s3_client, bucket, part[1]),
+                    **part_kwargs,
+                )
+                etags.append(resp["ETag"])
+            else:
+                resp = s3_client.upload_part_copy(
+                    PartNumber=part_number,
+                    CopySource={"Bucket": bucket, "Key": part[1]},
+                    CopySourceRange=part[2],
+                    **part_kwargs,
+                )
+                etags.append(resp["CopyPartResult"]["ETag"])
+
+        s3_client.complete_multipart_upload(
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": n, "ETag": etag}
+                    for n, etag in enumerate(etags, start=1)
+                ]
+            },
+            **part_kwargs,
+        )
+    except Exception:
+        s3_client.abort_multipart_upload(**part_kwargs)
+        raise
+
+
+def delete_keys(s3_client, bucket, keys):
+    """
+    Deletes keys in batches of 1000 (the DeleteObjects limit). DeleteObjects
+    reports keys it failed to delete in its response rather than raising, so
+    these are collected and raised as an IOError once every batch is done.
+    """
+    errors = []
+    for start in range(0, len(keys), 1000):
+        end = start + 1000
+        batch = [{"Key": k} for k in keys[start:end]]
+        resp = s3_client.delete_objects(Bucket=bucket, Delete={"Objects": batch})
+        errors.extend(resp.get("Errors", []))
+    if errors:
+        failed = ", ".join(f"{e['Key']} ({e['Code']})" for e in errors[:10])
+        more = f" and {len(errors) - 10} more" if len(errors) > 10 else ""
+        raise IOError(
+            f"Failed to delete {len(errors)} objects from {bucket}: {failed}{more}"
+        )
+
+
+def _plan_outputs(
+    objects, prefix, out_prefix, existing, target_bytes, filename_prefix, file_extension
+):
+    """
+    Groups the (key, size) tuples of objects, folder by folder below prefix, and
+    names an output in the matching folder below out_prefix for each group,
+    skipping names in existing
+    :return: list of (group, output key) tuples
+    """
+    folders = {}
+    for key, size in objects:
+        subfolder = key.removeprefix(prefix).rpartition("/")[0]
+        folders.setdefault(subfolder, []).append((key, size))
+
+    plan = []
+    for subfolder, folder_objects in folders.items():
+        folder_prefix = f"{out_prefix}{subfolder}/" if subfolder else out_prefix
+        groups = _group_objects(folder_objects, target_bytes)
+        if out_prefix == prefix:
+            # A file on its own would only be renamed
+            groups = [g for g in groups if len(g) > 1]
+        n = 0
+        for group in groups:
+            while f"{folder_prefix}{filename_prefix}-{n}.{file_extension}" in existing:
+                n += 1
+            plan.append(
+                (group, f"{folder_prefix}{filename_prefix}-{n}.{file_extension}")
+            )
+            n += 1
+    return plan
+
+
+def compact_s3_folder(
+    s3_folder_path,
+    output_s3_folder_path=None,
+    filename_prefix="compacted",
+    file_extension="jsonl.gz",
+    target_bytes=DEFAULT_TARGET_BYTES,
+    delete_source=True,
+    max_workers=4,
+):
+    """
+    Compacts many small files in an S3 folder into fewer files of roughly
+    target_bytes each by concatenating them. Concatenated gzip members are
+    still a valid gzip file and concatenated json line files are still valid
+    json lines (as long as each file ends in a new line), so this works for the
+    output of the split file writers.
+
+    Files keep their order. Files of at least 5MB are combined server-side with
+    multipart UploadPartCopy, so mostly only the small files between them are
+    downloaded and re-uploaded. Files that would form an output on their own
+    are left as they are. Output files are named
+    "{filename_prefix}-{n}.{file_extension}" and never overwrite an existing
+    file. Source files S3 fails to delete are reported with an IOError.
+
+    Files are only combined with files in the same folder, so partitions like
+    "year=2024/" are compacted separately, each into the same subfolder of
+    output_s3_folder_path. If an output fails to write, the sources of the
+    outputs that were written are still deleted before the error is raised,
+    so no rows are left in both an output and its sources.
+
+    :param s3_folder_path: Folder containing the files to compact "s3://...."
+    :param output_s3_folder_path: Folder to write compacted files to
+        (defaults to s3_folder_path)
+    :param filename_prefix: Prefix of the compacted files (default "compacted")
+    :param file_extension: Only compact files with this extension, which is also
+        used for the output files. Should not be prefixed with a '.'.
+    :param target_bytes: Target size of each compacted file (default 128MB)
+    :param delete_source: If True (default) delete the files that were compacted
+    :param max_workers: Number of output files written concurrently (default 4)
+    :return: list of the compacted s3 paths that were written
+    """
+    s3_folder_path = _add_slash(s3_folder_path)
+    output_s3_folder_path = _add_slash(output_s3_folder_path or s3_folder_path)
+    bucket, prefix = s3_path_to_bucket_key(s3_folder_path)
+    out_bucket, out_prefix = s3_path_to_bucket_key(output_s3_folder_path)
+    if out_bucket != bucket:
+        raise ValueError("Compacted files must be written to the same bucket")
+
+    s3_resource = boto3.resource("s3")
+    s3_client = s3_resource.meta.client
+    s3_bucket = s3_resource.Bucket(bucket)
+    existing = {o.key: o.size for o in s3_bucket.objects.filter(Prefix=prefix)}
+    if not out_prefix.startswith(prefix):
+        existing.update(
+            {o.key: o.size for o in s3_bucket.objects.filter(Prefix=out_prefix)}
+        )
+    # Files already in an output folder below the source folder are not sources
+    nested_out_prefix = out_prefix != prefix and out_prefix.startswith(prefix)
+    objects = sorted(
+        (
+            (k, size)
+            for k, size in existing.items()
+            if k.startswith(prefix)
+            and not (nested_out_prefix and k.startswith(out_prefix))
+            and k.endswith(f".{file_extension}")
+            and size
+        ),
+        key=lambda o: _natural_sort_key(o[0]),
+    )
+    plan = _plan_outputs(
+        objects,
+        prefix,
+        out_prefix,
+        existing,
+        target_bytes,
+        filename_prefix,
+        file_extension,
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_write_group, s3_client, bucket, group, out_key)
+            for group, out_key in plan
+        ]
+    written = [p for p, future in zip(plan, futures) if future.exception() is None]
+
+    if delete_source:
+        delete_keys(s3_client, bucket, [k for group, _ in written for k, _ in group])
+    for future in futures:
+        future.result()
+
+    return [bucket_key_to_s3_path(bucket, out_key) for _, out_key in written]
@@ -0,0 +1,279 @@
+import threading
+import time
+
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import botocore
+
+from dataengineeringutils3.instrumentation import THROTTLING_ERROR_CODES
+
+CONGESTION_EXCEPTIONS = (
+    botocore.exceptions.ConnectionClosedError,
+    botocore.exceptions.ConnectTimeoutError,
+    botocore.exceptions.ReadTimeoutError,
+)
+
+TRANSIENT_ERROR_CODES = {"InternalError", "RequestTimeout", "ServiceUnavailable"}
+
+TRANSIENT_EXCEPTIONS = (
+    botocore.exceptions.ConnectionError,
+    botocore.exceptions.HTTPClientError,
+)
+
+
+class _Stopped(Exception):
+    """Raised in place of an item that map skips after an earlier error"""
+
+
+def is_throttling_error(e: Exception) -> bool:
+    """
+    Returns True if the exception is S3 asking us to slow down (503 SlowDown or
+    a throttling error code) or a connection level sign of overload
+    """
+    if isinstance(e, botocore.exceptions.ClientError):
+        code = e.response.get("Error", {}).get("Code")
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return code in THROTTLING_ERROR_CODES or status == 503
+    return isinstance(e, CONGESTION_EXCEPTIONS)
+
+
+def is_transient_error(e: Exception) -> bool:
+    """
+    Returns True if the exception is worth retrying without being a sign of
+    throttling: a 5xx or timeout error code, or a failure to connect. These are
+    the errors botocore's own retries would have handled.
+    """
+    if isinstance(e, botocore.exceptions.ClientError):
+        code = e.response.get("Error", {}).get("Code")
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in TRANSIENT_ERROR_CODES or status >= 500
+    return isinstance(e, TRANSIENT_EXCEPTIONS)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on the number of
+    concurrent S3 operations, shared by the bulk functions in
+    dataengineeringutils3.s3.
+
+    The limit grows by one each time a full limit's worth of operations
+    completes without throttling, as long as latency stays below
+    latency_tolerance times the lowest latency seen. When an operation is
+    throttled (503 SlowDown or a connection timeout) the limit is multiplied
+    by decrease_factor, at most once per cooldown seconds, and the operation
+    is retried after a backoff. Other transient errors (500 InternalError,
+    RequestTimeout, connection failures) are retried after a backoff without
+    changing the limit.
+
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=8, max_concurrency=128)
+    copy_s3_folder_contents_to_new_folder(
+        "s3://bucket/from/", "s3://bucket/to/", limiter=limiter
+    )
+    print(limiter.history)
+
+    :param initial_concurrency: Starting limit (default 8)
+    :param min_concurrency: Lowest the limit can go (default 1)
+    :param max_concurrency: Highest the limit can go, also the thread pool size
+        (default 64)
+    :param decrease_factor: Multiplier applied to the limit on throttling
+        (default 0.5)
+    :param latency_tolerance: The limit is not increased while the average
+        latency is more than this many times the lowest latency (default 3.0)
+    :param cooldown: Minimum seconds between decreases (default 1.0)
+    :param max_retries: Number of times a throttled or transiently failing
+        operation is retried before its exception is raised (default 8)
+    :param sample_interval: Seconds between the samples recorded in history
+        (default 1.0)
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 3.0,
+        cooldown: float = 1.0,
+        max_retries: int = 8,
+        sample_interval: float = 1.0,
+    ):
+        if not 1 <= min_concurrency <= initial_concurrency <= max_concurrency:
+            raise ValueError(
+                "Concurrency limits must satisfy "
+                "1 <= min_concurrency <= initial_concurrency <= max_concurrency"
+            )
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.max_retries = max_retries
+        self.sample_interval = sample_interval
+
+        self._limit = float(initial_concurrency)
+        self._in_flight = 0
+        self._successes_since_increase = 0
+        self._min_latency = None
+        self._avg_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+        self.completed = 0
+        self.throttles = 0
+        self.errors = 0
+        self.history = []
+        self._start_time = time.monotonic()
+        self._last_sample_time = self._start_time
+        self._last_sample_completed = 0
+
+    @property
+    def concurrency(self) -> int:
+        """Return the current concurrency limit"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Return the number of operations currently running"""
+        return self._in_flight
+
+    def acquire(self):
+        """Blocks until an operation can start within the current limit"""
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float = None, throttled: bool = False):
+        """
+        Marks an operation as finished and adjusts the limit
+        :param latency: Seconds the operation took (None if it failed)
+        :param throttled: Whether the operation was throttled
+        """
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttles += 1
+                self._successes_since_increase = 0
+                if now - self._last_decrease >= self.cooldown:
+                    self._limit = max(
+                        float(self.min_concurrency), self._limit * self.decrease_factor
+                    )
+                    self._last_decrease = now
+            elif latency is not None:
+                self.completed += 1
+                self._update_latency(latency)
+                self._successes_since_increase += 1
+                if (
+                    self._successes_since_increase >= int(self._limit)
+                    and self._latency_healthy()
+                ):
+                    self._limit = min(float(self.max_concurrency), self._limit + 1)
+                    self._successes_since_increase = 0
+            else:
+                self.errors += 1
+            self._maybe_sample(now)
+            self._condition.notify_all()
+
+    def _update_latency(self, latency):
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        if self._avg_latency is None:
+            self._avg_latency = latency
+        else:
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+    def _latency_healthy(self):
+        if not self._min_latency:
+            return True
+        return self._avg_latency <= self._min_latency * self.latency_tolerance
+
+    def _maybe_sample(self, now):
+        elapsed = now - self._last_sample_time
+        if elapsed < self.sample_interval:
+            return
+        done = self.completed - self._last_sample_completed
+        self.history.append(
+            {
+                "time": now - self._start_time,
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "throttles": self.throttles,
+                "throughput": done / elapsed,
+            }
+        )
+        self._last_sample_time = now
+        self._last_sample_completed = self.completed
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) within the limit, retrying with backoff if
+        it is throttled or fails with a transient error
+        """
+        return self._run(func, args, kwargs)
+
+    def _run(self, func, args, kwargs, stop=None):
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            if stop is not None and stop.is_set():
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+                raise _Stopped()
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                self.release(throttled=throttled)
+                retryable = throttled or is_transient_error(e)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                time.sleep(min(0.05 * 2**attempt, 5.0))
+            else:
+                self.release(latency=time.monotonic() - start)
+                return result
+
+    def map(self, func, iterable) -> list:
+        """
+        Calls func on each item concurrently within the limit. After the first
+        error no further items are started, and the error is raised once the
+        ones already running have finished.
+        :return: list of results in the same order as iterable
+        """
+        stop = threading.Event()
+
+        def call(item):
+            try:
+                return self._run(func, (item,), {}, stop)
+            except Exception:
+                stop.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(call, item) for item in iterable]
+            _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for f in pending:
+                f.cancel()
+        for f in futures:
+            error = None if f.cancelled() else f.exception()
+            if error is not None and not isinstance(error, _Stopped):
+                raise error
+        return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        """Return a summary of the limiter for logging and tuning"""
+        elapsed = time.monotonic() - self._start_time
+        return {
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "throttles": self.throttles,
+            "errors": self.errors,
+            "elapsed": elapsed,
+            "throughput": self.completed / elapsed if elapsed else 0.0,
+            "history": list(self.history),
+        }
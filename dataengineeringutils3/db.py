@@ -1,3 +1,306 @@
+import queue
+import threading
+import time
+
+from array import array
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+# iter_column_batches column_types values and the array typecode of each
+COLUMN_TYPECODES = {int: "q", float: "d", object: None}
+
+
+def _put_unless_stopped(q, item, stopped):
+    """
+    Puts item on the bounded queue q, giving up if the stopped event is set
+    while waiting for space (i.e. the consumer has stopped iterating)
+    :return: True if the item was put on the queue
+    """
+    while not stopped.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get_unless_stopped(q, stopped, default=None):
+    """
+    Gets the next item from q, returning default if the stopped event is set
+    while waiting for one
+    """
+    while not stopped.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return default
+
+
+def _column_typecode(values, typecode="q"):
+    """
+    Returns the narrowest array typecode that holds every value and is no
+    narrower than typecode: "q" if every value is a 64 bit int, "d" if every
+    value is a float or 64 bit int, otherwise None (python objects)
+    """
+    if typecode is None:
+        return None
+    for v in values:
+        t = type(v)
+        if t is float:
+            typecode = "d"
+        elif t is not int or not INT64_MIN <= v <= INT64_MAX:
+            return None
+    return typecode
+
+
+def _description_typecode(column):
+    """
+    Returns the typecode a column of cursor.description starts from: "d" if
+    the driver reports a non-zero scale (e.g. cx_Oracle for NUMBER(p, s) and
+    unconstrained NUMBER or FLOAT, which have scale -127), otherwise "q"
+    """
+    scale = column[5] if len(column) > 5 else None
+    return "d" if isinstance(scale, int) and scale != 0 else "q"
+
+
+def _check_typecode(values, typecode, fixed, name):
+    """
+    Returns the typecode of the column holding values, widened from typecode
+    if needed. Raises ValueError if the column's type is fixed and the values
+    do not fit it.
+    """
+    widened = _column_typecode(values, typecode)
+    if fixed and widened != typecode:
+        raise ValueError(
+            f"Column {name} has values that do not fit its fixed type, "
+            "set its type with column_types"
+        )
+    return widened
+
+
+def _to_array(rows, getter, typecode):
+    """
+    Builds an array.array column of the value getter gets from each row, or a
+    list if typecode is None. Both are allocated once at the size of the batch.
+    """
+    values = list(map(getter, rows))
+    return values if typecode is None else array(typecode, values)
+
+
+def _to_numpy(rows, getter, typecode):
+    """
+    Builds a numpy column, preallocated to the batch size. Columns without a
+    typecode are object arrays.
+    """
+    if typecode is not None:
+        dtype = np.int64 if typecode == "q" else np.float64
+        return np.fromiter(map(getter, rows), dtype=dtype, count=len(rows))
+    column = np.empty(len(rows), dtype=object)
+    column[:] = list(map(getter, rows))
+    return column
+
+
+def _arrow_type(typecode):
+    """Returns the pyarrow type of typecode, or None for python objects"""
+    return {"q": pa.int64(), "d": pa.float64()}.get(typecode)
+
+
+def _to_arrow(rows, getter, typecode):
+    """Builds a pyarrow column, typed int64 or float64 if typecode is set"""
+    return pa.array(list(map(getter, rows)), type=_arrow_type(typecode))
+
+
+def _to_arrow_batch(rows, getters, typecodes, arrow_types, names):
+    """
+    Builds a pyarrow.RecordBatch of the rows, casting each column to its type
+    in arrow_types (if not None). Casts are safe, so ValueError is raised
+    rather than e.g. truncating a float to fit an int64 column.
+    """
+    columns = []
+    for getter, typecode, arrow_type, name in zip(
+        getters, typecodes, arrow_types, names
+    ):
+        column = _to_arrow(rows, getter, typecode)
+        if arrow_type is not None and column.type != arrow_type:
+            try:
+                column = column.cast(arrow_type)
+            except pa.ArrowException as e:
+                raise ValueError(
+                    f"Column {name} does not fit its type {arrow_type}, "
+                    "set its type with column_types"
+                ) from e
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def _column_builder(output):
+    """Returns the function building the columns of iter_column_batches output"""
+    if output == "python":
+        return _to_array
+    if output == "numpy":
+        if np is None:
+            raise ImportError("numpy must be installed for numpy output")
+        return _to_numpy
+    if output == "arrow":
+        if pa is None:
+            raise ImportError("pyarrow must be installed for arrow output")
+        return _to_arrow
+    raise ValueError(f"Unknown output {output}")
+
+
+class _ChunkPrefetcher(threading.Thread):
+    """
+    Calls fetch (e.g. a cursor's fetchmany) on a background thread, putting
+    ("chunk", rows, first), ("error", exception, first) or ("done", None, first)
+    items on a queue of at most depth items
+    """
+
+    def __init__(self, fetch, depth):
+        super().__init__(daemon=True)
+        self.fetch = fetch
+        self.chunks = queue.Queue(maxsize=depth)
+        self._stopped = threading.Event()
+
+    def _put(self, item):
+        return _put_unless_stopped(self.chunks, item, self._stopped)
+
+    def run(self):
+        first = True
+        while True:
+            try:
+                results = self.fetch()
+            except Exception as e:
+                self._put(("error", e, first))
+                return
+            if not results:
+                self._put(("done", None, first))
+                return
+            if not self._put(("chunk", results, first)):
+                return
+            first = False
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _estimate_bytes(rows, sample_size=20):
+    """
+    Estimates the encoded size of a chunk of rows from the repr of a sample of
+    evenly spaced rows
+    """
+    step = max(len(rows) // sample_size, 1)
+    sample = rows[::step]
+    return sum(len(repr(row)) for row in sample) * len(rows) // len(sample)
+
+
+class AdaptiveFetchSize:
+    """
+    Chooses the number of rows fetched in each chunk of a SelectQuerySet to aim
+    for target_bytes per chunk, so narrow tables are fetched in fewer
+    round-trips and wide (e.g. CLOB heavy) tables don't fill memory.
+
+    After each fetch the size of the chunk is measured and the next fetch size
+    set to target_bytes divided by the bytes per row, within min_fetch_size and
+    max_fetch_size and at most growth_factor times the previous size. If
+    max_latency is given the fetch size is also capped so that, at the latency
+    per row just measured, a fetch takes at most that many seconds. The cursor's
+    arraysize is kept in step with the fetch size.
+
+    adaptive = AdaptiveFetchSize(target_bytes=16 * 1024 * 1024)
+    select_queryset.write_to_file(writer, transform_line, adaptive=adaptive)
+    log.info(adaptive.history)
+
+    :param target_bytes: Target encoded size of each chunk (default 8MB)
+    :param min_fetch_size: Fewest rows fetched at once (default 100)
+    :param max_fetch_size: Most rows fetched at once (default 100000)
+    :param initial_fetch_size: Rows in the first fetch (default 1000)
+    :param growth_factor: Most the fetch size can grow by in one step (default 4)
+    :param max_latency: Optional seconds a single fetch should take at most
+    :param size_func: Function returning the encoded size in bytes of a list of
+        rows. The default estimates it from the repr of a sample of rows, pass
+        e.g. lambda rows: sum(len(transform_line(r)) for r in rows) to measure
+        the real output.
+    """
+
+    def __init__(
+        self,
+        target_bytes=8 * 1024 * 1024,
+        min_fetch_size=100,
+        max_fetch_size=100000,
+        initial_fetch_size=1000,
+        growth_factor=4.0,
+        max_latency=None,
+        size_func=None,
+    ):
+        if not 1 <= min_fetch_size <= max_fetch_size:
+            raise ValueError(
+                "Fetch sizes must satisfy 1 <= min_fetch_size <= max_fetch_size"
+            )
+        self.target_bytes = target_bytes
+        self.min_fetch_size = min_fetch_size
+        self.max_fetch_size = max_fetch_size
+        self.growth_factor = growth_factor
+        self.max_latency = max_latency
+        self.size_func = size_func or _estimate_bytes
+        self.fetch_size = min(max(initial_fetch_size, min_fetch_size), max_fetch_size)
+        self.history = []
+
+    def _next_fetch_size(self, num_rows, num_bytes, latency):
+        size = self.target_bytes * num_rows / max(num_bytes, 1)
+        if self.max_latency is not None and latency > 0:
+            size = min(size, self.max_latency * num_rows / latency)
+        size = min(size, self.fetch_size * self.growth_factor)
+        return int(min(max(size, self.min_fetch_size), self.max_fetch_size))
+
+    def fetchmany(self, cursor):
+        """
+        Fetches the next chunk from cursor and adjusts the fetch size from its
+        size and latency
+        :return: list of rows
+        """
+        fetch_size = self.fetch_size
+        cursor.arraysize = fetch_size
+        start = time.perf_counter()
+        rows = cursor.fetchmany(fetch_size)
+        latency = time.perf_counter() - start
+        if not rows:
+            return rows
+
+        num_bytes = self.size_func(rows)
+        self.fetch_size = self._next_fetch_size(len(rows), num_bytes, latency)
+        self.history.append(
+            {
+                "fetch_size": fetch_size,
+                "rows": len(rows),
+                "bytes": num_bytes,
+                "latency": latency,
+            }
+        )
+        return rows
+
+    @property
+    def fetch_sizes(self) -> list:
+        """Return the fetch size used for each chunk"""
+        return [h["fetch_size"] for h in self.history]
+
+
 class SelectQuerySet:
     """
     Iterator for fetching select query results in chunks.
@@ -41,6 +344,11 @@ class SelectQuerySet:
             return json.dumps(dict(zip(column_names, row)), cls=DateTimeEncoder)
         for results in select_queryset.iter_chunks():
             writer.write_lines(results, transform_line)
+
+    # Or let RowEncoder build a faster transform from the cursor description
+    with JsonNlSplitFileWriter("s3://test/test-file.jsonl.gz") as writer:
+        encoder = get_row_encoder(select_queryset)
+        select_queryset.write_to_file(writer, encoder.encode_row)
     """
 
     def __init__(self, cursor, select_query, fetch_size=1000, **query_kwargs):
@@ -55,19 +363,42 @@ class SelectQuerySet:
         self.cursor = cursor
         self.cursor.arraysize = fetch_size
         self.fetch_size = fetch_size
-        self.cursor.execute(select_query, **query_kwargs)
+        self._execute(select_query, query_kwargs)
+
+    def _execute(self, query, params):
+        self.cursor.execute(query, **params)
 
     def __iter__(self):
         """Reset iterator and n to 0"""
         for r in self.cursor:
             yield r
 
-    def iter_chunks(self, raise_error=False):
-        results = self.cursor.fetchmany(self.fetch_size)
+    def _fetch_chunk(self, adaptive=None):
+        if adaptive is None:
+            return self.cursor.fetchmany(self.fetch_size)
+        return adaptive.fetchmany(self.cursor)
+
+    def iter_chunks(self, raise_error=False, prefetch=0, adaptive=None):
+        """
+        Yields the results in chunks of fetch_size rows
+        :param raise_error: bool: Raise errors from fetching chunks after the first
+            rather than ending the iteration (errors fetching the first chunk are
+            always raised)
+        :param prefetch: int: If greater than 0, fetch up to this many chunks ahead
+            on a background thread so the database round-trips overlap with
+            processing the chunks (default 0)
+        :param adaptive: Optional AdaptiveFetchSize which chooses the size of each
+            chunk instead of fetch_size
+        """
+        if prefetch > 0:
+            yield from self._iter_chunks_prefetch(raise_error, prefetch, adaptive)
+            return
+
+        results = self._fetch_chunk(adaptive)
         while results:
             yield results
             try:
-                results = self.cursor.fetchmany(self.fetch_size)
+                results = self._fetch_chunk(adaptive)
             except Exception as e:
                 if raise_error:
                     raise e
@@ -75,11 +406,480 @@ class SelectQuerySet:
                     results = None
                     break
 
+    def _iter_chunks_prefetch(self, raise_error, prefetch, adaptive):
+        """
+        iter_chunks with the chunks fetched ahead on a background thread. Errors
+        are passed back from the thread so they are handled as in iter_chunks.
+        """
+        fetcher = _ChunkPrefetcher(lambda: self._fetch_chunk(adaptive), prefetch)
+        fetcher.start()
+        try:
+            while True:
+                kind, value, first = fetcher.chunks.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error" and (first or raise_error):
+                    raise value
+                else:
+                    break
+        finally:
+            fetcher.stop()
+
+    def iter_column_batches(
+        self,
+        output="python",
+        raise_error=False,
+        prefetch=0,
+        adaptive=None,
+        column_types=None,
+    ):
+        """
+        Yields the results in column-oriented batches of up to fetch_size rows,
+        named from cursor.description. Each column is built straight from the
+        rows of the chunk, at the size of the chunk, rather than row by row.
+
+        Columns of ints or floats are typed, other columns hold python objects:
+        - "python": dict of column name to array.array or list
+        - "numpy": dict of column name to numpy array (requires numpy)
+        - "arrow": pyarrow.RecordBatch (requires pyarrow)
+
+        Each batch is checked so no value is truncated to fit a column's type.
+        A column starts as floats if cursor.description gives it a non-zero
+        scale (so Oracle NUMBERs are floats from the first batch), otherwise
+        as ints. For "python" and "numpy" output a column's type then only
+        widens, from int to float to python objects, so once a float (or e.g.
+        a string or None) is seen every later batch of the column has the
+        wider type. For "arrow" output every batch has the schema of the first
+        batch so the batches can be written by one pyarrow.parquet.ParquetWriter,
+        and a ValueError is raised if a later batch does not fit it.
+
+        :param output: str: "python", "numpy" or "arrow"
+        :param raise_error: bool: as for iter_chunks
+        :param prefetch: int: as for iter_chunks
+        :param adaptive: Optional AdaptiveFetchSize, as for iter_chunks
+        :param column_types: Optional dict of column name (ignoring case) to int,
+            float or object, fixing the type of the column for every batch. A
+            ValueError is raised if a value does not fit the type.
+        """
+        build = _column_builder(output)
+        names = self.headers
+        getters = [itemgetter(i) for i in range(len(names))]
+        typecodes = [_description_typecode(c) for c in self.cursor.description]
+        fixed = [False] * len(names)
+        arrow_types = [None] * len(names)
+        for name, column_type in (column_types or {}).items():
+            i = _column_index(names, name)
+            typecodes[i] = COLUMN_TYPECODES[column_type]
+            if output == "arrow":
+                arrow_types[i] = _arrow_type(typecodes[i])
+            else:
+                fixed[i] = True
+        for rows in self.iter_chunks(
+            raise_error=raise_error, prefetch=prefetch, adaptive=adaptive
+        ):
+            for i, getter in enumerate(getters):
+                typecodes[i] = _check_typecode(
+                    map(getter, rows), typecodes[i], fixed[i], names[i]
+                )
+            if output == "arrow":
+                batch = _to_arrow_batch(rows, getters, typecodes, arrow_types, names)
+                arrow_types = batch.schema.types
+                yield batch
+            else:
+                columns = [build(rows, g, t) for g, t in zip(getters, typecodes)]
+                yield dict(zip(names, columns))
+
     @property
     def headers(self):
         """Return column names"""
         return [c[0] for c in self.cursor.description]
 
+    def write_to_file(
+        self,
+        file_writer,
+        line_transform=lambda x: x,
+        raise_error=False,
+        prefetch=0,
+        adaptive=None,
+    ):
+        for results in self.iter_chunks(
+            raise_error=raise_error, prefetch=prefetch, adaptive=adaptive
+        ):
+            file_writer.write_lines(results, line_transform)
+
+
+def _column_index(headers, column):
+    """Returns the index of column in headers, ignoring case"""
+    headers = [h.lower() for h in headers]
+    try:
+        return headers.index(column.lower())
+    except ValueError:
+        raise ValueError(f"{column} is not a column of the query results") from None
+
+
+# Clauses limiting each page of a KeysetSelectQuerySet to page_size rows
+LIMIT_CLAUSES = {
+    # sqlite, PostgreSQL, MySQL
+    "limit": "LIMIT {page_size}",
+    # Oracle 12c+, PostgreSQL, SQL standard
+    "fetch_first": "FETCH FIRST {page_size} ROWS ONLY",
+}
+# Named bind parameter placeholders for each DB-API paramstyle
+PLACEHOLDERS = {
+    # cx_Oracle, sqlite3
+    "named": ":{}",
+    # psycopg2, pymysql
+    "pyformat": "%({})s",
+}
+
+
+class KeysetSelectQuerySet(SelectQuerySet):
+    """
+    SelectQuerySet that reads the results in pages of page_size rows, each
+    page a new query ordered by key_column that starts after the last key of
+    the page before:
+
+    SELECT * FROM (select_query) keyset_query WHERE key_column > :last_key
+    ORDER BY key_column LIMIT :page_size
+
+    Unlike SelectQuerySet, bind params are passed to cursor.execute as a
+    mapping, which sqlite3, psycopg2 and cx_Oracle all accept, and the page
+    params use the placeholders of paramstyle (which select_query should use
+    too).
+
+    Use it with drivers that hold the whole result of a query in memory (e.g.
+    sqlite3 or psycopg2's default cursors) so only one page is held at a time.
+    Iterating, iter_chunks, iter_column_batches and write_to_file work as they
+    do for a SelectQuerySet, with chunks of up to fetch_size rows read from
+    each page. key_column must be unique (e.g. a primary key) and should be
+    indexed, or rows sharing the key at the end of a page are skipped.
+
+    select_queryset = KeysetSelectQuerySet(
+        con.cursor(),
+        "select * from table",
+        key_column="id",
+        page_size=100000,
+    )
+    with JsonNlSplitFileWriter("s3://test/", "table") as writer:
+        select_queryset.write_to_file(writer, transform_line)
+
+    :param cursor: curser object: such as psycopg2.connect().cursor
+    :param select_query: string: "select * from table"
+    :param key_column: Unique column of the query results to page by
+    :param fetch_size: int: 1000
+    :param page_size: Number of rows in each page (defaults to fetch_size)
+    :param limit: "limit" (default) or "fetch_first", the clause used to limit
+        each page (see LIMIT_CLAUSES)
+    :param paramstyle: "named" (default, e.g. :last_key) or "pyformat" (e.g.
+        %(last_key)s, for psycopg2), the driver's paramstyle (see PLACEHOLDERS)
+    :param start_after: Only select rows with keys greater than this (default
+        None, selects every row)
+    :param query_kwargs: kwargs: kwargs for query formatting
+    """
+
+    def __init__(
+        self,
+        cursor,
+        select_query,
+        key_column,
+        fetch_size=1000,
+        page_size=None,
+        limit="limit",
+        paramstyle="named",
+        start_after=None,
+        **query_kwargs,
+    ):
+        if limit not in LIMIT_CLAUSES:
+            raise ValueError(f"limit must be one of {list(LIMIT_CLAUSES)}")
+        if paramstyle not in PLACEHOLDERS:
+            raise ValueError(f"paramstyle must be one of {list(PLACEHOLDERS)}")
+        self.key_column = key_column
+        self._placeholder = PLACEHOLDERS[paramstyle].format
+        self.page_size = fetch_size if page_size is None else page_size
+        self.last_key = start_after
+        self.pages = 0
+        self._page_rows = 0
+        self._query_kwargs = query_kwargs
+        limit_clause = LIMIT_CLAUSES[limit].format(
+            page_size=self._placeholder("page_size")
+        )
+        self._select = f"SELECT * FROM ({select_query}) keyset_query"
+        self._order_by = f" ORDER BY {key_column} {limit_clause}"
+        super().__init__(cursor, self._page_query(), fetch_size, **self._page_kwargs())
+        self.pages = 1
+        self._key_index = _column_index(self.headers, key_column)
+
+    def _execute(self, query, params):
+        self.cursor.execute(query, params)
+
+    def _page_query(self):
+        where = ""
+        if self.last_key is not None:
+            where = f" WHERE {self.key_column} > {self._placeholder('last_key')}"
+        return self._select + where + self._order_by
+
+    def _page_kwargs(self):
+        kwargs = dict(self._query_kwargs, page_size=self.page_size)
+        if self.last_key is not None:
+            kwargs["last_key"] = self.last_key
+        return kwargs
+
+    def _next_page(self):
+        self.query = self._page_query()
+        self._execute(self.query, self._page_kwargs())
+        self.pages += 1
+        self._page_rows = 0
+
+    def __iter__(self):
+        for results in self.iter_chunks(raise_error=True):
+            yield from results
+
+    def _fetch_chunk(self, adaptive=None):
+        while True:
+            rows = super()._fetch_chunk(adaptive)
+            if rows:
+                self._page_rows += len(rows)
+                self.last_key = rows[-1][self._key_index]
+                return rows
+            if self._page_rows < self.page_size:
+                # A short page is the last one
+                return rows
+            self._next_page()
+
+
+def key_range_partitions(column, min_value, max_value, num_partitions):
+    """
+    Splits the integer values min_value to max_value (inclusive) of column into
+    num_partitions contiguous ranges, e.g. of a numeric primary key
+    :return: list of (predicate, bind params) for PartitionedSelectQuerySet
+    """
+    step = -(-(max_value - min_value + 1) // num_partitions)
+    predicate = f"{column} >= :partition_lower AND {column} < :partition_upper"
+    return [
+        (predicate, {"partition_lower": lower, "partition_upper": lower + step})
+        for lower in range(min_value, max_value + 1, step)
+    ]
+
+
+def mod_partitions(column, num_partitions):
+    """
+    Splits the rows by MOD(column, num_partitions), for evenly spread integer
+    columns
+    :return: list of (predicate, bind params) for PartitionedSelectQuerySet
+    """
+    predicate = f"MOD({column}, :partition_count) = :partition_index"
+    return [
+        (predicate, {"partition_count": num_partitions, "partition_index": i})
+        for i in range(num_partitions)
+    ]
+
+
+def ora_hash_partitions(column, num_partitions):
+    """
+    Splits the rows by ORA_HASH(column, num_partitions - 1), for any Oracle
+    column type
+    :return: list of (predicate, bind params) for PartitionedSelectQuerySet
+    """
+    predicate = f"ORA_HASH({column}, {num_partitions - 1}) = :partition_index"
+    return [(predicate, {"partition_index": i}) for i in range(num_partitions)]
+
+
+class PartitionedSelectQuerySet:
+    """
+    Runs a select query as disjoint slices in parallel, each on its own
+    connection, to get past the throughput of a single database session.
+
+    Each partition is either a dict of bind params for select_query, or a
+    (predicate, bind params) tuple from key_range_partitions, mod_partitions or
+    ora_hash_partitions, in which case the query is wrapped as
+    "SELECT * FROM (select_query) WHERE predicate".
+
+    partitioned = PartitionedSelectQuerySet(
+        lambda: cx_Oracle.connect(user, password, dsn),
+        "select * from big_table",
+        ora_hash_partitions("id", 8),
+    )
+
+    # Merge the rows of every partition into one writer
+    with JsonNlSplitFileWriter("s3://test/big_table/", "big_table") as writer:
+        partitioned.write_to_file(writer, transform_line)
+
+    # Or write each partition with its own writer
+    partitioned.write_to_files(
+        lambda i: JsonNlSplitFileWriter("s3://test/big_table/", f"part-{i}"),
+        transform_line,
+    )
+
+    While running, progress holds a dict for each partition with its status
+    ("pending", "running", "done", "stopped" or "failed"), rows, chunks and
+    elapsed seconds. headers is set once the first partition has executed.
+
+    :param connection_factory: function returning a new DB-API connection. Each
+        partition's connection is closed when the partition is finished.
+    :param select_query: string: "select * from table"
+    :param partitions: list of bind param dicts or (predicate, bind params) tuples
+    :param fetch_size: int: 1000
+    :param max_workers: Number of partitions read at once (default all of them)
+    :param progress_callback: Optional function called with a partition's
+        progress dict (see progress) after each chunk and when it finishes
+    :param query_kwargs: kwargs: bind params shared by all partitions
+    """
+
+    def __init__(
+        self,
+        connection_factory,
+        select_query,
+        partitions,
+        fetch_size=1000,
+        max_workers=None,
+        progress_callback=None,
+        **query_kwargs,
+    ):
+        self.connection_factory = connection_factory
+        self.query = select_query
+        self.partitions = list(partitions)
+        self.fetch_size = fetch_size
+        self.max_workers = max_workers or len(self.partitions) or 1
+        self.progress_callback = progress_callback
+        self.query_kwargs = query_kwargs
+        self.headers = None
+        self.progress = []
+        self._lock = threading.Lock()
+
+    def _partition_query(self, partition):
+        if isinstance(partition, dict):
+            return self.query, dict(self.query_kwargs, **partition)
+        predicate, params = partition
+        query = f"SELECT * FROM ({self.query}) partitioned_query WHERE {predicate}"
+        return query, dict(self.query_kwargs, **params)
+
+    def _run_partition(self, i, handle_chunk, raise_error, stopped):
+        """
+        Runs partition i, calling handle_chunk(i, rows) on each chunk until
+        the partition is exhausted or stopped is set
+        """
+        progress = self.progress[i]
+        start = time.monotonic()
+        query, params = self._partition_query(self.partitions[i])
+        connection = self.connection_factory()
+        try:
+            qs = SelectQuerySet(connection.cursor(), query, self.fetch_size, **params)
+            with self._lock:
+                if self.headers is None:
+                    self.headers = qs.headers
+            progress["status"] = "running"
+            for rows in qs.iter_chunks(raise_error=raise_error):
+                if stopped.is_set() or handle_chunk(i, rows) is False:
+                    progress["status"] = "stopped"
+                    return
+                progress["rows"] += len(rows)
+                progress["chunks"] += 1
+                progress["elapsed"] = time.monotonic() - start
+                self._notify(progress)
+            progress["status"] = "done"
+        except Exception:
+            progress["status"] = "failed"
+            raise
+        finally:
+            progress["elapsed"] = time.monotonic() - start
+            connection.close()
+            self._notify(progress)
+
+    def _notify(self, progress):
+        if self.progress_callback is not None:
+            self.progress_callback(dict(progress))
+
+    def _reset_progress(self):
+        self.progress = [
+            {
+                "partition": i,
+                "status": "pending",
+                "rows": 0,
+                "chunks": 0,
+                "elapsed": 0.0,
+            }
+            for i in range(len(self.partitions))
+        ]
+
+    def _run_partitions(self, run):
+        """
+        Calls run(i) for every partition index on a thread pool
+        :return: list of futures in partition order
+        """
+        self._reset_progress()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [executor.submit(run, i) for i in range(len(self.partitions))]
+        executor.shutdown(wait=False)
+        return futures
+
+    def iter_chunks(self, raise_error=False):
+        """
+        Yields a (partition index, rows) tuple for each chunk of every
+        partition in the order they are fetched. At most two chunks per worker
+        are held waiting for the consumer.
+        """
+        chunks = queue.Queue(maxsize=self.max_workers * 2)
+        stopped = threading.Event()
+
+        def handle_chunk(i, rows):
+            return _put_unless_stopped(chunks, (i, rows), stopped)
+
+        def run(i):
+            try:
+                self._run_partition(i, handle_chunk, raise_error, stopped)
+            finally:
+                # Tells the consumer the partition has finished (or failed)
+                _put_unless_stopped(chunks, (i, None), stopped)
+
+        futures = self._run_partitions(run)
+        try:
+            remaining = len(futures)
+            while remaining:
+                i, rows = chunks.get()
+                if rows is None:
+                    remaining -= 1
+                    futures[i].result()
+                else:
+                    yield i, rows
+        finally:
+            stopped.set()
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
     def write_to_file(self, file_writer, line_transform=lambda x: x, raise_error=False):
-        for results in self.iter_chunks(raise_error=raise_error):
+        """Writes the rows of every partition to file_writer"""
+        for _, results in self.iter_chunks(raise_error=raise_error):
             file_writer.write_lines(results, line_transform)
+
+    def write_to_files(
+        self, writer_factory, line_transform=lambda x: x, raise_error=False
+    ):
+        """
+        Writes the rows of each partition with its own writer, on the partition's
+        thread
+        :param writer_factory: function taking the partition index and returning
+            a writer. The writers are closed once every partition has finished.
+            If a partition fails the others are stopped and the error raised
+            without closing any writer, so the rows they hold are not written
+            (files the writers had already written are left in place).
+        """
+        writers = [writer_factory(i) for i in range(len(self.partitions))]
+        stopped = threading.Event()
+
+        def handle_chunk(i, rows):
+            writers[i].write_lines(rows, line_transform)
+
+        futures = self._run_partitions(
+            lambda i: self._run_partition(i, handle_chunk, raise_error, stopped)
+        )
+        try:
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+        except BaseException:
+            stopped.set()
+            wait(futures)
+            raise
+        for writer in writers:
+            writer.close()
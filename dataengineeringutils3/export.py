@@ -0,0 +1,296 @@
+import gzip
+import os
+import queue
+import threading
+import time
+
+import boto3
+from botocore.client import Config
+
+from dataengineeringutils3.db import _get_unless_stopped, _put_unless_stopped
+from dataengineeringutils3.json import get_row_encoder
+from dataengineeringutils3.storage import S3Backend, get_backend
+
+# Put on a stage's queue (once per worker) when the stage before it has finished
+_DONE = object()
+
+
+class _StageStats:
+    """
+    Counts of the parts, rows and bytes a pipeline stage has output, with the
+    time its workers spent working and blocked waiting for space on the next
+    stage's queue
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.parts = 0
+        self.rows = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, rows, nbytes, busy_seconds):
+        with self._lock:
+            self.parts += 1
+            self.rows += rows
+            self.bytes += nbytes
+            self.busy_seconds += busy_seconds
+
+    def record_blocked(self, seconds):
+        with self._lock:
+            self.blocked_seconds += seconds
+
+    def utilisation(self, elapsed):
+        """Fraction of the elapsed time the stage's workers were busy"""
+        if not elapsed:
+            return 0.0
+        return self.busy_seconds / (self.workers * elapsed)
+
+    def to_dict(self, elapsed):
+        # The rate the stage could run at if it was never kept waiting
+        busy_per_worker = self.busy_seconds / self.workers
+        return {
+            "workers": self.workers,
+            "parts": self.parts,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "utilisation": self.utilisation(elapsed),
+            "rows_per_second": self.rows / busy_per_worker if busy_per_worker else None,
+            "mb_per_second": (
+                self.bytes / busy_per_worker / 1e6 if busy_per_worker else None
+            ),
+        }
+
+
+class ExportPipeline:
+    """
+    Exports the results of a SelectQuerySet to gzipped json line files in
+    four stages that run at the same time on their own threads: fetch chunks
+    from the cursor, encode rows to json lines, gzip, and upload. Stages are
+    connected by queues of at most queue_size parts, so a slow stage holds
+    back the ones before it rather than parts piling up in memory, and an
+    error in any stage stops the others and is raised from run.
+
+    Files are named like JsonNlSplitFileWriter's,
+    s3_basepath/filename_prefix-{n}.jsonl.gz, numbered in the order the rows
+    were fetched. The cursor is only used by the single fetch thread.
+
+    pipeline = ExportPipeline(select_queryset, "s3://bucket/table/", "table")
+    result = pipeline.run()
+    log.info(result["stages"], result["bottleneck"])
+
+    Encoding is pure python so extra encode workers only help if line_transform
+    releases the GIL; gzip and uploads do, so they benefit from more workers.
+
+    :param select_queryset: SelectQuerySet (the query is already executed)
+    :param s3_basepath: "s3://bucket/folder/", or a file:// or mem:// path
+    :param filename_prefix: Every file written is prefixed with this string
+    :param rows_per_file: Number of rows in each file (default 100000)
+    :param line_transform: Function converting a row to a json string. Defaults
+        to a RowEncoder for the cursor's description (see
+        dataengineeringutils3.json), giving dicts of column name to value.
+    :param encode_workers: Number of encode threads (default 1)
+    :param compress_workers: Number of gzip threads (default 2)
+    :param upload_workers: Number of upload threads (default 4)
+    :param queue_size: Maximum number of parts waiting between stages (default 2)
+    :param compresslevel: gzip compression level (default 9, as gzip.compress)
+    """
+
+    stage_names = ("fetch", "encode", "compress", "upload")
+
+    def __init__(
+        self,
+        select_queryset,
+        s3_basepath,
+        filename_prefix,
+        rows_per_file=100000,
+        line_transform=None,
+        encode_workers=1,
+        compress_workers=2,
+        upload_workers=4,
+        queue_size=2,
+        compresslevel=9,
+    ):
+        if rows_per_file < 1:
+            raise ValueError("rows_per_file must be at least 1")
+        self.select_queryset = select_queryset
+        self.s3_basepath = s3_basepath
+        self.filename_prefix = filename_prefix
+        self.rows_per_file = rows_per_file
+        self.line_transform = line_transform
+        self.queue_size = queue_size
+        self.compresslevel = compresslevel
+        workers = (1, encode_workers, compress_workers, upload_workers)
+        if min(workers) < 1:
+            raise ValueError("Each stage needs at least one worker")
+        self.stages = [_StageStats(n, w) for n, w in zip(self.stage_names, workers)]
+
+        self._stopped = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def get_s3_filepath(self, index):
+        fn = f"{self.filename_prefix}-{index}.jsonl.gz"
+        return os.path.join(self.s3_basepath, fn)
+
+    def _fail(self, e):
+        with self._lock:
+            if self._error is None:
+                self._error = e
+        self._stopped.set()
+
+    def _put(self, stage, q, item):
+        start = time.perf_counter()
+        put = _put_unless_stopped(q, item, self._stopped)
+        stage.record_blocked(time.perf_counter() - start)
+        return put
+
+    def _finish(self, stage, outputs, next_workers):
+        """
+        Called as each worker of stage finishes. The last one tells every
+        worker of the next stage there is nothing more to come.
+        """
+        with self._lock:
+            self._running[stage.name] -= 1
+            last = self._running[stage.name] == 0
+        if last and outputs is not None:
+            for _ in range(next_workers):
+                _put_unless_stopped(outputs, _DONE, self._stopped)
+
+    def _fetch(self, stage, outputs):
+        """Splits the chunks from the cursor into parts of rows_per_file rows"""
+        n = self.rows_per_file
+        rows = []
+        index = 0
+        busy_seconds = 0.0
+        start = time.perf_counter()
+        for chunk in self.select_queryset.iter_chunks(raise_error=True):
+            busy_seconds += time.perf_counter() - start
+            rows.extend(chunk)
+            while len(rows) >= n:
+                part, rows = rows[:n], rows[n:]
+                stage.record(len(part), 0, busy_seconds)
+                busy_seconds = 0.0
+                if not self._put(stage, outputs, (index, len(part), part)):
+                    return
+                index += 1
+            start = time.perf_counter()
+        busy_seconds += time.perf_counter() - start
+        if rows:
+            stage.record(len(rows), 0, busy_seconds)
+            self._put(stage, outputs, (index, len(rows), rows))
+
+    def _encode(self, index, rows):
+        line_transform = self.line_transform
+        if line_transform is None:
+            return self._encoder.encode_lines(rows).encode("utf-8")
+        return ("\n".join(map(line_transform, rows)) + "\n").encode("utf-8")
+
+    def _compress(self, index, data):
+        return gzip.compress(data, compresslevel=self.compresslevel)
+
+    def _upload(self, index, data):
+        self._backend.write_bytes(self.get_s3_filepath(index), data)
+        return data
+
+    def _work(self, stage, inputs, outputs, func):
+        """Applies func to the data of each part from inputs"""
+        while True:
+            item = _get_unless_stopped(inputs, self._stopped, _DONE)
+            if item is _DONE:
+                return
+            index, num_rows, data = item
+            start = time.perf_counter()
+            data = func(index, data)
+            stage.record(num_rows, len(data), time.perf_counter() - start)
+            if outputs is not None:
+                if not self._put(stage, outputs, (index, num_rows, data)):
+                    return
+
+    def _run_worker(self, i, queues):
+        stage = self.stages[i]
+        inputs = queues[i - 1] if i else None
+        outputs = queues[i] if i < len(queues) else None
+        next_workers = self.stages[i + 1].workers if outputs is not None else 0
+        try:
+            if i == 0:
+                self._fetch(stage, outputs)
+            else:
+                funcs = (self._encode, self._compress, self._upload)
+                self._work(stage, inputs, outputs, funcs[i - 1])
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._finish(stage, outputs, next_workers)
+
+    def run(self) -> dict:
+        """
+        Runs the export, raising the first error from any stage
+        :return: dict with num_files, total_lines, elapsed_seconds, stages (the
+            throughput of each stage) and bottleneck (the busiest stage)
+        """
+        if self.line_transform is None:
+            self._encoder = get_row_encoder(self.select_queryset)
+        self._backend = get_backend(self.s3_basepath)
+        if isinstance(self._backend, S3Backend):
+            # One client shared by the upload workers
+            s3_client = boto3.client(
+                "s3",
+                config=Config(max_pool_connections=self.stages[-1].workers),
+            )
+            self._backend = S3Backend(s3_client)
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            self._running[stage.name] = stage.workers
+            for _ in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._run_worker, args=(i, queues), daemon=True
+                    )
+                )
+
+        start = time.perf_counter()
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            self._stopped.set()
+        elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+        upload = self.stages[-1]
+        return {
+            "num_files": upload.parts,
+            "total_lines": upload.rows,
+            "elapsed_seconds": elapsed,
+            "stages": {s.name: s.to_dict(elapsed) for s in self.stages},
+            "bottleneck": max(self.stages, key=lambda s: s.utilisation(elapsed)).name,
+        }
+
+
+def export_query_to_s3(select_queryset, s3_basepath, filename_prefix, **kwargs):
+    """
+    Exports the results of select_queryset to gzipped json line files in
+    s3_basepath, fetching, encoding, compressing and uploading concurrently.
+    See ExportPipeline for the kwargs.
+
+    select_queryset = SelectQuerySet(con.cursor(), "select * from table", 10000)
+    result = export_query_to_s3(
+        select_queryset, "s3://bucket/table/", "table", upload_workers=8
+    )
+
+    :return: dict with num_files, total_lines, elapsed_seconds, stages (the
+        throughput of each stage) and bottleneck (the busiest stage)
+    """
+    return ExportPipeline(select_queryset, s3_basepath, filename_prefix, **kwargs).run()
@@ -0,0 +1,165 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from dataengineeringutils3.db import SelectQuerySet, _column_index
+from dataengineeringutils3.s3 import (
+    _add_slash,
+    check_for_s3_file,
+    read_json_from_s3,
+    write_json_to_s3,
+)
+
+
+def _encode_watermark(value):
+    """Converts a watermark to a json serialisable dict that keeps its type"""
+    if isinstance(value, datetime):
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {"type": "date", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"type": "decimal", "value": str(value)}
+    return {"type": None, "value": value}
+
+
+def _decode_watermark(encoded):
+    value = encoded["value"]
+    decoders = {
+        "datetime": datetime.fromisoformat,
+        "date": date.fromisoformat,
+        "decimal": Decimal,
+    }
+    decoder = decoders.get(encoded["type"])
+    return value if decoder is None else decoder(value)
+
+
+class S3WatermarkStore:
+    """
+    Stores the watermark of each incremental extract as a json object in an S3
+    folder, at s3_folder_path/name.json. Each object is replaced in a single
+    PUT, so a reader sees either the old or the new watermark. Paths can also
+    be file:// or mem:// (see dataengineeringutils3.storage).
+
+    Any object with the same get and set methods can be used as the store of
+    an IncrementalSelectQuerySet.
+
+    :param s3_folder_path: "s3://bucket/state/"
+    """
+
+    def __init__(self, s3_folder_path: str):
+        self.s3_folder_path = _add_slash(s3_folder_path)
+
+    def _s3_path(self, name):
+        return f"{self.s3_folder_path}{name}.json"
+
+    def get(self, name: str):
+        """Return the stored watermark for name, or None if there isn't one"""
+        s3_path = self._s3_path(name)
+        if not check_for_s3_file(s3_path):
+            return None
+        return _decode_watermark(read_json_from_s3(s3_path)["watermark"])
+
+    def set(self, name: str, value):
+        """Stores value as the watermark for name"""
+        state = {
+            "watermark": _encode_watermark(value),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        write_json_to_s3(state, self._s3_path(name))
+
+
+class IncrementalSelectQuerySet(SelectQuerySet):
+    """
+    SelectQuerySet that only selects rows whose watermark_column is greater
+    than the watermark stored from the last run, e.g. a last updated timestamp
+    or an increasing id. The largest watermark seen while iterating is only
+    stored when commit is called, so call it once the rows have been written
+    out; if the export fails the next run starts from the same watermark.
+
+    store = S3WatermarkStore("s3://bucket/state/")
+    select_queryset = IncrementalSelectQuerySet(
+        con.cursor(),
+        "select * from table",
+        watermark_column="last_updated",
+        store=store,
+        name="table",
+    )
+    with JsonNlSplitFileWriter("s3://bucket/table/", f"table-{run_id}") as writer:
+        select_queryset.write_to_file(writer, transform_line)
+    select_queryset.commit()
+
+    Rows are selected with watermark_column > the stored watermark, so rows
+    committed later with a watermark no larger than one already extracted are
+    missed. Give the watermark some slack (e.g. query up to a few minutes ago)
+    if that can happen.
+
+    :param cursor: curser object: such as cx_Oracle.connect().cursor
+    :param select_query: string: "select * from table"
+    :param watermark_column: Column of the query results to track
+    :param store: S3WatermarkStore or other object with get(name) and
+        set(name, value) methods
+    :param name: Name the watermark is stored under
+    :param fetch_size: int: 1000
+    :param initial_watermark: Watermark to start from when none is stored. If
+        None (default) the first run selects every row.
+    :param query_kwargs: kwargs: kwargs for query formatting
+    """
+
+    def __init__(
+        self,
+        cursor,
+        select_query,
+        watermark_column,
+        store,
+        name,
+        fetch_size=1000,
+        initial_watermark=None,
+        **query_kwargs,
+    ):
+        self.store = store
+        self.name = name
+        self.watermark_column = watermark_column
+        stored = store.get(name)
+        self.start_watermark = initial_watermark if stored is None else stored
+        self.max_watermark = self.start_watermark
+
+        if self.start_watermark is not None:
+            select_query = (
+                f"SELECT * FROM ({select_query}) incremental_query "
+                f"WHERE {watermark_column} > :last_watermark"
+            )
+            query_kwargs["last_watermark"] = self.start_watermark
+        super().__init__(cursor, select_query, fetch_size, **query_kwargs)
+
+        self._watermark_index = _column_index(self.headers, watermark_column)
+
+    def _observe(self, values):
+        values = [v for v in values if v is not None]
+        if values:
+            chunk_max = max(values)
+            if self.max_watermark is None or chunk_max > self.max_watermark:
+                self.max_watermark = chunk_max
+
+    def __iter__(self):
+        i = self._watermark_index
+        for r in super().__iter__():
+            self._observe([r[i]])
+            yield r
+
+    def iter_chunks(self, *args, **kwargs):
+        i = self._watermark_index
+        for results in super().iter_chunks(*args, **kwargs):
+            self._observe([r[i] for r in results])
+            yield results
+
+    def commit(self):
+        """
+        Stores the largest watermark seen so far, so the next run starts after
+        it. Does nothing if no new rows were seen.
+        :return: the stored watermark
+        """
+        if self.max_watermark is not None and self.max_watermark != (
+            self.start_watermark
+        ):
+            self.store.set(self.name, self.max_watermark)
+            self.start_watermark = self.max_watermark
+        return self.max_watermark
@@ -0,0 +1,215 @@
+import bisect
+import threading
+import time
+
+from contextlib import contextmanager
+
+import boto3
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+THROTTLING_ERROR_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "503",
+}
+
+_START_TIME_KEY = "dataengineeringutils3_start_time"
+
+
+def _operation_name(event_name):
+    """Gets the operation name from an event name like "after-call.s3.GetObject" """
+    return event_name.rsplit(".", 1)[-1]
+
+
+def _content_length(headers):
+    """
+    Gets the body size from http headers. Streaming uploads are sent with
+    aws-chunked encoding, where the real size is in X-Amz-Decoded-Content-Length
+    """
+    for name in ("X-Amz-Decoded-Content-Length", "Content-Length"):
+        value = headers.get(name) or headers.get(name.lower())
+        if value:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                pass
+    return 0
+
+
+class S3Stats:
+    """
+    Request level statistics for S3 API calls, collected per operation name
+    (e.g. "GetObject") from botocore event hooks. Use the s3_stats context
+    manager to collect stats for every client created by this library, or
+    call register on a specific client.
+
+    with s3_stats() as stats:
+        write_local_file_to_s3("data.json", "s3://bucket/data.json")
+    log.info(stats.to_dict())
+
+    For each operation the stats record the number of calls, failed calls,
+    retry attempts, throttled responses, request and response body bytes, and
+    a latency histogram of each call including its retries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def _get(self, operation):
+        op = self._operations.get(operation)
+        if op is None:
+            op = {
+                "requests": 0,
+                "errors": 0,
+                "attempts": 0,
+                "throttles": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "latency_ms_total": 0.0,
+                "latency_ms_max": 0.0,
+                "latency_histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+            self._operations[operation] = op
+        return op
+
+    def _on_before_call(self, context, **kwargs):
+        context[_START_TIME_KEY] = time.perf_counter()
+
+    def _on_before_send(self, request, event_name, **kwargs):
+        sent = _content_length(request.headers)
+        if not sent and isinstance(request.body, (bytes, bytearray)):
+            sent = len(request.body)
+        with self._lock:
+            self._get(_operation_name(event_name))["bytes_sent"] += sent
+
+    def _on_response_received(self, response_dict, context, event_name, **kwargs):
+        if response_dict is None:
+            received = 0
+            throttled = False
+        else:
+            received = _content_length(response_dict.get("headers", {}))
+            parsed = kwargs.get("parsed_response") or {}
+            error_code = parsed.get("Error", {}).get("Code")
+            throttled = (
+                response_dict.get("status_code") == 503
+                or error_code in THROTTLING_ERROR_CODES
+            )
+        with self._lock:
+            op = self._get(_operation_name(event_name))
+            op["attempts"] += 1
+            op["bytes_received"] += received
+            op["throttles"] += int(throttled)
+
+    def _record_call(self, event_name, context, failed):
+        start = context.get(_START_TIME_KEY)
+        latency_ms = 0.0 if start is None else (time.perf_counter() - start) * 1000
+        with self._lock:
+            op = self._get(_operation_name(event_name))
+            op["requests"] += 1
+            op["errors"] += int(failed)
+            op["latency_ms_total"] += latency_ms
+            op["latency_ms_max"] = max(op["latency_ms_max"], latency_ms)
+            op["latency_histogram"][
+                bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+            ] += 1
+
+    def _on_after_call(self, http_response, context, event_name, **kwargs):
+        self._record_call(event_name, context, http_response.status_code >= 300)
+
+    def _on_after_call_error(self, context, event_name, **kwargs):
+        self._record_call(event_name, context, True)
+
+    def _handlers(self):
+        return [
+            ("before-call.s3", self._on_before_call),
+            ("before-send.s3", self._on_before_send),
+            ("response-received.s3", self._on_response_received),
+            ("after-call.s3", self._on_after_call),
+            ("after-call-error.s3", self._on_after_call_error),
+        ]
+
+    def register(self, events):
+        """
+        Registers the stats handlers on a botocore event system, such as
+        client.meta.events or a botocore session
+        """
+        for event_name, handler in self._handlers():
+            events.register(event_name, handler)
+
+    def unregister(self, events):
+        """Removes the stats handlers from a botocore event system"""
+        for event_name, handler in self._handlers():
+            events.unregister(event_name, handler)
+
+    def reset(self):
+        """Clears all collected stats"""
+        with self._lock:
+            self._operations = {}
+
+    def to_dict(self) -> dict:
+        """
+        Return the stats as a dict of operation name to stats, suitable for
+        logging. Retries are the number of attempts beyond the first for each
+        call.
+        """
+        with self._lock:
+            out = {}
+            for name, op in sorted(self._operations.items()):
+                requests = op["requests"]
+                bucket_names = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [
+                    f">{LATENCY_BUCKETS_MS[-1]}"
+                ]
+                out[name] = {
+                    "requests": requests,
+                    "errors": op["errors"],
+                    "retries": max(op["attempts"] - requests, 0),
+                    "throttles": op["throttles"],
+                    "bytes_sent": op["bytes_sent"],
+                    "bytes_received": op["bytes_received"],
+                    "latency_ms": {
+                        "total": op["latency_ms_total"],
+                        "mean": op["latency_ms_total"] / requests if requests else 0.0,
+                        "max": op["latency_ms_max"],
+                        "histogram": dict(zip(bucket_names, op["latency_histogram"])),
+                    },
+                }
+            return out
+
+    @property
+    def total_requests(self) -> int:
+        """Return the number of S3 calls across all operations"""
+        with self._lock:
+            return sum(op["requests"] for op in self._operations.values())
+
+
+@contextmanager
+def s3_stats(session=None):
+    """
+    Collects S3Stats for every S3 client created in the context. The functions
+    in this package create their clients from the default boto3 session, so by
+    default the handlers are registered there.
+
+    botocore copies a session's handlers into each client when it is created,
+    so only clients created inside the context are instrumented: a client made
+    beforehand (such as one passed to S3Backend or AsyncS3) is not, and should
+    be registered with S3Stats.register(client.meta.events) instead. Clients
+    created inside the context keep reporting to the stats after it exits.
+    :param session: Optional boto3 Session to instrument instead of the default
+    :yields: S3Stats
+    """
+    if session is None:
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        session = boto3.DEFAULT_SESSION
+    events = session.events
+    stats = S3Stats()
+    stats.register(events)
+    try:
+        yield stats
+    finally:
+        stats.unregister(events)
@@ -0,0 +1,154 @@
+import csv
+import gzip
+import io
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+import boto3
+
+from dataengineeringutils3.s3 import (
+    _add_slash,
+    bucket_key_to_s3_path,
+    s3_path_to_bucket_key,
+)
+
+
+def _arn_to_bucket(arn):
+    """Converts "arn:aws:s3:::bucket" to "bucket" """
+    return arn.rsplit(":", 1)[-1]
+
+
+class S3InventoryListing:
+    """
+    Listing source backed by an S3 Inventory report instead of LIST requests,
+    for buckets too large to list in a reasonable time. The report's
+    manifest.json is read and its gzipped CSV data files are downloaded and
+    parsed in parallel, keeping only the objects that match the filters.
+
+    It has the same get_filepaths interface as get_filepaths_from_s3_folder, so
+    it can be passed as the listing argument of get_filepaths_from_s3_folder,
+    copy_s3_folder_contents_to_new_folder and delete_s3_folder_contents.
+
+    Inventory reports are produced daily or weekly, so the listing is only as
+    fresh as the report. Delete markers and non-current versions in versioned
+    inventories are skipped.
+
+    inventory = S3InventoryListing(
+        "s3://inventory-bucket/source-bucket/all-objects/2024-01-01T01-00Z/manifest.json"
+    )
+    delete_s3_folder_contents("s3://source-bucket/old-data/", listing=inventory)
+
+    :param manifest_s3_path: s3 path of the inventory manifest.json
+    :param max_workers: Number of data files downloaded and parsed at once
+        (default 8)
+    """
+
+    def __init__(self, manifest_s3_path: str, max_workers: int = 8):
+        self.manifest_s3_path = manifest_s3_path
+        self.max_workers = max_workers
+        self._manifest = None
+
+    @property
+    def manifest(self) -> dict:
+        """Return the parsed manifest.json"""
+        if self._manifest is None:
+            bucket, key = s3_path_to_bucket_key(self.manifest_s3_path)
+            body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+            self._manifest = json.loads(body.read())
+            file_format = self._manifest.get("fileFormat", "CSV")
+            if file_format.upper() != "CSV":
+                raise ValueError(
+                    f"Only CSV inventories are supported, got {file_format}"
+                )
+        return self._manifest
+
+    @property
+    def source_bucket(self) -> str:
+        """Return the name of the bucket the inventory describes"""
+        return self.manifest["sourceBucket"]
+
+    @property
+    def columns(self) -> list:
+        """Return the column names of the data files"""
+        return [c.strip() for c in self.manifest["fileSchema"].split(",")]
+
+    def _read_data_file(self, s3_client, data_key, prefix, match):
+        columns = self.columns
+        key_i = columns.index("Key")
+        size_i = columns.index("Size") if "Size" in columns else None
+        latest_i = columns.index("IsLatest") if "IsLatest" in columns else None
+        marker_i = (
+            columns.index("IsDeleteMarker") if "IsDeleteMarker" in columns else None
+        )
+        bucket = _arn_to_bucket(self.manifest["destinationBucket"])
+
+        body = s3_client.get_object(Bucket=bucket, Key=data_key)["Body"].read()
+        text = io.TextIOWrapper(io.BytesIO(gzip.decompress(body)), encoding="utf-8")
+        results = []
+        for row in csv.reader(text):
+            key = unquote_plus(row[key_i])
+            if not key.startswith(prefix):
+                continue
+            if latest_i is not None and row[latest_i] == "false":
+                continue
+            if marker_i is not None and row[marker_i] == "true":
+                continue
+            size = int(row[size_i]) if size_i is not None and row[size_i] else 0
+            if match(key, size):
+                results.append((key, size))
+        return results
+
+    def list_objects(
+        self,
+        s3_folder_path: str,
+        file_extension: str = None,
+        exclude_zero_byte_files: bool = True,
+        min_size: int = None,
+        max_size: int = None,
+    ) -> list:
+        """
+        Returns the objects in the inventory under s3_folder_path that match
+        the filters.
+        :param s3_folder_path: "s3://...."
+        :param file_extension: file extension, e.g. .json
+        :param exclude_zero_byte_files: Whether to filter out results of zero size
+        :param min_size: Only return objects of at least this many bytes
+        :param max_size: Only return objects of at most this many bytes
+        :return: list of (s3_path, size) tuples sorted by s3_path
+        """
+        bucket, prefix = s3_path_to_bucket_key(_add_slash(s3_folder_path))
+        if bucket != self.source_bucket:
+            raise ValueError(
+                f"The inventory is for bucket {self.source_bucket}, not {bucket}"
+            )
+        if file_extension is not None and file_extension[0] != ".":
+            file_extension = "." + file_extension
+
+        def match(key, size):
+            return (
+                (file_extension is None or key.endswith(file_extension))
+                and not (exclude_zero_byte_files and size == 0)
+                and (min_size is None or size >= min_size)
+                and (max_size is None or size <= max_size)
+            )
+
+        s3_client = boto3.client("s3")
+        data_keys = [f["key"] for f in self.manifest["files"]]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            parts = executor.map(
+                lambda k: self._read_data_file(s3_client, k, prefix, match), data_keys
+            )
+            objects = [o for part in parts for o in part]
+
+        return sorted((bucket_key_to_s3_path(bucket, k), size) for k, size in objects)
+
+    def get_filepaths(self, s3_folder_path: str, **filters) -> list:
+        """
+        Same interface as get_filepaths_from_s3_folder
+        :param s3_folder_path: "s3://...."
+        :param filters: Passed to list_objects
+        :return: A sorted list of full s3 paths
+        """
+        return [p for p, _ in self.list_objects(s3_folder_path, **filters)]
@@ -1,4 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
 import json
 
 
@@ -17,3 +19,113 @@ class DateTimeEncoder(json.JSONEncoder):
         if isinstance(o, datetime):
             return o.isoformat()
         return json.JSONEncoder.default(self, o)
+
+
+_FLOAT_CONSTANTS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+
+def _encode_float(o):
+    r = float.__repr__(o)
+    return _FLOAT_CONSTANTS.get(r, r)
+
+
+def _encode_decimal(o):
+    # str keeps every digit, json.dumps of float(o) would round it
+    return str(o) if o.is_finite() else _encode_float(float(o))
+
+
+def _encode_isoformat(o):
+    return '"' + o.isoformat() + '"'
+
+
+def _encode_default(o):
+    return json.dumps(o, cls=DateTimeEncoder)
+
+
+class _ValueEncoders(dict):
+    """Maps the exact type of a value to a function that returns its json"""
+
+    def __missing__(self, value_type):
+        return _encode_default
+
+
+_VALUE_ENCODERS = _ValueEncoders(
+    {
+        str: encode_basestring_ascii,
+        int: int.__repr__,
+        float: _encode_float,
+        bool: lambda o: "true" if o else "false",
+        type(None): lambda o: "null",
+        datetime: _encode_isoformat,
+        date: _encode_isoformat,
+        Decimal: _encode_decimal,
+    }
+)
+
+
+class RowEncoder:
+    """
+    Converts query result rows (tuples) to json strings. The json for the
+    column names is built once and a function specialised to the number of
+    columns is compiled, so each row is encoded without building a dict or
+    walking it with json.dumps. The output is the same as
+    json.dumps(dict(zip(headers, row)), cls=DateTimeEncoder) but dates and
+    Decimals are also written, as iso format strings and numbers.
+
+    encoder = RowEncoder(select_queryset.cursor.description)
+    with JsonNlSplitFileWriter("s3://test/test-file.jsonl.gz") as writer:
+        for results in select_queryset.iter_chunks():
+            writer.write_lines(results, encoder.encode_row)
+
+    :param description: cursor.description, or a list of column names
+    """
+
+    def __init__(self, description):
+        self.headers = [c if isinstance(c, str) else c[0] for c in description]
+        # Like a dict, a repeated column name keeps its first position and
+        # its last value
+        last_index = {name: i for i, name in enumerate(self.headers)}
+        self._indexes = list(last_index.values())
+        self._template = self._build_template(list(last_index))
+        self.encode_row = self._compile()
+
+    @staticmethod
+    def _build_template(names):
+        fragments = [json.dumps(name).replace("%", "%%") + ": %s" for name in names]
+        return "{" + ", ".join(fragments) + "}"
+
+    def _compile(self):
+        if not self._indexes:
+            return lambda row: "{}"
+        values = [f"row[{i}]" for i in self._indexes]
+        args = ", ".join(f"_e[type(v{i})](v{i})" for i in range(len(values)))
+        source = (
+            "def encode_row(row):\n"
+            f"    {', '.join(f'v{i}' for i in range(len(values)))}, = "
+            f"{', '.join(values)},\n"
+            f"    return _t % ({args},)\n"
+        )
+        namespace = {"_e": _VALUE_ENCODERS, "_t": self._template}
+        exec(source, namespace)
+        return namespace["encode_row"]
+
+    def __call__(self, row) -> str:
+        return self.encode_row(row)
+
+    def encode_rows(self, rows) -> list:
+        """Returns a json string for each row"""
+        return list(map(self.encode_row, rows))
+
+    def encode_lines(self, rows) -> str:
+        """Returns the rows as json lines, each ending in a newline"""
+        if not rows:
+            return ""
+        return "\n".join(map(self.encode_row, rows)) + "\n"
+
+
+def get_row_encoder(cursor) -> RowEncoder:
+    """
+    Returns a RowEncoder for the results of the query executed by cursor
+    :param cursor: DB-API cursor, or a SelectQuerySet
+    """
+    return RowEncoder(getattr(cursor, "cursor", cursor).description)
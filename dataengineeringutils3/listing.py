@@ -0,0 +1,633 @@
+import heapq
+import re
+import sqlite3
+import time
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Optional, Union
+
+import boto3
+
+from dataengineeringutils3.s3 import (
+    _add_slash,
+    bucket_key_to_s3_path,
+    s3_path_to_bucket_key,
+)
+
+# Number of keys S3Listing.sorted materialises at once
+SORT_CHUNK_SIZE = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified REAL,
+    PRIMARY KEY (bucket, key)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    last_key TEXT,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (bucket, prefix)
+);
+"""
+
+
+def _prefix_clause(column, prefix):
+    """
+    Returns an sql clause matching values of column that start with prefix, and
+    its params. Unlike LIKE, which ignores the case of ASCII letters, it is case
+    sensitive as S3 keys are, and it can use the index on column.
+    """
+    if not prefix:
+        return "1", []
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return f"{column} >= ? AND {column} < ?", [prefix, upper]
+
+
+def _to_timestamp(dt):
+    return dt.timestamp() if isinstance(dt, datetime) else dt
+
+
+class S3ListingIndex:
+    """
+    Persistent local snapshot of S3 listings stored in a SQLite file. Listing a
+    prefix once records the key, size, ETag and last modified time of every
+    object, after which repeated queries with different filters are answered
+    locally instead of relisting the prefix.
+
+    A snapshot is relisted from scratch once it is older than ttl seconds.
+    Calling refresh with incremental=True only lists keys after the last key
+    seen (using StartAfter), which is cheap for append-only prefixes such as the
+    output of the split file writers but will not notice deleted or replaced
+    objects.
+
+    index = S3ListingIndex("listing.db", ttl=3600)
+    json_files = index.get_filepaths("s3://bucket/data/", file_extension="json")
+    big_files = index.get_filepaths("s3://bucket/data/", min_size=10 ** 6)
+
+    :param db_path: Path to the SQLite file (created if it does not exist)
+    :param ttl: Number of seconds before a snapshot is considered stale
+        (default 3600). None means snapshots never go stale.
+    """
+
+    def __init__(self, db_path: Union[Path, str], ttl: Optional[float] = 3600):
+        self.db_path = str(db_path)
+        self.ttl = ttl
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _get_snapshot(self, con, bucket, prefix):
+        """
+        Returns the (prefix, last_key, refreshed_at) of the snapshot covering
+        prefix, preferring the most recently refreshed one
+        """
+        rows = con.execute(
+            "SELECT prefix, last_key, refreshed_at FROM snapshots WHERE bucket = ?"
+            " ORDER BY refreshed_at DESC",
+            (bucket,),
+        ).fetchall()
+        for row in rows:
+            if prefix.startswith(row[0]):
+                return row
+        return None
+
+    def is_stale(self, s3_folder_path: str) -> bool:
+        """
+        Returns True if there is no fresh snapshot covering s3_folder_path
+        :param s3_folder_path: "s3://...."
+        """
+        bucket, prefix = s3_path_to_bucket_key(_add_slash(s3_folder_path))
+        with closing(self._connect()) as con:
+            snapshot = self._get_snapshot(con, bucket, prefix)
+        if snapshot is None:
+            return True
+        return self.ttl is not None and time.time() - snapshot[2] >= self.ttl
+
+    def refresh(self, s3_folder_path: str, incremental: bool = False) -> int:
+        """
+        Lists s3_folder_path and records the objects in the index.
+        :param s3_folder_path: "s3://...."
+        :param incremental: If True and a snapshot of this folder exists, only
+            list keys after the last key recorded. If False (default) the
+            snapshot is replaced.
+        :return: Number of objects added or updated
+        """
+        bucket, prefix = s3_path_to_bucket_key(_add_slash(s3_folder_path))
+        paginator = boto3.client("s3").get_paginator("list_objects_v2")
+
+        with closing(self._connect()) as con, con:
+            row = con.execute(
+                "SELECT last_key FROM snapshots WHERE bucket = ? AND prefix = ?",
+                (bucket, prefix),
+            ).fetchone()
+            list_kwargs = {"Bucket": bucket, "Prefix": prefix}
+            if incremental and row is not None and row[0]:
+                list_kwargs["StartAfter"] = row[0]
+            elif not incremental or row is None:
+                clause, params = _prefix_clause("key", prefix)
+                con.execute(
+                    f"DELETE FROM objects WHERE bucket = ? AND {clause}",
+                    [bucket] + params,
+                )
+
+            count = 0
+            last_key = row[0] if row is not None and incremental else None
+            for page in paginator.paginate(**list_kwargs):
+                contents = page.get("Contents", [])
+                con.executemany(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            bucket,
+                            o["Key"],
+                            o["Size"],
+                            o.get("ETag"),
+                            _to_timestamp(o.get("LastModified")),
+                        )
+                        for o in contents
+                    ],
+                )
+                if contents:
+                    last_key = contents[-1]["Key"]
+                count += len(contents)
+
+            con.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                (bucket, prefix, last_key, time.time()),
+            )
+        return count
+
+    def invalidate(self, s3_folder_path: str = None):
+        """
+        Removes snapshots (and their objects) under s3_folder_path, or every
+        snapshot if s3_folder_path is None
+        """
+        with closing(self._connect()) as con, con:
+            if s3_folder_path is None:
+                con.execute("DELETE FROM objects")
+                con.execute("DELETE FROM snapshots")
+                return
+            bucket, prefix = s3_path_to_bucket_key(_add_slash(s3_folder_path))
+            for table, column in (("objects", "key"), ("snapshots", "prefix")):
+                clause, params = _prefix_clause(column, prefix)
+                con.execute(
+                    f"DELETE FROM {table} WHERE bucket = ? AND {clause}",
+                    [bucket] + params,
+                )
+
+    def list_objects(
+        self,
+        s3_folder_path: str,
+        file_extension: str = None,
+        exclude_zero_byte_files: bool = True,
+        glob: str = None,
+        min_size: int = None,
+        max_size: int = None,
+        modified_after: Union[datetime, float] = None,
+        modified_before: Union[datetime, float] = None,
+    ) -> list:
+        """
+        Returns the objects in s3_folder_path matching the filters, refreshing
+        the snapshot first if it is stale.
+        :param s3_folder_path: "s3://...."
+        :param file_extension: file extension, e.g. .json
+        :param exclude_zero_byte_files: Whether to filter out results of zero size
+        :param glob: Unix style pattern matched against the key relative to
+            s3_folder_path, e.g. "year=2024/*.jsonl.gz". Note * also matches "/".
+        :param min_size: Only return objects of at least this many bytes
+        :param max_size: Only return objects of at most this many bytes
+        :param modified_after: Only return objects modified at or after this
+            datetime (or epoch timestamp)
+        :param modified_before: Only return objects modified before this
+            datetime (or epoch timestamp)
+        :return: list of dicts with s3_path, size, etag and last_modified keys,
+            sorted by s3_path
+        """
+        s3_folder_path = _add_slash(s3_folder_path)
+        if self.is_stale(s3_folder_path):
+            self.refresh(s3_folder_path)
+
+        bucket, prefix = s3_path_to_bucket_key(s3_folder_path)
+        prefix_clause, params = _prefix_clause("key", prefix)
+        clauses = ["bucket = ?", prefix_clause]
+        params = [bucket] + params
+
+        if file_extension is not None:
+            if file_extension[0] != ".":
+                file_extension = "." + file_extension
+            clauses.append("substr(key, ?) = ?")
+            params.extend([-len(file_extension), file_extension])
+        if exclude_zero_byte_files:
+            clauses.append("size != 0")
+        if glob is not None:
+            clauses.append("substr(key, ?) GLOB ?")
+            params.extend([len(prefix) + 1, glob])
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("size <= ?")
+            params.append(max_size)
+        if modified_after is not None:
+            clauses.append("last_modified >= ?")
+            params.append(_to_timestamp(modified_after))
+        if modified_before is not None:
+            clauses.append("last_modified < ?")
+            params.append(_to_timestamp(modified_before))
+
+        query = (
+            "SELECT key, size, etag, last_modified FROM objects WHERE "
+            + " AND ".join(clauses)
+            + " ORDER BY key"
+        )
+        with closing(self._connect()) as con:
+            rows = con.execute(query, params).fetchall()
+
+        return [
+            {
+                "s3_path": bucket_key_to_s3_path(bucket, key),
+                "size": size,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+            for key, size, etag, last_modified in rows
+        ]
+
+    def get_filepaths(self, s3_folder_path: str, **filters) -> list:
+        """
+        Same as list_objects but only returns the s3 paths, so it can be used in
+        place of get_filepaths_from_s3_folder.
+        :param s3_folder_path: "s3://...."
+        :param filters: Passed to list_objects
+        :return: A sorted list of full s3 paths
+        """
+        return [o["s3_path"] for o in self.list_objects(s3_folder_path, **filters)]
+
+
+def _has_wildcard(segment):
+    return any(c in segment for c in "*?[")
+
+
+def _literal_head(segment):
+    """Returns the part of a pattern segment before its first wildcard"""
+    match = re.search(r"[*?\[]", segment)
+    return segment if match is None else segment[: match.start()]
+
+
+def _glob_to_regex(pattern):
+    """
+    Translates an S3 key glob into a regex. "*" and "?" do not match "/",
+    "**" matches any number of folders and "[...]" is a character class.
+    """
+    tokens = re.findall(r"\*\*/?|\*|\?|\[[^\]]*\]|[^*?\[]+|\[", pattern)
+    out = []
+    for t in tokens:
+        if t == "**/":
+            out.append("(?:.*/)?")
+        elif t == "**":
+            out.append(".*")
+        elif t == "*":
+            out.append("[^/]*")
+        elif t == "?":
+            out.append("[^/]")
+        elif t.startswith("[") and t.endswith("]") and len(t) > 2:
+            out.append("[^" + t[2:-1] + "]" if t[1] == "!" else t)
+        else:
+            out.append(re.escape(t))
+    return re.compile("".join(out) + r"\Z")
+
+
+def _list_prefix(s3_client, bucket, prefix, delimiter):
+    """
+    Lists prefix and returns (common_prefixes, objects), where objects is a
+    list of (key, size) tuples
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    common_prefixes = []
+    objects = []
+    for page in paginator.paginate(**kwargs):
+        common_prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+        objects.extend((o["Key"], o["Size"]) for o in page.get("Contents", []))
+    return common_prefixes, objects
+
+
+def get_filepaths_from_s3_pattern(
+    s3_pattern, exclude_zero_byte_files=True, regex=None, max_workers=10
+):
+    """
+    Get a list of filepaths matching a glob pattern such as
+    "s3://bucket/data/year=2024/month=*/part-*.jsonl.gz".
+
+    Rather than listing everything under "data/" and filtering, only the longest
+    literal prefix is listed. Each folder level containing a wildcard is
+    expanded with a delimiter listing of the folders that already matched, and
+    these listings are made concurrently. "*" and "?" match within a folder
+    level only and "**" matches any number of folders (anything after "**" is
+    filtered from a full listing of the folder it appears in).
+
+    :param s3_pattern: "s3://...." glob pattern
+    :param exclude_zero_byte_files: Whether to filter out results of zero size: True
+    :param regex: Optional regular expression that full s3 paths must also match
+        (using re.search)
+    :param max_workers: Maximum number of concurrent LIST requests (default 10)
+    :return: A sorted list of full s3 paths matching the pattern
+    """
+    bucket, key_pattern = s3_path_to_bucket_key(s3_pattern)
+    key_regex = _glob_to_regex(key_pattern)
+    segments = key_pattern.split("/")
+    s3_client = boto3.client("s3")
+
+    level = 0
+    while level < len(segments) - 1 and not _has_wildcard(segments[level]):
+        level += 1
+    prefixes = ["".join(s + "/" for s in segments[:level])]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def list_all(prefixes, delimiter):
+            return executor.map(
+                lambda p: _list_prefix(s3_client, bucket, p, delimiter), prefixes
+            )
+
+        # Expand each folder level down to the final file name segment
+        while level < len(segments) - 1 and "**" not in segments[level]:
+            segment = segments[level]
+            if _has_wildcard(segment):
+                head = _literal_head(segment)
+                listed = list_all([p + head for p in prefixes], "/")
+                prefixes = [
+                    cp
+                    for p, (common_prefixes, _) in zip(prefixes, listed)
+                    for cp in common_prefixes
+                    if fnmatchcase(cp[:-1].rsplit("/", 1)[-1], segment)
+                ]
+            else:
+                prefixes = [p + segment + "/" for p in prefixes]
+            level += 1
+
+        # "**" needs a full listing, otherwise only the final level is listed
+        recursive = any("**" in s for s in segments[level:])
+        head = "" if recursive else _literal_head(segments[level])
+        listed = list_all([p + head for p in prefixes], None if recursive else "/")
+        objects = [o for _, objs in listed for o in objs]
+
+    paths = [
+        bucket_key_to_s3_path(bucket, key)
+        for key, size in objects
+        if key_regex.match(key) and not (exclude_zero_byte_files and size == 0)
+    ]
+    if regex is not None:
+        paths = [p for p in paths if re.search(regex, p)]
+    return sorted(set(paths))
+
+
+class S3Listing:
+    """
+    Compact columnar listing of the objects in an S3 folder, for listings of
+    millions of keys. All keys are stored once as utf-8 in a single bytearray
+    with an array of offsets, and sizes and last modified timestamps are held
+    in typed arrays, so no Python object is kept per key. s3 paths are only
+    built when they are asked for.
+
+    Filtering scans the columns in place. Listings read from S3 are already in
+    key order, which lets difference merge two listings in a single pass.
+
+    listing = S3Listing.from_s3("s3://bucket/data/")
+    new_files = listing.filter_extension("jsonl.gz").difference(
+        S3Listing.from_s3("s3://bucket/processed/").replace_prefix(
+            "processed/", "data/"
+        )
+    )
+    for s3_path in new_files:
+        ...
+
+    :param bucket: The bucket the keys belong to
+    """
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self._blob = bytearray()
+        self._offsets = array("Q", [0])
+        self._sizes = array("q")
+        self._last_modified = array("d")
+        self._is_sorted = True
+
+    @classmethod
+    def from_s3(
+        cls, s3_folder_path: str, file_extension=None, exclude_zero_byte_files=True
+    ):
+        """
+        Lists an S3 folder into an S3Listing. Takes the same arguments as
+        get_filepaths_from_s3_folder.
+        :param s3_folder_path: "s3://...."
+        :param file_extension: file extension, e.g. .json
+        :param exclude_zero_byte_files: Whether to filter out results of zero size
+        :return: S3Listing in key order
+        """
+        if file_extension is not None and file_extension[0] != ".":
+            file_extension = "." + file_extension
+        bucket, prefix = s3_path_to_bucket_key(_add_slash(s3_folder_path))
+        listing = cls(bucket)
+        paginator = boto3.client("s3").get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for o in page.get("Contents", []):
+                if exclude_zero_byte_files and o["Size"] == 0:
+                    continue
+                if file_extension is not None and not o["Key"].endswith(file_extension):
+                    continue
+                listing.append(o["Key"], o["Size"], o.get("LastModified"))
+        return listing
+
+    def append(self, key: str, size: int = 0, last_modified=None):
+        """
+        Adds an object to the listing
+        :param key: The object key (without the bucket)
+        :param size: Size of the object in bytes
+        :param last_modified: datetime or epoch timestamp (None if unknown)
+        """
+        key_bytes = key.encode("utf-8")
+        if self._is_sorted and len(self):
+            self._is_sorted = self._key_bytes(len(self) - 1) <= key_bytes
+        self._blob += key_bytes
+        self._offsets.append(len(self._blob))
+        self._sizes.append(size)
+        ts = _to_timestamp(last_modified)
+        self._last_modified.append(float("nan") if ts is None else ts)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getitem__(self, i) -> str:
+        return bucket_key_to_s3_path(self.bucket, self.key(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _key_bytes(self, i):
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._blob[start:end])
+
+    def key(self, i) -> str:
+        """Return the key of the ith object"""
+        return self._key_bytes(i).decode("utf-8")
+
+    def size(self, i) -> int:
+        """Return the size in bytes of the ith object"""
+        return self._sizes[i]
+
+    def last_modified(self, i) -> float:
+        """Return the last modified timestamp of the ith object (nan if unknown)"""
+        return self._last_modified[i]
+
+    @property
+    def is_sorted(self) -> bool:
+        """Return True if the keys are in order"""
+        return self._is_sorted
+
+    @property
+    def nbytes(self) -> int:
+        """Return the approximate memory used by the columns"""
+        return (
+            len(self._blob)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._sizes.itemsize * len(self._sizes)
+            + self._last_modified.itemsize * len(self._last_modified)
+        )
+
+    @property
+    def total_size(self) -> int:
+        """Return the total size in bytes of the objects in the listing"""
+        return sum(self._sizes)
+
+    def _take(self, indices):
+        """Builds a new listing from the objects at the given indices"""
+        out = S3Listing(self.bucket)
+        blob = self._blob
+        offsets = self._offsets
+        for i in indices:
+            start, end = offsets[i], offsets[i + 1]
+            out._blob += blob[start:end]
+            out._offsets.append(len(out._blob))
+            out._sizes.append(self._sizes[i])
+            out._last_modified.append(self._last_modified[i])
+        out._is_sorted = self._is_sorted
+        return out
+
+    def sorted(self) -> "S3Listing":
+        """
+        Return the listing in key order. Listings read from S3 are already in
+        order and are returned as they are. Otherwise the offsets are sorted
+        in chunks of SORT_CHUNK_SIZE keys which are then merged, so at most a
+        chunk's worth of keys is materialised at once.
+        """
+        if self._is_sorted:
+            return self
+        n = len(self)
+        runs = []
+        for start in range(0, n, SORT_CHUNK_SIZE):
+            chunk = range(start, min(start + SORT_CHUNK_SIZE, n))
+            runs.append(array("Q", sorted(chunk, key=self._key_bytes)))
+        # merge holds one key from each run at a time
+        order = array("Q", heapq.merge(*runs, key=self._key_bytes))
+        out = self._take(order)
+        out._is_sorted = True
+        return out
+
+    def filter_prefix(self, prefix: str) -> "S3Listing":
+        """Return the objects whose key starts with prefix"""
+        prefix_bytes = prefix.encode("utf-8")
+        blob = self._blob
+        offsets = self._offsets
+        return self._take(
+            i
+            for i in range(len(self))
+            if blob.startswith(prefix_bytes, offsets[i], offsets[i + 1])
+        )
+
+    def filter_extension(self, file_extension: str) -> "S3Listing":
+        """Return the objects whose key ends with file_extension, e.g. .json"""
+        if file_extension[0] != ".":
+            file_extension = "." + file_extension
+        ext_bytes = file_extension.encode("utf-8")
+        blob = self._blob
+        offsets = self._offsets
+        return self._take(
+            i
+            for i in range(len(self))
+            if blob.endswith(ext_bytes, offsets[i], offsets[i + 1])
+        )
+
+    def filter_size(self, min_size: int = None, max_size: int = None) -> "S3Listing":
+        """Return the objects with min_size <= size <= max_size"""
+        sizes = self._sizes
+        return self._take(
+            i
+            for i in range(len(self))
+            if (min_size is None or sizes[i] >= min_size)
+            and (max_size is None or sizes[i] <= max_size)
+        )
+
+    def replace_prefix(self, old: str, new: str) -> "S3Listing":
+        """
+        Return the listing with old replaced by new at the start of each key
+        (keys not starting with old are dropped), e.g. to compare a copy of a
+        folder with its source
+        """
+        old_bytes = old.encode("utf-8")
+        new_bytes = new.encode("utf-8")
+        out = S3Listing(self.bucket)
+        blob = self._blob
+        offsets = self._offsets
+        for i in range(len(self)):
+            start, end = offsets[i], offsets[i + 1]
+            if blob.startswith(old_bytes, start, end):
+                out._blob += new_bytes
+                rest = start + len(old_bytes)
+                out._blob += blob[rest:end]
+                out._offsets.append(len(out._blob))
+                out._sizes.append(self._sizes[i])
+                out._last_modified.append(self._last_modified[i])
+        # Replacing a common prefix keeps the keys in the same order
+        out._is_sorted = self._is_sorted
+        return out
+
+    def difference(self, other: "S3Listing") -> "S3Listing":
+        """
+        Return the objects in this listing whose key is not in other, using a
+        single merge pass over the two sorted listings. Each key is read from
+        the buffer once and only the current key of each side is held.
+        """
+        left = self.sorted()
+        right = other.sorted()
+        right_keys = map(right._key_bytes, range(len(right)))
+
+        def keep():
+            right_key = next(right_keys, None)
+            for i in range(len(left)):
+                key = left._key_bytes(i)
+                while right_key is not None and right_key < key:
+                    right_key = next(right_keys, None)
+                if right_key != key:
+                    yield i
+
+        return left._take(keep())
+
+    def get_filepaths(self) -> list:
+        """Return the full s3 paths as a list"""
+        return list(self)
@@ -0,0 +1,249 @@
+import json
+import queue
+import threading
+import time
+
+from dataengineeringutils3.db import _get_unless_stopped, _put_unless_stopped
+from dataengineeringutils3.reader import JsonNlSplitFileReader
+
+# Put on the batch queue (once per connection) when every batch has been read
+_DONE = object()
+
+
+class JsonNlBulkLoader:
+    """
+    Loads json line files from S3, such as the parts written by
+    JsonNlSplitFileWriter or export_query_to_s3, into a database table.
+    Parts are downloaded and decoded on decode_workers threads (see
+    JsonNlSplitFileReader), each record is mapped to the parameters of
+    insert_query, and the parameters are inserted in batches of batch_size
+    with cursor.executemany on num_connections connections, each committing
+    after every commit_every batches. Batches span parts, so every batch but
+    the last has batch_size rows.
+
+    Only the I/O runs in parallel: downloads and gzip decompression overlap,
+    but json decoding and record_to_params hold the GIL, so they use one core
+    however many decode_workers there are. More decode_workers help when the
+    load waits on S3, not when it is bound by decoding.
+
+    loader = JsonNlBulkLoader(
+        lambda: cx_Oracle.connect(user, password, dsn),
+        "INSERT INTO people (id, name) VALUES (:1, :2)",
+        columns=["id", "name"],
+        batch_size=5000,
+        num_connections=4,
+    )
+    stats = loader.load("s3://bucket/people/")
+    log.info(f"Loaded {stats['rows']} rows at {stats['rows_per_second']:.0f}/s")
+
+    Batches committed before an error stay in the table, so a failed load
+    should be cleared down (or loaded into a staging table) before it is
+    retried. Uncommitted batches are rolled back.
+
+    :param connection_factory: Function returning a new DB-API connection.
+        Each connection is closed when the load finishes.
+    :param insert_query: Insert statement in the driver's paramstyle
+    :param columns: Names of the record values passed, in order, as a tuple of
+        parameters (missing values are None)
+    :param record_to_params: Function mapping a record (dict) to the parameters
+        of insert_query, instead of columns. If neither is given records are
+        passed as they are, for named parameters like :id.
+    :param batch_size: Number of rows passed to each executemany (default 1000)
+    :param commit_every: Number of batches between commits (default 10)
+    :param num_connections: Number of connections inserting at once (default 1)
+    :param decode_workers: Number of parts downloaded and decoded at once
+        (default 4)
+    :param file_extension: Only load files with this extension (default all)
+    """
+
+    def __init__(
+        self,
+        connection_factory,
+        insert_query,
+        columns=None,
+        record_to_params=None,
+        batch_size=1000,
+        commit_every=10,
+        num_connections=1,
+        decode_workers=4,
+        file_extension=None,
+    ):
+        if columns is not None and record_to_params is not None:
+            raise ValueError("Give either columns or record_to_params, not both")
+        if min(batch_size, commit_every, num_connections, decode_workers) < 1:
+            raise ValueError(
+                "batch_size, commit_every, num_connections and decode_workers "
+                "must be at least 1"
+            )
+        if columns is not None:
+            columns = list(columns)
+
+            def record_to_params(record):
+                return tuple([record.get(c) for c in columns])
+
+        self.connection_factory = connection_factory
+        self.insert_query = insert_query
+        self.record_to_params = record_to_params
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.num_connections = num_connections
+        self.decode_workers = decode_workers
+        self.file_extension = file_extension
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.rows = 0
+        self.batches = 0
+        self.commits = 0
+        self._stopped = threading.Event()
+        self._error = None
+
+    def _decode_line(self, line):
+        record = json.loads(line)
+        if self.record_to_params is None:
+            return record
+        return self.record_to_params(record)
+
+    def _fail(self, e):
+        with self._lock:
+            if self._error is None:
+                self._error = e
+        self._stopped.set()
+
+    def _count(self, rows=0, batches=0, commits=0):
+        with self._lock:
+            self.rows += rows
+            self.batches += batches
+            self.commits += commits
+
+    def _insert(self, connection, batches):
+        """Inserts batches from the queue until it is finished or stopped"""
+        cursor = connection.cursor()
+        uncommitted = 0
+        while True:
+            batch = _get_unless_stopped(batches, self._stopped, _DONE)
+            if batch is _DONE:
+                break
+            cursor.executemany(self.insert_query, batch)
+            uncommitted += 1
+            self._count(rows=len(batch), batches=1)
+            if uncommitted >= self.commit_every:
+                connection.commit()
+                uncommitted = 0
+                self._count(commits=1)
+        if self._stopped.is_set():
+            connection.rollback()
+        elif uncommitted:
+            connection.commit()
+            self._count(commits=1)
+
+    def _run_connection(self, batches):
+        try:
+            connection = self.connection_factory()
+        except Exception as e:
+            self._fail(e)
+            return
+        try:
+            self._insert(connection, batches)
+        except Exception as e:
+            self._fail(e)
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+        finally:
+            connection.close()
+
+    def _read_batches(self, reader, batches):
+        """
+        Splits the records of the parts into batches for the connections,
+        carrying the records left over from each part into the next batch
+        """
+        n = self.batch_size
+        parts = reader.iter_parts()
+        leftover = []
+        try:
+            for _, records in parts:
+                if leftover:
+                    records = leftover + records
+                full = len(records) - len(records) % n
+                for i in range(0, full, n):
+                    batch_end = i + n
+                    batch = records[i:batch_end]
+                    if not _put_unless_stopped(batches, batch, self._stopped):
+                        return
+                leftover = records[full:]
+        finally:
+            parts.close()
+        if leftover:
+            _put_unless_stopped(batches, leftover, self._stopped)
+
+    def load(self, s3_folder_path) -> dict:
+        """
+        Loads every file in s3_folder_path, raising the first error from
+        reading or inserting
+        :return: dict with files, rows, batches, commits, elapsed_seconds and
+            rows_per_second
+        """
+        self._reset()
+        # Decoding runs on the reader's threads but holds the GIL, so only
+        # the downloads and decompression overlap
+        reader = JsonNlSplitFileReader(
+            s3_folder_path,
+            file_extension=self.file_extension,
+            prefetch=self.decode_workers,
+            ordered=False,
+            line_transform=self._decode_line,
+        )
+        batches = queue.Queue(maxsize=self.num_connections * 2)
+        threads = [
+            threading.Thread(target=self._run_connection, args=(batches,), daemon=True)
+            for _ in range(self.num_connections)
+        ]
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        try:
+            self._read_batches(reader, batches)
+            for _ in threads:
+                _put_unless_stopped(batches, _DONE, self._stopped)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for t in threads:
+                t.join()
+        elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+        return {
+            "files": reader.num_files,
+            "rows": self.rows,
+            "batches": self.batches,
+            "commits": self.commits,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": self.rows / elapsed if elapsed else None,
+        }
+
+
+def load_jsonl_from_s3_to_db(
+    s3_folder_path, connection_factory, insert_query, **kwargs
+) -> dict:
+    """
+    Loads the json line files in s3_folder_path into a database table with
+    batched executemany calls. See JsonNlBulkLoader for the kwargs.
+
+    load_jsonl_from_s3_to_db(
+        "s3://bucket/people/",
+        lambda: psycopg2.connect(dsn),
+        "INSERT INTO people (id, name) VALUES (%s, %s)",
+        columns=["id", "name"],
+    )
+
+    :return: dict with files, rows, batches, commits, elapsed_seconds and
+        rows_per_second
+    """
+    loader = JsonNlBulkLoader(connection_factory, insert_query, **kwargs)
+    return loader.load(s3_folder_path)
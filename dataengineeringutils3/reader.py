@@ -0,0 +1,125 @@
+import gzip
+import json
+import re
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+
+from dataengineeringutils3.s3 import _get_backend, get_filepaths_from_s3_folder
+
+
+def _natural_sort_key(s3_path):
+    """
+    Sort key that orders numbered parts numerically, so that "file-2.jsonl.gz"
+    comes before "file-10.jsonl.gz"
+    """
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", s3_path)]
+
+
+class JsonNlSplitFileReader:
+    """
+    Iterator for reading back a dataset of json line files, such as the parts
+    written by JsonNlSplitFileWriter. Parts are downloaded, decompressed and
+    parsed in background threads while the caller consumes records from earlier
+    parts, so network and decompression overlap. At most `prefetch` parts are
+    held in memory at once.
+
+    Files ending in ".gz" are decompressed. Records are yielded in part order
+    (parts are sorted numerically by their suffix, then line order within each
+    part) unless ordered is False, in which case parts are yielded as soon as
+    they are ready.
+
+    reader = JsonNlSplitFileReader("s3://test/folder/", file_extension="jsonl.gz")
+    for record in reader:
+        print(record["col1"])
+
+    :param s3_folder_path: "s3://...." folder containing the parts
+    :param file_extension: Only read files with this extension (default all files)
+    :param prefetch: Number of parts held at once, the one being consumed and
+        those downloaded ahead of it (default 4)
+    :param ordered: If True (default) yield parts in order. If False yield them in
+        completion order for maximum throughput.
+    :param line_transform: Function applied to each line (default json.loads)
+    :param encoding: File type encoding (utf-8 default)
+    """
+
+    def __init__(
+        self,
+        s3_folder_path,
+        file_extension=None,
+        prefetch=4,
+        ordered=True,
+        line_transform=json.loads,
+        encoding="utf-8",
+    ):
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self.s3_folder_path = s3_folder_path
+        self.file_extension = file_extension
+        self.prefetch = prefetch
+        self.ordered = ordered
+        self.line_transform = line_transform
+        self.encoding = encoding
+        self.num_files = 0
+        self.total_lines = 0
+
+    @property
+    def filepaths(self):
+        """Return the s3 paths of the parts in the order they are read"""
+        paths = get_filepaths_from_s3_folder(
+            self.s3_folder_path, file_extension=self.file_extension
+        )
+        return sorted(paths, key=_natural_sort_key)
+
+    def __iter__(self):
+        for _, records in self.iter_parts():
+            yield from records
+
+    def _read_part(self, s3_client, s3_path):
+        data = _get_backend(s3_path, s3_client).read_bytes(s3_path)
+        if s3_path.endswith(".gz"):
+            data = gzip.decompress(data)
+        lines = data.decode(self.encoding).splitlines()
+        return s3_path, [self.line_transform(line) for line in lines if line]
+
+    def iter_parts(self):
+        """
+        Yields a (s3_path, records) tuple for each part of the dataset
+        """
+        s3_client = boto3.client("s3")
+        paths = iter(self.filepaths)
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            try:
+                for path in paths:
+                    in_flight.append(executor.submit(self._read_part, s3_client, path))
+                    if len(in_flight) >= self.prefetch:
+                        break
+
+                while in_flight:
+                    if self.ordered:
+                        future = in_flight.popleft()
+                    else:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        future = done.pop()
+                        in_flight.remove(future)
+
+                    s3_path, records = future.result()
+                    self.num_files += 1
+                    self.total_lines += len(records)
+                    yield s3_path, records
+                    del future, records
+
+                    # Top up the queue once the consumer has moved on, so the
+                    # part it held counts towards the prefetch limit
+                    next_path = next(paths, None)
+                    if next_path is not None:
+                        in_flight.append(
+                            executor.submit(self._read_part, s3_client, next_path)
+                        )
+            finally:
+                for future in in_flight:
+                    future.cancel()
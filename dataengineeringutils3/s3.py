@@ -2,12 +2,34 @@ import boto3
 import botocore
 import gzip
 import json
+import mmap
 import os
+import threading
 import yaml
 
-from io import StringIO
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Mapping, Tuple, Union
+
+from dataengineeringutils3.storage import (
+    S3Backend,
+    get_backend,
+    split_url,
+    write_atomically,
+)
+
+DEFAULT_RANGE_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+MIN_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+MAX_UPLOAD_PARTS = 10000
+
+# Used for the file transfers of bulk operations run by a limiter. Each
+# transfer makes one request at a time on its calling thread, rather than
+# starting its own thread pool, so the limiter bounds the requests in flight.
+BULK_TRANSFER_CONFIG = TransferConfig(max_concurrency=1, use_threads=False)
 
 
 def gzip_string_write_to_s3(file_as_string, s3_path):
@@ -17,10 +39,20 @@ def gzip_string_write_to_s3(file_as_string, s3_path):
     :param s3_path: "s3://....
     :return:
     """
-    s3_resource = boto3.resource("s3")
-    b, k = s3_path_to_bucket_key(s3_path)
     compressed_out = gzip.compress(bytes(file_as_string, "utf-8"))
-    s3_resource.Object(b, k).put(Body=compressed_out)
+    get_backend(s3_path).write_bytes(s3_path, compressed_out)
+
+
+def _get_backend(path, s3_client=None, transfer_config=None):
+    """
+    Returns the storage backend for path (see dataengineeringutils3.storage).
+    For S3 paths this is an S3Backend making its requests with s3_client, if
+    one is given, so it can be shared by the threads of a bulk operation.
+    """
+    backend = get_backend(path)
+    if s3_client is not None and isinstance(backend, S3Backend):
+        return S3Backend(s3_client, transfer_config)
+    return backend
 
 
 def s3_path_to_bucket_key(s3_path):
@@ -46,7 +78,11 @@ def _add_slash(s):
 
 
 def get_filepaths_from_s3_folder(
-    s3_folder_path, file_extension=None, exclude_zero_byte_files=True
+    s3_folder_path,
+    file_extension=None,
+    exclude_zero_byte_files=True,
+    listing=None,
+    s3_client=None,
 ):
     """
     Get a list of filepaths from a bucket. If extension is set to a string
@@ -55,60 +91,85 @@ def get_filepaths_from_s3_folder(
     :param s3_folder_path: "s3://...."
     :param extension: file extension, e.g. .json
     :param exclude_zero_byte_files: Whether to filter out results of zero size: True
+    :param listing: Optional alternative listing source with a get_filepaths
+        method taking the same arguments, such as S3ListingIndex or
+        S3InventoryListing. If None (default) the folder is listed from S3.
+    :param s3_client: Optional boto3 s3 client to list with (default a new client)
     :return: A list of full s3 paths that were in the given s3 folder path
     """
-
-    s3_resource = boto3.resource("s3")
-
-    if file_extension is not None:
-        if file_extension[0] != ".":
-            file_extension = "." + file_extension
+    if listing is not None:
+        return listing.get_filepaths(
+            s3_folder_path,
+            file_extension=file_extension,
+            exclude_zero_byte_files=exclude_zero_byte_files,
+        )
 
     # This guarantees that the path the user has given is really a 'folder'.
     s3_folder_path = _add_slash(s3_folder_path)
 
-    bucket, key = s3_path_to_bucket_key(s3_folder_path)
+    return [
+        p
+        for p, _ in _filter_objects(
+            _get_backend(s3_folder_path, s3_client).list_objects(s3_folder_path),
+            file_extension,
+            exclude_zero_byte_files,
+        )
+    ]
 
-    s3b = s3_resource.Bucket(bucket)
-    obs = s3b.objects.filter(Prefix=key)
 
-    if file_extension is not None:
-        obs = [o for o in obs if o.key.endswith(file_extension)]
-
-    if exclude_zero_byte_files:
-        obs = [o for o in obs if o.size != 0]
-
-    ob_keys = [o.key for o in obs]
+def _filter_objects(objects, file_extension=None, exclude_zero_byte_files=False):
+    """
+    Yields the (path, size) tuples of objects that end with file_extension (if
+    not None, with or without its leading .) and, if exclude_zero_byte_files,
+    are not empty
+    """
+    if file_extension is not None and file_extension[0] != ".":
+        file_extension = "." + file_extension
+    for path, size in objects:
+        if file_extension is not None and not path.endswith(file_extension):
+            continue
+        if exclude_zero_byte_files and size == 0:
+            continue
+        yield path, size
 
-    paths = sorted([bucket_key_to_s3_path(bucket, o) for o in ob_keys])
 
-    return paths
+def _list_local_folder(root_folder, include_hidden_files=False):
+    """
+    Yields the (path, size) tuples of the files under root_folder, skipping
+    files whose names start with a . unless include_hidden_files
+    """
+    for obj in sorted(Path(root_folder).rglob("*")):
+        if obj.is_file() and (include_hidden_files or not obj.name.startswith(".")):
+            yield str(obj), obj.stat().st_size
 
 
-def get_object_body(s3_path: str, encoding: str = "utf-8") -> str:
+def get_object_body(s3_path: str, encoding: str = "utf-8", cache=None) -> str:
     """
     Gets object body from file in S3
     :param s3_path: "s3://...."
     :param encoding: File type encoding (utf-8 default)
+    :param cache: Optional S3ObjectCache (see dataengineeringutils3.cache) to read
+        the object through
     :return: decoded string data from S3
     """
-    s3_resource = boto3.resource("s3")
-    bucket, key = s3_path_to_bucket_key(s3_path)
-    obj = s3_resource.Object(bucket, key)
-    text = obj.get()["Body"].read().decode(encoding)
-    return text
+    if cache is not None:
+        return cache.get_object_bytes(s3_path).decode(encoding)
+    return get_backend(s3_path).read_bytes(s3_path).decode(encoding)
 
 
-def read_json_from_s3(s3_path: str, encoding: str = "utf-8", *args, **kwargs) -> dict:
+def read_json_from_s3(
+    s3_path: str, encoding: str = "utf-8", *args, cache=None, **kwargs
+) -> dict:
     """
     Reads a json from the provided s3 path
     :param s3_path: "s3://...."
     :param encoding: File type encoding (utf-8 default)
     :param *args: Passed to json.loads call
+    :param cache: Optional S3ObjectCache to read the object through
     :param **kwargs: Passed to json.loads call
     :return: data from the json
     """
-    text = get_object_body(s3_path, encoding)
+    text = get_object_body(s3_path, encoding, cache=cache)
     return json.loads(text, *args, **kwargs)
 
 
@@ -117,34 +178,56 @@ def write_json_to_s3(data, s3_path, *args, **kwargs):
     Writes a json to the provided s3 path
     :param data: data to be written to a json file
     :param s3_path: "s3://...."
-    :param *args: Passed to json.dump call
-    :param **kwargs: Passed to json.dump call
-    :return: response dict of upload to s3
+    :param *args: Passed to json.dumps call
+    :param **kwargs: Passed to json.dumps call
+    :return: response dict of upload to s3 (None for file:// and mem:// paths)
     """
-    bucket, key = s3_path_to_bucket_key(s3_path)
-    s3_resource = boto3.resource("s3")
-    log_file = StringIO()
-    json.dump(data, log_file, *args, **kwargs)
-    log_obj = s3_resource.Object(bucket, key)
-    log_upload_resp = log_obj.put(Body=log_file.getvalue())
-    return log_upload_resp
+    body = json.dumps(data, *args, **kwargs).encode("utf-8")
+    return get_backend(s3_path).write_bytes(s3_path, body)
 
 
-def read_yaml_from_s3(s3_path: str, encoding: str = "utf-8", *args, **kwargs) -> dict:
+def read_yaml_from_s3(
+    s3_path: str, encoding: str = "utf-8", *args, cache=None, **kwargs
+) -> dict:
     """
     Reads a yaml file from the provided s3 path
     :param s3_path: "s3://...."
     :param encoding: File type encoding (utf-8 default)
     :param *args: Passed to yaml.safe_load call
+    :param cache: Optional S3ObjectCache to read the object through
     :param **kwargs: Passed to yaml.safe_load call
     :return: data from the yaml
     """
-    text = get_object_body(s3_path, encoding)
+    text = get_object_body(s3_path, encoding, cache=cache)
     return yaml.safe_load(text, *args, **kwargs)
 
 
+def get_bulk_client(limiter):
+    """
+    Returns an s3 client, shared by the threads of a bulk operation, with a
+    connection pool big enough for the limiter's maximum concurrency. The
+    client makes a single attempt at each request so throttling (503 SlowDown)
+    reaches the limiter, which backs off and retries, rather than being
+    absorbed by botocore's own retries. The limiter also retries the other
+    transient errors (5xx, timeouts, connection failures) botocore would have.
+    """
+    return boto3.client(
+        "s3",
+        config=Config(
+            max_pool_connections=limiter.max_concurrency,
+            # max_attempts would count retries, this counts the first attempt
+            retries={"total_max_attempts": 1},
+        ),
+    )
+
+
 def copy_s3_folder_contents_to_new_folder(
-    from_s3_folder_path, to_s3_folder_path, exclude_zero_byte_files=False
+    from_s3_folder_path,
+    to_s3_folder_path,
+    exclude_zero_byte_files=False,
+    limiter=None,
+    listing=None,
+    file_extension=None,
 ):
     """
     Copies complete folder structure within from_s3_folder_path
@@ -153,16 +236,36 @@ def copy_s3_folder_contents_to_new_folder(
     object name being written.
     :param from_s3_folder_path: Folder path that you want to copy "s3://...."
     :param to_s3_folder_path: Folder path that you want to write contents to "s3://...."
+    :param limiter: Optional AdaptiveConcurrencyLimiter (see
+        dataengineeringutils3.concurrency). If given the copies run concurrently.
+    :param listing: Optional alternative listing source (see
+        get_filepaths_from_s3_folder)
+    :param file_extension: Optional extension, e.g. .json, of the only files to copy
     """
     from_s3_folder_path = _add_slash(from_s3_folder_path)
     to_s3_folder_path = _add_slash(to_s3_folder_path)
 
     all_from_filepaths = get_filepaths_from_s3_folder(
-        from_s3_folder_path, exclude_zero_byte_files=exclude_zero_byte_files
+        from_s3_folder_path,
+        file_extension=file_extension,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+        listing=listing,
     )
-    for afp in all_from_filepaths:
+    if limiter is None:
+        for afp in all_from_filepaths:
+            tfp = afp.replace(from_s3_folder_path, to_s3_folder_path)
+            copy_s3_object(afp, tfp)
+        return
+
+    s3_client = get_bulk_client(limiter)
+    from_backend = _get_backend(from_s3_folder_path, s3_client)
+    to_backend = _get_backend(to_s3_folder_path, s3_client)
+
+    def copy(afp):
         tfp = afp.replace(from_s3_folder_path, to_s3_folder_path)
-        copy_s3_object(afp, tfp)
+        _copy_object(from_backend, afp, to_backend, tfp)
+
+    limiter.map(copy, all_from_filepaths)
 
 
 def delete_s3_object(s3_path):
@@ -170,23 +273,44 @@ def delete_s3_object(s3_path):
     Deletes the file at the s3_path given.
     :param s3_path: "s3://...."
     """
-    s3_resource = boto3.resource("s3")
-    b, o = s3_path_to_bucket_key(s3_path)
-    s3_resource.Object(b, o).delete()
+    return get_backend(s3_path).delete(s3_path)
 
 
-def delete_s3_folder_contents(s3_folder_path, exclude_zero_byte_files=False):
+def delete_s3_folder_contents(
+    s3_folder_path, exclude_zero_byte_files=False, limiter=None, listing=None
+):
     """
     Deletes all files within the s3_folder_path given given.
     :param s3_folder_path: Folder path that you want to delete "s3://...."
     :param exclude_zero_byte_files: Whether to filter out results of zero size: False
+    :param limiter: Optional AdaptiveConcurrencyLimiter. If given the deletes run
+        concurrently.
+    :param listing: Optional alternative listing source (see
+        get_filepaths_from_s3_folder)
     """
     s3_folder_path = _add_slash(s3_folder_path)
     all_filepaths = get_filepaths_from_s3_folder(
-        s3_folder_path, exclude_zero_byte_files=exclude_zero_byte_files
+        s3_folder_path,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+        listing=listing,
     )
-    for f in all_filepaths:
-        delete_s3_object(f)
+    if limiter is None:
+        for f in all_filepaths:
+            delete_s3_object(f)
+        return
+
+    backend = _get_backend(s3_folder_path, get_bulk_client(limiter))
+    limiter.map(backend.delete, all_filepaths)
+
+
+def _copy_object(from_backend, from_path, to_backend, to_path):
+    """
+    Copies within a backend when both paths have the same scheme, otherwise
+    reads the object from one backend and writes it to the other
+    """
+    if split_url(from_path)[0] == split_url(to_path)[0]:
+        return to_backend.copy(from_path, to_path)
+    return to_backend.write_bytes(to_path, from_backend.read_bytes(from_path))
 
 
 def copy_s3_object(from_s3_path, to_s3_path):
@@ -196,11 +320,9 @@ def copy_s3_object(from_s3_path, to_s3_path):
     :param from_s3_path: S3 path that you want to copy "s3://...."
     :param to_s3_path: S3 destination path "s3://...."
     """
-    s3_resource = boto3.resource("s3")
-    to_bucket, to_key = s3_path_to_bucket_key(to_s3_path)
-    if "s3://" in from_s3_path:
-        from_s3_path = from_s3_path.replace("s3://", "")
-    s3_resource.Object(to_bucket, to_key).copy_from(CopySource=from_s3_path)
+    return _copy_object(
+        get_backend(from_s3_path), from_s3_path, get_backend(to_s3_path), to_s3_path
+    )
 
 
 def check_for_s3_file(s3_path):
@@ -209,40 +331,22 @@ def check_for_s3_file(s3_path):
     :param s3_path: "s3://...."
     :returns: Boolean stating if file exists in S3
     """
-    # Taken from:
-    # https://stackoverflow.com/questions/33842944/check-if-a-key-exists-in-a-bucket-in-s3-using-boto3
-    s3_resource = boto3.resource("s3")
-    bucket, key = s3_path_to_bucket_key(s3_path)
-    try:
-        s3_resource.Object(bucket, key).load()
-    except botocore.exceptions.ClientError as e:
-        if e.response["Error"]["Code"] == "404":
-            return False
-        else:
-            raise
-    else:
-        # The object does exist.
-        return True
+    return get_backend(s3_path).exists(s3_path)
 
 
-def write_local_file_to_s3(local_file_path, s3_path, overwrite=False):
+def write_local_file_to_s3(local_file_path, s3_path, overwrite=False, s3_client=None):
     """
     Copy a file from a local folder to a location on s3.
     :param local_file_path: "myfolder/myfile.json"
     :param s3_path: "s3://path/to/myfile.json"
+    :param s3_client: Optional boto3 s3 client to upload with (default a new client)
 
     :returns: s3_resource response
     """
-
-    bucket, key = s3_path_to_bucket_key(s3_path)
-    s3_resource = boto3.resource("s3")
-
-    if check_for_s3_file(s3_path) and overwrite is False:
+    backend = _get_backend(s3_path, s3_client)
+    if backend.exists(s3_path) and overwrite is False:
         raise ValueError("File already exists.  Pass overwrite = True to overwrite")
-    else:
-        resp = s3_resource.meta.client.upload_file(local_file_path, bucket, key)
-
-    return resp
+    return backend.upload_file(local_file_path, s3_path)
 
 
 def write_local_folder_to_s3(
@@ -250,6 +354,10 @@ def write_local_folder_to_s3(
     s3_path: str,
     overwrite: bool = False,
     include_hidden_files: bool = False,
+    limiter=None,
+    s3_client=None,
+    file_extension: str = None,
+    exclude_zero_byte_files: bool = False,
 ) -> None:
     """Copy a local folder and all its contents to s3, keeping its directory structure.
 
@@ -258,25 +366,59 @@ def write_local_folder_to_s3(
     :param overwrite: if True, overwrite existing files in the target location
         if False, raise ValueError if existing files are found in the target location
     :param include_hidden_files: if False, ignore files whose names start with a .
+    :param limiter: Optional AdaptiveConcurrencyLimiter. If given the uploads run
+        concurrently.
+    :param s3_client: Optional boto3 s3 client to upload with (default a new
+        client, or a bulk client sized for the limiter)
+    :param file_extension: Optional extension, e.g. .json, of the only files to
+        upload
+    :param exclude_zero_byte_files: if True, skip empty files
 
     :returns: None
     """
-    for obj in Path(root_folder).rglob("*"):
-        if obj.is_file() and (include_hidden_files or not obj.name.startswith(".")):
-            # Construct s3 path based on current filepath and local root folder
-            relative_to_root = str(obj.relative_to(root_folder))
-            file_s3_path = os.path.join(s3_path, relative_to_root)
-            write_local_file_to_s3(str(obj), file_s3_path, overwrite)
+    to_upload = []
+    for local_file_path, _ in _filter_objects(
+        _list_local_folder(root_folder, include_hidden_files),
+        file_extension,
+        exclude_zero_byte_files,
+    ):
+        # Construct s3 path based on current filepath and local root folder
+        relative_to_root = os.path.relpath(local_file_path, root_folder)
+        file_s3_path = os.path.join(s3_path, relative_to_root)
+        if limiter is None:
+            write_local_file_to_s3(local_file_path, file_s3_path, overwrite, s3_client)
+        else:
+            to_upload.append((local_file_path, file_s3_path))
+
+    if not to_upload:
+        return
+
+    if s3_client is None:
+        s3_client = get_bulk_client(limiter)
+    backend = _get_backend(s3_path, s3_client, BULK_TRANSFER_CONFIG)
+
+    def upload(paths):
+        local_file_path, file_s3_path = paths
+        if not overwrite and backend.exists(file_s3_path):
+            raise ValueError("File already exists.  Pass overwrite = True to overwrite")
+        backend.upload_file(local_file_path, file_s3_path)
+
+    limiter.map(upload, to_upload)
 
 
 def write_s3_file_to_local(
-    s3_path: str, local_file_path: Union[Path, str], overwrite: bool = False,
+    s3_path: str,
+    local_file_path: Union[Path, str],
+    overwrite: bool = False,
+    s3_client=None,
 ) -> None:
     """Save a file from an s3 path to a local folder.
 
     :param s3_path: full s3 path of the file you want to download
     :param local_file_path: Path or str for where to save the file
     :param overwrite: if True, overwrite an existing file at the local_file_path
+    :param s3_client: Optional boto3 s3 client to download with (default a new
+        client)
 
     :returns: None
     """
@@ -296,19 +438,30 @@ def write_s3_file_to_local(
     Path(folder).mkdir(parents=True, exist_ok=True)
 
     # Download the file
-    s3_client = boto3.client("s3")
-    bucket, key = s3_path_to_bucket_key(s3_path)
-    s3_client.download_file(bucket, key, str(local_file_path))
+    _get_backend(s3_path, s3_client).download_file(s3_path, local_file_path)
 
 
 def write_s3_folder_to_local(
-    s3_path: str, local_folder_path: Union[Path, str], overwrite: bool = False
+    s3_path: str,
+    local_folder_path: Union[Path, str],
+    overwrite: bool = False,
+    limiter=None,
+    s3_client=None,
+    file_extension: str = None,
+    exclude_zero_byte_files: bool = False,
 ) -> None:
     """Copy files from an s3 'folder' to a local folder, keeping directory structure.
 
     :param s3_path: full s3 path of the folder whose contents you want to download
     :param local_folder_path: Path or str for where to save the contents of s3_path
     :param overwrite: if False, raise an error if any of the files already exist
+    :param limiter: Optional AdaptiveConcurrencyLimiter. If given the downloads run
+        concurrently.
+    :param s3_client: Optional boto3 s3 client to download with (default a new
+        client, or a bulk client sized for the limiter)
+    :param file_extension: Optional extension, e.g. .json, of the only files to
+        download
+    :param exclude_zero_byte_files: if True, skip empty files
 
     :returns: None
     """
@@ -316,17 +469,14 @@ def write_s3_folder_to_local(
     root = Path(local_folder_path)
     root.mkdir(parents=True, exist_ok=True)
 
-    # Get an object representing the bucket
-    s3_resource = boto3.resource("s3")
-    bucket_name, s3_folder = s3_path_to_bucket_key(s3_path)
-    bucket = s3_resource.Bucket(bucket_name)
-
-    # For each file in bucket, check if it needs a new subfolder, then download it
-    for obj in bucket.objects.filter(Prefix=s3_folder):
-        # Split up s3 path to work out directory structure for the local file
-        s3_subfolder, filename = obj.key.rsplit("/", 1)
-        local_subfolder = root / s3_subfolder
-        destination = local_subfolder / filename
+    # For each file under s3_path, keep its key's directory structure under root
+    backend = _get_backend(s3_path, s3_client)
+    to_download = []
+    for path, _ in _filter_objects(
+        backend.list_objects(s3_path), file_extension, exclude_zero_byte_files
+    ):
+        key = split_url(path)[1].split("/", 1)[1]
+        destination = root / key
 
         # Raise an error if file already exists and not overwriting
         if not overwrite and destination.is_file():
@@ -337,6 +487,459 @@ def write_s3_folder_to_local(
                 )
             )
 
-        # Make the local folder if it doesn't exist, then download the file
-        local_subfolder.mkdir(parents=True, exist_ok=True)
-        bucket.download_file(obj.key, str(destination))
+        # The backend makes the local folder if it doesn't exist
+        if limiter is None:
+            backend.download_file(path, destination)
+        else:
+            to_download.append((path, destination))
+
+    if to_download:
+        if s3_client is None:
+            s3_client = get_bulk_client(limiter)
+        backend = _get_backend(s3_path, s3_client, BULK_TRANSFER_CONFIG)
+        limiter.map(lambda d: backend.download_file(*d), to_download)
+
+
+def _get_byte_ranges(size, part_size):
+    """
+    Splits an object of the given size into inclusive (start, end) byte ranges
+    of at most part_size bytes
+    """
+    return [
+        (start, min(start + part_size, size) - 1) for start in range(0, size, part_size)
+    ]
+
+
+def _get_pooled_client(s3_client, max_concurrency):
+    """
+    Returns s3_client, or if it is None a new client with a connection for each
+    of max_concurrency
+    """
+    if s3_client is not None:
+        return s3_client
+    return boto3.client(
+        "s3", config=Config(max_pool_connections=max(max_concurrency, 1))
+    )
+
+
+def _download_ranges_into(
+    s3_path, get_buffer, part_size, max_concurrency, s3_client=None
+):
+    """
+    Downloads the object at s3_path with concurrent ranged GETs. get_buffer is
+    called with the object size and must return a writable buffer of that size
+    which each range is written into in place.
+    :returns: the buffer returned by get_buffer
+    """
+    if part_size <= 0:
+        raise ValueError("part_size must be greater than 0")
+
+    s3_client = _get_pooled_client(s3_client, max_concurrency)
+    bucket, key = s3_path_to_bucket_key(s3_path)
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    size = head["ContentLength"]
+    etag = head["ETag"]
+    buffer = get_buffer(size)
+    if size == 0:
+        return buffer
+
+    view = memoryview(buffer)
+
+    def fetch_range(byte_range):
+        start, end = byte_range
+        # IfMatch guards against the object being replaced mid-download
+        body = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag
+        )["Body"]
+        pos = start
+        for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+            chunk_end = pos + len(chunk)
+            view[pos:chunk_end] = chunk
+            pos = chunk_end
+        if pos != end + 1:
+            raise IOError(
+                f"Incomplete range {start}-{end} for {s3_path}: got {pos - start} bytes"
+            )
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_concurrency, 1)) as executor:
+            list(executor.map(fetch_range, _get_byte_ranges(size, part_size)))
+    finally:
+        view.release()
+
+    return buffer
+
+
+def get_object_bytes_parallel(
+    s3_path: str,
+    part_size: int = DEFAULT_RANGE_PART_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    as_memoryview: bool = False,
+    s3_client=None,
+) -> Union[bytearray, memoryview]:
+    """
+    Gets the object body from S3 by issuing concurrent byte-range GETs, each
+    written directly into a single preallocated buffer, which is returned
+    without copying it. Call bytes() on the result if an immutable copy is
+    needed.
+    :param s3_path: "s3://...."
+    :param part_size: Number of bytes requested by each ranged GET (default 8MB)
+    :param max_concurrency: Maximum number of ranges fetched at once (default 10)
+    :param as_memoryview: If True return a memoryview over the downloaded buffer.
+        If False (default) return the buffer, a bytearray.
+    :param s3_client: Optional boto3 s3 client to download with (default a new
+        client with a connection for each of max_concurrency)
+    :return: raw (undecoded) bytes of the S3 object. file:// and mem:// paths
+        are read in one go and returned as bytes.
+    """
+    backend = get_backend(s3_path)
+    if not isinstance(backend, S3Backend):
+        # Ranged GETs only help on S3, other backends read the object at once
+        data = backend.read_bytes(s3_path)
+        return memoryview(data) if as_memoryview else data
+    buffer = _download_ranges_into(
+        s3_path, bytearray, part_size, max_concurrency, s3_client
+    )
+    return memoryview(buffer) if as_memoryview else buffer
+
+
+def write_s3_file_to_local_parallel(
+    s3_path: str,
+    local_file_path: Union[Path, str],
+    overwrite: bool = False,
+    part_size: int = DEFAULT_RANGE_PART_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    s3_client=None,
+) -> str:
+    """Save a file from an s3 path to a local file using concurrent byte-range GETs.
+
+    The object is downloaded into a temporary file in the same folder, which is
+    preallocated to the size of the object and memory-mapped so each range is
+    written straight into its place, and then moved to local_file_path. If the
+    download fails an existing file at local_file_path is left as it was.
+
+    :param s3_path: full s3 path of the file you want to download
+    :param local_file_path: Path or str for where to save the file
+    :param overwrite: if True, overwrite an existing file at the local_file_path
+    :param part_size: Number of bytes requested by each ranged GET (default 8MB)
+    :param max_concurrency: Maximum number of ranges fetched at once (default 10)
+    :param s3_client: Optional boto3 s3 client to download with (default a new
+        client with a connection for each of max_concurrency)
+
+    :returns: the local file path as a str
+    """
+    location = Path(local_file_path)
+    if not overwrite and location.is_file():
+        raise FileExistsError(
+            (
+                f"There's already a file at {str(location)}. "
+                "Set overwrite to True to replace it."
+            )
+        )
+    backend = get_backend(s3_path)
+    if not isinstance(backend, S3Backend):
+        backend.download_file(s3_path, location)
+        return str(location)
+
+    def download(f):
+        mapped = []
+
+        def get_buffer(size):
+            f.truncate(size)
+            if not size:
+                return bytearray()
+            mapped.append(mmap.mmap(f.fileno(), size))
+            return mapped[0]
+
+        try:
+            _download_ranges_into(
+                s3_path, get_buffer, part_size, max_concurrency, s3_client
+            )
+            for buffer in mapped:
+                buffer.flush()
+        finally:
+            for buffer in mapped:
+                buffer.close()
+
+    write_atomically(location, download)
+    return str(location)
+
+
+def _read_upload_state(state_file_path, expected):
+    """
+    Returns the saved state of an interrupted upload if it is for the same
+    file, destination and settings, otherwise None
+    """
+    try:
+        with open(state_file_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if any(state.get(k) != v for k, v in expected.items()):
+        return None
+    return state
+
+
+def _write_upload_state(state_file_path, state):
+    """Writes the upload state atomically so a crash never leaves it half written"""
+    tmp_path = f"{state_file_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_file_path)
+
+
+def _list_uploaded_parts(s3_client, bucket, key, upload_id):
+    """
+    Returns a dict of part number to ETag of the parts S3 has for the upload,
+    or None if the upload no longer exists
+    """
+    parts = {}
+    paginator = s3_client.get_paginator("list_parts")
+    try:
+        for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"]
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchUpload":
+            return None
+        raise
+    return parts
+
+
+def _reconcile_upload_state(s3_client, bucket, key, state):
+    """
+    Drops checkpointed parts that S3 no longer has with the same ETag. Returns
+    None if the upload itself no longer exists.
+    """
+    uploaded = _list_uploaded_parts(s3_client, bucket, key, state["upload_id"])
+    if uploaded is None:
+        return None
+    state["parts"] = {
+        n: part
+        for n, part in state["parts"].items()
+        if uploaded.get(int(n)) == part["ETag"]
+    }
+    return state
+
+
+def write_large_local_file_to_s3(
+    local_file_path: Union[Path, str],
+    s3_path: str,
+    overwrite: bool = False,
+    part_size: int = DEFAULT_UPLOAD_PART_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    state_file_path: Union[Path, str] = None,
+    checksum_algorithm: str = None,
+    s3_client=None,
+) -> dict:
+    """Copy a large local file to s3 as a resumable parallel multipart upload.
+
+    Parts are read from the file and uploaded concurrently. Each completed part
+    is checkpointed to a local state file, so if the upload is interrupted
+    calling this function again with the same arguments reuses the existing
+    UploadId and only uploads the missing parts. The state file is removed once
+    the upload completes. A failed upload is left open on S3 to be resumed; use
+    a bucket lifecycle rule to abort incomplete multipart uploads that are never
+    resumed.
+
+    :param local_file_path: "myfolder/myfile.jsonl.gz"
+    :param s3_path: "s3://path/to/myfile.jsonl.gz"
+    :param overwrite: if True, overwrite an existing object at the s3_path
+    :param part_size: Number of bytes in each part, at least 5MB (default 64MB)
+    :param max_concurrency: Maximum number of parts uploaded at once (default 10)
+    :param state_file_path: Where to checkpoint completed parts (default
+        local_file_path + ".upload.json")
+    :param checksum_algorithm: Optional checksum S3 verifies for each part, one
+        of "CRC32", "CRC32C", "SHA1" or "SHA256"
+    :param s3_client: Optional boto3 s3 client to upload with (default a new
+        client with a connection for each of max_concurrency)
+
+    :returns: the complete_multipart_upload response (None for file:// and mem://
+        paths, which are written in one go)
+    """
+    if part_size < MIN_UPLOAD_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_UPLOAD_PART_SIZE} bytes")
+    backend = get_backend(s3_path)
+    if not isinstance(backend, S3Backend):
+        return write_local_file_to_s3(local_file_path, s3_path, overwrite)
+
+    local_file_path = Path(local_file_path)
+    if state_file_path is None:
+        state_file_path = f"{local_file_path}.upload.json"
+    stat = local_file_path.stat()
+    byte_ranges = _get_byte_ranges(stat.st_size, part_size) or [(0, -1)]
+    if len(byte_ranges) > MAX_UPLOAD_PARTS:
+        raise ValueError(
+            f"{local_file_path} would need {len(byte_ranges)} parts, more than the "
+            f"limit of {MAX_UPLOAD_PARTS}. Increase part_size."
+        )
+
+    bucket, key = s3_path_to_bucket_key(s3_path)
+    s3_client = _get_pooled_client(s3_client, max_concurrency)
+
+    # The state only applies to an upload of the same file with the same settings
+    expected = {
+        "s3_path": s3_path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "part_size": part_size,
+        "checksum_algorithm": checksum_algorithm,
+    }
+    checksum_kwargs = (
+        {"ChecksumAlgorithm": checksum_algorithm} if checksum_algorithm else {}
+    )
+    state = _read_upload_state(state_file_path, expected)
+    if state is not None:
+        state = _reconcile_upload_state(s3_client, bucket, key, state)
+
+    if state is None:
+        if S3Backend(s3_client).exists(s3_path) and overwrite is False:
+            raise ValueError("File already exists.  Pass overwrite = True to overwrite")
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket, Key=key, **checksum_kwargs
+        )["UploadId"]
+        state = dict(expected, upload_id=upload_id, parts={})
+        _write_upload_state(state_file_path, state)
+
+    lock = threading.Lock()
+    checksum_key = f"Checksum{checksum_algorithm}" if checksum_algorithm else None
+
+    def upload_part(part_number):
+        start, end = byte_ranges[part_number - 1]
+        with open(local_file_path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        resp = s3_client.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=state["upload_id"],
+            PartNumber=part_number,
+            Body=body,
+            **checksum_kwargs,
+        )
+        part = {"ETag": resp["ETag"]}
+        if checksum_key and checksum_key in resp:
+            part[checksum_key] = resp[checksum_key]
+        with lock:
+            state["parts"][str(part_number)] = part
+            _write_upload_state(state_file_path, state)
+
+    remaining = [
+        n for n in range(1, len(byte_ranges) + 1) if str(n) not in state["parts"]
+    ]
+    with ThreadPoolExecutor(max_workers=max(max_concurrency, 1)) as executor:
+        list(executor.map(upload_part, remaining))
+
+    parts = [
+        dict(part, PartNumber=int(n))
+        for n, part in sorted(state["parts"].items(), key=lambda p: int(p[0]))
+    ]
+    resp = s3_client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=state["upload_id"],
+        MultipartUpload={"Parts": parts},
+    )
+    os.remove(state_file_path)
+    return resp
+
+
+def _run_many(func, items, max_workers):
+    """
+    Calls func(s3_client, item) for each item using a shared client and thread
+    pool. func should get each item's backend with _get_backend(path, s3_client).
+    :returns: tuple of (results, errors) where results is in the same order as
+        items (None where the call failed) and errors maps each failed item's
+        s3 path to the exception raised
+    """
+    s3_client = boto3.client(
+        "s3", config=Config(max_pool_connections=max(max_workers, 1))
+    )
+    items = list(items)
+    results = [None] * len(items)
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = [executor.submit(func, s3_client, item) for item in items]
+        for i, (item, future) in enumerate(zip(items, futures)):
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                errors[item if isinstance(item, str) else item[0]] = e
+    return results, errors
+
+
+def _read_many(s3_paths, loader, encoding, max_workers):
+    def read(s3_client, s3_path):
+        body = _get_backend(s3_path, s3_client).read_bytes(s3_path)
+        return loader(body.decode(encoding))
+
+    return _run_many(read, s3_paths, max_workers)
+
+
+def read_json_many(
+    s3_paths: Iterable[str],
+    encoding: str = "utf-8",
+    max_workers: int = DEFAULT_MAX_CONCURRENCY,
+    **kwargs,
+) -> Tuple[list, dict]:
+    """
+    Reads many jsons concurrently through a shared client
+    :param s3_paths: list of "s3://...."
+    :param encoding: File type encoding (utf-8 default)
+    :param max_workers: Maximum number of concurrent reads (default 10)
+    :param **kwargs: Passed to json.loads call
+    :return: tuple of (data, errors). data is a list in the same order as
+        s3_paths with None for any path that failed, and errors is a dict of
+        s3 path to the exception raised for that path.
+    """
+    return _read_many(
+        s3_paths, lambda text: json.loads(text, **kwargs), encoding, max_workers
+    )
+
+
+def read_yaml_many(
+    s3_paths: Iterable[str],
+    encoding: str = "utf-8",
+    max_workers: int = DEFAULT_MAX_CONCURRENCY,
+    **kwargs,
+) -> Tuple[list, dict]:
+    """
+    Reads many yaml files concurrently through a shared client
+    :param s3_paths: list of "s3://...."
+    :param encoding: File type encoding (utf-8 default)
+    :param max_workers: Maximum number of concurrent reads (default 10)
+    :param **kwargs: Passed to yaml.safe_load call
+    :return: tuple of (data, errors). data is a list in the same order as
+        s3_paths with None for any path that failed, and errors is a dict of
+        s3 path to the exception raised for that path.
+    """
+    return _read_many(
+        s3_paths, lambda text: yaml.safe_load(text, **kwargs), encoding, max_workers
+    )
+
+
+def write_json_many(
+    data: Union[Mapping[str, object], Iterable[Tuple[str, object]]],
+    max_workers: int = DEFAULT_MAX_CONCURRENCY,
+    **kwargs,
+) -> Tuple[list, dict]:
+    """
+    Writes many jsons concurrently through a shared client. Each json is
+    encoded straight to bytes.
+    :param data: dict of s3 path to the data to write there, or a list of
+        (s3_path, data) tuples
+    :param max_workers: Maximum number of concurrent writes (default 10)
+    :param **kwargs: Passed to json.dumps call
+    :return: tuple of (responses, errors). responses is a list of the put_object
+        responses in the same order as data with None for any path that failed
+        (or that isn't on S3), and errors is a dict of s3 path to the exception
+        raised for that path.
+    """
+    items = data.items() if isinstance(data, Mapping) else data
+
+    def write(s3_client, item):
+        s3_path, obj = item
+        body = json.dumps(obj, **kwargs).encode("utf-8")
+        return _get_backend(s3_path, s3_client).write_bytes(s3_path, body)
+
+    return _run_many(write, items, max_workers)
@@ -0,0 +1,335 @@
+import asyncio
+import gzip
+import json
+import yaml
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Union
+
+import boto3
+import botocore
+
+from botocore.config import Config
+
+from dataengineeringutils3 import s3
+from dataengineeringutils3.s3 import _add_slash, s3_path_to_bucket_key
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:
+    get_session = None
+
+DEFAULT_MAX_CONCURRENCY = 64
+
+
+class AsyncS3:
+    """
+    asyncio counterpart of the functions in dataengineeringutils3.s3. Every
+    function in that module has a coroutine method of the same name and
+    arguments here, and at most max_concurrency of them run at once.
+
+    Single object operations go through one shared client. If aiobotocore is
+    installed (pip install dataengineeringutils3[async]) it is used as a native
+    async client, otherwise a thread-safe boto3 client is shared by a thread
+    pool executor. Folder level operations list the folder and then run the
+    per-object operations concurrently. Anything else runs the synchronous
+    function in the executor with the shared boto3 client, so every request
+    goes to endpoint_url.
+
+    async with AsyncS3(max_concurrency=128) as s3:
+        config = await s3.read_json_from_s3("s3://bucket/config.json")
+        exists = await s3.check_for_s3_files(
+            [f"s3://bucket/data/file-{i}.json" for i in range(10000)]
+        )
+
+    :param max_concurrency: Maximum number of S3 operations in flight (default 64)
+    :param use_aiobotocore: Use aiobotocore as the backend. None (default) uses it
+        when it is installed.
+    :param endpoint_url: Optional endpoint for the S3 client, e.g. a local moto
+        server
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        use_aiobotocore: bool = None,
+        endpoint_url: str = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if use_aiobotocore is None:
+            use_aiobotocore = get_session is not None
+        elif use_aiobotocore and get_session is None:
+            raise ImportError("aiobotocore must be installed to use it as a backend")
+
+        self.max_concurrency = max_concurrency
+        self.use_aiobotocore = use_aiobotocore
+        self.endpoint_url = endpoint_url
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._client = None
+        self._aio_client = None
+        self._aio_client_context = None
+        self._open_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def open(self):
+        """
+        Creates the shared clients, unless they are already open. Called by
+        __aenter__, or by the first operation outside an async with block.
+        """
+        async with self._open_lock:
+            if self._client is not None:
+                return
+            if self.use_aiobotocore:
+                self._aio_client_context = get_session().create_client(
+                    "s3",
+                    endpoint_url=self.endpoint_url,
+                    config=AioConfig(max_pool_connections=self.max_concurrency),
+                )
+                self._aio_client = await self._aio_client_context.__aenter__()
+            # For the synchronous functions run in the executor
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                config=Config(max_pool_connections=self.max_concurrency),
+            )
+
+    async def close(self):
+        """Closes the shared client and executor. Called by __aexit__."""
+        if self._aio_client_context is not None:
+            await self._aio_client_context.__aexit__(None, None, None)
+            self._aio_client_context = None
+            self._aio_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self._executor.shutdown(wait=True)
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """Runs a synchronous function in the executor, within the concurrency limit"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, partial(func, *args, **kwargs)
+            )
+
+    async def _run_with_client(self, func, *args, **kwargs):
+        """
+        Runs a function of dataengineeringutils3.s3 in the executor, passing it
+        the shared boto3 client
+        """
+        if self._client is None:
+            await self.open()
+        return await self.run_in_executor(func, *args, s3_client=self._client, **kwargs)
+
+    async def _call(self, operation, **kwargs):
+        """
+        Calls an S3 client operation (e.g. "get_object") on the backend. If the
+        response has a body it is read fully and returned in place of the stream.
+        """
+        if self._client is None:
+            await self.open()
+
+        async with self._semaphore:
+            if self._aio_client is not None:
+                resp = await getattr(self._aio_client, operation)(**kwargs)
+                if "Body" in resp:
+                    async with resp["Body"] as stream:
+                        resp["Body"] = await stream.read()
+                return resp
+
+            def call():
+                resp = getattr(self._client, operation)(**kwargs)
+                if "Body" in resp:
+                    resp["Body"] = resp["Body"].read()
+                return resp
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, call)
+
+    async def gather(self, aws, return_exceptions: bool = False) -> list:
+        """
+        Same as asyncio.gather over an iterable of awaitables. Concurrency is
+        still bounded by max_concurrency as every method acquires the limit.
+        """
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+    async def gzip_string_write_to_s3(self, file_as_string, s3_path):
+        b, k = s3_path_to_bucket_key(s3_path)
+        body = gzip.compress(bytes(file_as_string, "utf-8"))
+        return await self._call("put_object", Bucket=b, Key=k, Body=body)
+
+    async def get_filepaths_from_s3_folder(
+        self, s3_folder_path, file_extension=None, exclude_zero_byte_files=True
+    ):
+        return await self._run_with_client(
+            s3.get_filepaths_from_s3_folder,
+            s3_folder_path,
+            file_extension=file_extension,
+            exclude_zero_byte_files=exclude_zero_byte_files,
+        )
+
+    async def get_object_bytes(self, s3_path: str) -> bytes:
+        """Gets the raw bytes of the object body from file in S3"""
+        bucket, key = s3_path_to_bucket_key(s3_path)
+        resp = await self._call("get_object", Bucket=bucket, Key=key)
+        return resp["Body"]
+
+    async def get_object_body(self, s3_path: str, encoding: str = "utf-8") -> str:
+        return (await self.get_object_bytes(s3_path)).decode(encoding)
+
+    async def read_json_from_s3(
+        self, s3_path: str, encoding: str = "utf-8", *args, **kwargs
+    ) -> dict:
+        return json.loads(
+            await self.get_object_body(s3_path, encoding), *args, **kwargs
+        )
+
+    async def write_json_to_s3(self, data, s3_path, *args, **kwargs):
+        bucket, key = s3_path_to_bucket_key(s3_path)
+        body = json.dumps(data, *args, **kwargs)
+        return await self._call("put_object", Bucket=bucket, Key=key, Body=body)
+
+    async def read_yaml_from_s3(
+        self, s3_path: str, encoding: str = "utf-8", *args, **kwargs
+    ) -> dict:
+        text = await self.get_object_body(s3_path, encoding)
+        return yaml.safe_load(text, *args, **kwargs)
+
+    async def copy_s3_folder_contents_to_new_folder(
+        self, from_s3_folder_path, to_s3_folder_path, exclude_zero_byte_files=False
+    ):
+        from_s3_folder_path = _add_slash(from_s3_folder_path)
+        to_s3_folder_path = _add_slash(to_s3_folder_path)
+        all_from_filepaths = await self.get_filepaths_from_s3_folder(
+            from_s3_folder_path, exclude_zero_byte_files=exclude_zero_byte_files
+        )
+        await self.copy_s3_objects(
+            [
+                (afp, afp.replace(from_s3_folder_path, to_s3_folder_path))
+                for afp in all_from_filepaths
+            ]
+        )
+
+    async def delete_s3_object(self, s3_path):
+        b, o = s3_path_to_bucket_key(s3_path)
+        return await self._call("delete_object", Bucket=b, Key=o)
+
+    async def delete_s3_folder_contents(
+        self, s3_folder_path, exclude_zero_byte_files=False
+    ):
+        all_filepaths = await self.get_filepaths_from_s3_folder(
+            _add_slash(s3_folder_path), exclude_zero_byte_files=exclude_zero_byte_files
+        )
+        await self.delete_s3_objects(all_filepaths)
+
+    async def copy_s3_object(self, from_s3_path, to_s3_path):
+        to_bucket, to_key = s3_path_to_bucket_key(to_s3_path)
+        from_bucket, from_key = s3_path_to_bucket_key(from_s3_path)
+        return await self._call(
+            "copy_object",
+            Bucket=to_bucket,
+            Key=to_key,
+            CopySource={"Bucket": from_bucket, "Key": from_key},
+        )
+
+    async def check_for_s3_file(self, s3_path) -> bool:
+        bucket, key = s3_path_to_bucket_key(s3_path)
+        try:
+            await self._call("head_object", Bucket=bucket, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                return False
+            raise
+        return True
+
+    async def write_local_file_to_s3(self, local_file_path, s3_path, overwrite=False):
+        return await self._run_with_client(
+            s3.write_local_file_to_s3, local_file_path, s3_path, overwrite
+        )
+
+    async def write_local_folder_to_s3(
+        self,
+        root_folder: Union[Path, str],
+        s3_path: str,
+        overwrite: bool = False,
+        include_hidden_files: bool = False,
+    ) -> None:
+        return await self._run_with_client(
+            s3.write_local_folder_to_s3,
+            root_folder,
+            s3_path,
+            overwrite,
+            include_hidden_files,
+        )
+
+    async def write_s3_file_to_local(
+        self, s3_path: str, local_file_path: Union[Path, str], overwrite: bool = False
+    ) -> None:
+        return await self._run_with_client(
+            s3.write_s3_file_to_local, s3_path, local_file_path, overwrite
+        )
+
+    async def write_s3_folder_to_local(
+        self, s3_path: str, local_folder_path: Union[Path, str], overwrite: bool = False
+    ) -> None:
+        return await self._run_with_client(
+            s3.write_s3_folder_to_local, s3_path, local_folder_path, overwrite
+        )
+
+    async def get_object_bytes_parallel(self, s3_path: str, **kwargs):
+        return await self._run_with_client(
+            s3.get_object_bytes_parallel, s3_path, **kwargs
+        )
+
+    async def write_s3_file_to_local_parallel(
+        self, s3_path: str, local_file_path: Union[Path, str], **kwargs
+    ) -> str:
+        return await self._run_with_client(
+            s3.write_s3_file_to_local_parallel, s3_path, local_file_path, **kwargs
+        )
+
+    async def write_large_local_file_to_s3(
+        self, local_file_path: Union[Path, str], s3_path: str, **kwargs
+    ) -> dict:
+        return await self._run_with_client(
+            s3.write_large_local_file_to_s3, local_file_path, s3_path, **kwargs
+        )
+
+    async def check_for_s3_files(self, s3_paths) -> list:
+        """
+        Checks if each of the s3 paths exists, concurrently
+        :param s3_paths: list of "s3://...."
+        :returns: list of Booleans in the same order as s3_paths
+        """
+        return await self.gather(self.check_for_s3_file(p) for p in s3_paths)
+
+    async def get_object_bodies(self, s3_paths, encoding: str = "utf-8") -> list:
+        """
+        Gets the decoded object body of each of the s3 paths, concurrently
+        :param s3_paths: list of "s3://...."
+        :param encoding: File type encoding (utf-8 default)
+        :returns: list of strings in the same order as s3_paths
+        """
+        return await self.gather(self.get_object_body(p, encoding) for p in s3_paths)
+
+    async def delete_s3_objects(self, s3_paths):
+        """Deletes each of the s3 paths, concurrently"""
+        await self.gather(self.delete_s3_object(p) for p in s3_paths)
+
+    async def copy_s3_objects(self, from_to_s3_paths):
+        """
+        Copies objects concurrently
+        :param from_to_s3_paths: list of (from_s3_path, to_s3_path) tuples
+        """
+        await self.gather(self.copy_s3_object(f, t) for f, t in from_to_s3_paths)
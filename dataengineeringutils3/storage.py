@@ -0,0 +1,311 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Union
+
+import boto3
+import botocore
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# Read once, as the only way to read the umask is to set it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def split_url(path: str):
+    """
+    Splits "scheme://rest" into ("scheme", "rest"). Paths without a scheme
+    are treated as S3 paths, as elsewhere in this package.
+    """
+    scheme, sep, rest = path.partition("://")
+    if not sep:
+        return "s3", path
+    return scheme, rest
+
+
+def write_atomically(local_path: Union[Path, str], write):
+    """
+    Calls write with a temporary file in the same folder as local_path and
+    moves it to local_path with os.replace when complete, so local_path is
+    never left partly written
+    """
+    local_path = Path(local_path)
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=local_path.parent, prefix=f".{local_path.name}.", suffix=".tmp"
+    )
+    try:
+        # mkstemp files are private, give it the permissions open would
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, local_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class StorageBackend(ABC):
+    """
+    Base class for the storage a path points to. Paths are full urls, e.g.
+    "s3://bucket/key", "file:///tmp/data/key" or "mem://bucket/key", and
+    backends are chosen by the scheme with get_backend.
+    """
+
+    scheme = None
+
+    @abstractmethod
+    def read_bytes(self, path: str) -> bytes:
+        pass
+
+    @abstractmethod
+    def write_bytes(self, path: str, data: BytesLike):
+        """Writes data to path, replacing it atomically if it exists"""
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, path: str):
+        """Deletes path. Deleting a path that doesn't exist is not an error."""
+
+    @abstractmethod
+    def list_objects(self, folder_path: str) -> list:
+        """
+        Lists every object under folder_path (which should end in a slash)
+        :return: list of (path, size) tuples sorted by path
+        """
+
+    def copy(self, from_path: str, to_path: str):
+        return self.write_bytes(to_path, self.read_bytes(from_path))
+
+    def upload_file(self, local_file_path: Union[Path, str], path: str):
+        """Writes the contents of a local file to path"""
+        return self.write_bytes(path, Path(local_file_path).read_bytes())
+
+    def download_file(self, path: str, local_file_path: Union[Path, str]):
+        """
+        Writes the object at path to a local file, which is replaced
+        atomically if it exists
+        """
+        data = self.read_bytes(path)
+        write_atomically(local_file_path, lambda f: f.write(data))
+
+
+class S3Backend(StorageBackend):
+    """
+    Backend for s3:// paths using boto3, which the functions in
+    dataengineeringutils3.s3 use for S3 paths. Each call creates its own
+    client unless one is given, which is then shared by every call (boto3
+    clients are thread safe).
+
+    :param client: Optional boto3 s3 client to make every request with
+    :param transfer_config: Optional boto3 TransferConfig for upload_file and
+        download_file
+    """
+
+    scheme = "s3"
+
+    def __init__(self, client=None, transfer_config=None):
+        self.client = client
+        self.transfer_config = transfer_config
+
+    def _get_client(self):
+        return self.client if self.client is not None else boto3.client("s3")
+
+    def _bucket_key(self, path):
+        return split_url(path)[1].split("/", 1)
+
+    def read_bytes(self, path):
+        bucket, key = self._bucket_key(path)
+        return self._get_client().get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def write_bytes(self, path, data):
+        """:return: the put_object response"""
+        bucket, key = self._bucket_key(path)
+        if isinstance(data, memoryview):
+            # botocore only takes bytes, bytearrays and files as bodies
+            data = bytes(data)
+        return self._get_client().put_object(Bucket=bucket, Key=key, Body=data)
+
+    def exists(self, path):
+        bucket, key = self._bucket_key(path)
+        try:
+            self._get_client().head_object(Bucket=bucket, Key=key)
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                return False
+            raise
+        return True
+
+    def delete(self, path):
+        bucket, key = self._bucket_key(path)
+        return self._get_client().delete_object(Bucket=bucket, Key=key)
+
+    def copy(self, from_path, to_path):
+        """Copies server side, without the data passing through this process"""
+        from_bucket, from_key = self._bucket_key(from_path)
+        to_bucket, to_key = self._bucket_key(to_path)
+        return self._get_client().copy_object(
+            Bucket=to_bucket,
+            Key=to_key,
+            CopySource={"Bucket": from_bucket, "Key": from_key},
+        )
+
+    def list_objects(self, folder_path):
+        bucket, prefix = self._bucket_key(folder_path)
+        paginator = self._get_client().get_paginator("list_objects")
+        objects = []
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for o in page.get("Contents", []):
+                objects.append((f"s3://{bucket}/{o['Key']}", o["Size"]))
+        return sorted(objects)
+
+    def upload_file(self, local_file_path, path):
+        """Uploads with boto3's managed transfer (multipart for large files)"""
+        bucket, key = self._bucket_key(path)
+        return self._get_client().upload_file(
+            str(local_file_path), bucket, key, Config=self.transfer_config
+        )
+
+    def download_file(self, path, local_file_path):
+        bucket, key = self._bucket_key(path)
+        Path(local_file_path).parent.mkdir(parents=True, exist_ok=True)
+        return self._get_client().download_file(
+            bucket, key, str(local_file_path), Config=self.transfer_config
+        )
+
+
+class LocalBackend(StorageBackend):
+    """
+    Backend for file:// paths on the local filesystem, e.g.
+    "file:///tmp/data/part-0.jsonl.gz". Writes go to a temporary file in the
+    same folder which is then moved into place with os.replace, so readers
+    never see a partly written file. Memoryviews are written without copying.
+    """
+
+    scheme = "file"
+
+    def _local_path(self, path):
+        return Path(split_url(path)[1])
+
+    def read_bytes(self, path):
+        return self._local_path(path).read_bytes()
+
+    def _replace_with(self, path, write):
+        """Calls write on a temporary file and moves it to path when complete"""
+        write_atomically(self._local_path(path), write)
+
+    def write_bytes(self, path, data):
+        self._replace_with(path, lambda f: f.write(data))
+
+    def exists(self, path):
+        return self._local_path(path).is_file()
+
+    def delete(self, path):
+        try:
+            os.remove(self._local_path(path))
+        except FileNotFoundError:
+            pass
+
+    def copy(self, from_path, to_path):
+        self.upload_file(self._local_path(from_path), to_path)
+
+    def upload_file(self, local_file_path, path):
+        with open(local_file_path, "rb") as src:
+            self._replace_with(path, lambda f: shutil.copyfileobj(src, f))
+
+    def download_file(self, path, local_file_path):
+        with open(self._local_path(path), "rb") as src:
+            write_atomically(local_file_path, lambda f: shutil.copyfileobj(src, f))
+
+    def list_objects(self, folder_path):
+        folder = self._local_path(folder_path)
+        url_prefix = folder_path if folder_path.endswith("/") else folder_path + "/"
+        if not folder.is_dir():
+            return []
+        objects = []
+        for p in folder.rglob("*"):
+            # Skip the temporary files of writes in progress
+            if p.is_file() and not (p.name.startswith(".") and p.suffix == ".tmp"):
+                relative = p.relative_to(folder).as_posix()
+                objects.append((url_prefix + relative, p.stat().st_size))
+        return sorted(objects)
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Backend for mem:// paths held in a dict in this process, for tests,
+    benchmarks and dev pipelines that shouldn't touch S3 or disk. bytes are
+    stored and returned as is without copying. Other buffers, such as the
+    memoryview BytesSplitFileWriter writes, are copied once as the store has
+    to own data that may change after the write.
+    """
+
+    scheme = "mem"
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def read_bytes(self, path):
+        try:
+            return self._objects[path]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def write_bytes(self, path, data):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        with self._lock:
+            self._objects[path] = data
+
+    def exists(self, path):
+        return path in self._objects
+
+    def delete(self, path):
+        with self._lock:
+            self._objects.pop(path, None)
+
+    def list_objects(self, folder_path):
+        with self._lock:
+            return sorted(
+                (p, len(data))
+                for p, data in self._objects.items()
+                if p.startswith(folder_path)
+            )
+
+    def clear(self):
+        """Deletes everything in the store"""
+        with self._lock:
+            self._objects = {}
+
+
+_BACKENDS = {
+    "s3": S3Backend(),
+    "file": LocalBackend(),
+    "mem": MemoryBackend(),
+}
+
+
+def register_backend(scheme: str, backend: StorageBackend):
+    """Uses backend for paths starting with scheme://"""
+    _BACKENDS[scheme] = backend
+
+
+def get_backend(path: str) -> StorageBackend:
+    """
+    Returns the storage backend for the scheme of path. Paths without a
+    scheme are S3 paths.
+    """
+    scheme = split_url(path)[0]
+    try:
+        return _BACKENDS[scheme]
+    except KeyError:
+        raise ValueError(f"No storage backend registered for {scheme}://") from None
@@ -1,9 +1,9 @@
 import sys
 import os
 import gzip
-import boto3
 
-from dataengineeringutils3.s3 import gzip_string_write_to_s3, s3_path_to_bucket_key
+from dataengineeringutils3.s3 import gzip_string_write_to_s3
+from dataengineeringutils3.storage import get_backend
 
 from io import BytesIO, StringIO
 
@@ -84,16 +84,28 @@ class BaseSplitFileWriter:
             return False
 
     def write_to_s3(self):
-        s3_resource = boto3.resource("s3")
-        b, k = s3_path_to_bucket_key(self.get_s3_filepath())
-        data = self.mem_file.getvalue()
-        if self.compress_on_upload:
-            data = self._compress_data(data)
-
-        s3_resource.Object(b, k).put(Body=data)
-
+        s3_path = self.get_s3_filepath()
+        self._write_to_backend(get_backend(s3_path), s3_path)
         self.reset_file_buffer()
 
+    def _write_to_backend(self, backend, path):
+        """
+        Writes the in memory file to an s3://, file:// or mem:// path (see
+        dataengineeringutils3.storage)
+        """
+        if self.compress_on_upload:
+            data = self._compress_data(self.mem_file.getvalue())
+        elif isinstance(self.mem_file, BytesIO):
+            # Hand the backend a view of the buffer rather than a copy of it.
+            # LocalBackend writes it without copying, backends that keep or
+            # send the data copy it once, as getvalue would.
+            with self.mem_file.getbuffer() as view:
+                backend.write_bytes(path, view)
+            return
+        else:
+            data = self.mem_file.getvalue().encode("utf-8")
+        backend.write_bytes(path, data)
+
     def reset_file_buffer(self):
         self.num_files += 1
         self.mem_file.close()
@@ -1,12 +1,33 @@
 import os
+import sqlite3
+import zlib
 
 import boto3
 from moto import mock_aws
 import pytest
 
 from dataengineeringutils3.db import SelectQuerySet
+from dataengineeringutils3.storage import get_backend
 from tests.helpers import mock_object
-from tests.mocks import MockCursor
+from tests.mocks import KwargsConnection, MockCursor
+
+# Tests with these markers are skipped unless their option is given
+OPTIONAL_MARKERS = {"slow": "--run-slow", "benchmark": "--run-benchmarks"}
+
+
+def pytest_addoption(parser):
+    for marker, option in OPTIONAL_MARKERS.items():
+        parser.addoption(option, action="store_true", help=f"Run {marker} tests")
+
+
+def pytest_collection_modifyitems(config, items):
+    for marker, option in OPTIONAL_MARKERS.items():
+        if config.getoption(option):
+            continue
+        skip = pytest.mark.skip(reason=f"{marker} test, pass {option} to run it")
+        for item in items:
+            if marker in item.keywords:
+                item.add_marker(skip)
 
 
 @pytest.fixture(scope="function")
@@ -33,6 +54,15 @@ def bucket(s3):
         )
 
 
+@pytest.fixture
+def mem():
+    """The in-memory storage backend, emptied before and after the test"""
+    backend = get_backend("mem://")
+    backend.clear()
+    yield backend
+    backend.clear()
+
+
 @pytest.fixture(scope="function")
 def sts(aws_credentials):
     with mock_aws():
@@ -54,3 +84,39 @@ def large_select_queryset():
 @pytest.fixture
 def result_set():
     return ['{"uuid": "fkjherpiutrgponfevpoir3qjgp8prueqhf9pq34hf89hwfpu92q"}'] * 100000
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    """Returns the path of a sqlite database with a people table of 1000 rows"""
+    db_path = tmp_path / "test.db"
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, score REAL)"
+    )
+    connection.executemany(
+        "INSERT INTO people VALUES (?, ?, ?)",
+        [(i, f"person {i}", i / 4) for i in range(1, 1001)],
+    )
+    connection.commit()
+    connection.close()
+    return db_path
+
+
+@pytest.fixture
+def sqlite_connection_factory(sqlite_path):
+    """
+    Returns a function that opens a new connection to the sqlite_path database,
+    passing bind params to execute as kwargs as cx_Oracle allows. MOD and
+    ORA_HASH are defined so the Oracle partition predicates can run against it.
+    """
+
+    def connection_factory():
+        connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+        connection.create_function("MOD", 2, lambda a, b: a % b)
+        connection.create_function(
+            "ORA_HASH", 2, lambda v, n: zlib.crc32(str(v).encode()) % (n + 1)
+        )
+        return KwargsConnection(connection)
+
+    return connection_factory
@@ -1,6 +1,10 @@
 import time
+from collections import Counter
+from contextlib import contextmanager
 from unittest.mock import Mock
 
+import boto3
+
 
 def get_object_attrs(obj):
     """Lists all attributes in an object"""
@@ -30,3 +34,35 @@ def time_func(func, *args, **kwargs):
     func(*args, **kwargs)
     end = time.time()
     return end - start
+
+
+def put_mock_s3_objects(bucket_name, keys, body=b"test"):
+    """
+    Puts objects straight into the moto backend, which is much quicker than
+    going through boto3 when building large test listings
+    """
+    from moto.core import DEFAULT_ACCOUNT_ID
+    from moto.s3.models import s3_backends
+
+    backend = s3_backends[DEFAULT_ACCOUNT_ID]["aws"]
+    for key in keys:
+        backend.put_object(bucket_name, key, body)
+
+
+@contextmanager
+def count_s3_requests():
+    """
+    Counts the S3 API calls made by clients created inside the context,
+    returned as a Counter keyed by operation name
+    """
+    counts = Counter()
+
+    def handler(model, **kwargs):
+        counts[model.name] += 1
+
+    events = boto3._get_default_session().events
+    events.register("before-call.s3", handler)
+    try:
+        yield counts
+    finally:
+        events.unregister("before-call.s3", handler)
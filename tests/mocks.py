@@ -1,3 +1,6 @@
+import time
+
+
 class MockCursor:
     """Mocks cursor object for testing fetchmany db results"""
 
@@ -41,3 +44,121 @@ class MockQs:
             self.returned = True
             return self.results
         raise StopIteration()
+
+
+class SlowCursor:
+    """
+    DB-API like cursor returning numbered rows, with a fixed delay on each
+    fetchmany to stand in for the database round-trip
+    """
+
+    def __init__(self, length, latency=0.0, description=(("id",),), fail_after=None):
+        self.length = length
+        self.latency = latency
+        self.description = list(description)
+        self.fail_after = fail_after
+        self.arraysize = 1
+        self.n = 0
+        self.fetches = 0
+
+    def execute(self, *args, **kwargs):
+        pass
+
+    def fetchmany(self, fetch_size):
+        time.sleep(self.latency)
+        if self.fail_after is not None and self.fetches >= self.fail_after:
+            raise ConnectionError("connection lost")
+        self.fetches += 1
+        rows = [(i,) for i in range(self.n, min(self.n + fetch_size, self.length))]
+        self.n += len(rows)
+        return rows
+
+
+class KwargsCursor:
+    """
+    Wraps a sqlite3 cursor so that bind params are passed to execute as kwargs,
+    as SelectQuerySet does for cx_Oracle
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.arraysize = cursor.arraysize
+
+    def execute(self, query, **kwargs):
+        return self._cursor.execute(query, kwargs)
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(self.arraysize if size is None else size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class KwargsConnection:
+    """Wraps a sqlite3 connection to return KwargsCursors"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return KwargsCursor(self._connection.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class SlowConnection:
+    """
+    Wraps a DB-API connection so that each statement sent with execute or
+    executemany waits latency seconds first, to stand in for the network
+    round-trip to a database server
+    """
+
+    def __init__(self, connection, latency):
+        self._connection = connection
+        self.latency = latency
+
+    def cursor(self):
+        return SlowConnectionCursor(self._connection.cursor(), self.latency)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class SlowConnectionCursor:
+    def __init__(self, cursor, latency):
+        self._cursor = cursor
+        self.latency = latency
+
+    def execute(self, *args):
+        time.sleep(self.latency)
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        time.sleep(self.latency)
+        return self._cursor.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ListCursor:
+    """DB-API like cursor returning the given rows"""
+
+    def __init__(self, rows, description):
+        self.rows = list(rows)
+        self.description = list(description)
+        self.arraysize = 1
+
+    def execute(self, *args, **kwargs):
+        pass
+
+    def fetchmany(self, fetch_size):
+        rows, self.rows = self.rows[:fetch_size], self.rows[fetch_size:]
+        return rows
@@ -0,0 +1,151 @@
+import json
+
+import boto3
+import pytest
+import yaml
+
+from dataengineeringutils3.cache import S3ObjectCache
+from dataengineeringutils3.s3 import read_json_from_s3, read_yaml_from_s3
+
+bucket_name = "test"
+
+
+def test_read_json_from_s3_with_cache(s3, bucket):
+    s3.Object(bucket_name, "config.json").put(Body=json.dumps({"a": 1}))
+    cache = S3ObjectCache()
+
+    assert read_json_from_s3("s3://test/config.json", cache=cache) == {"a": 1}
+    assert read_json_from_s3("s3://test/config.json", cache=cache) == {"a": 1}
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+    assert cache.stats["revalidations"] == 1
+
+    # A changed object is picked up on revalidation
+    s3.Object(bucket_name, "config.json").put(Body=json.dumps({"a": 2}))
+    assert read_json_from_s3("s3://test/config.json", cache=cache) == {"a": 2}
+    assert cache.stats["misses"] == 2
+
+
+def test_read_yaml_from_s3_with_cache_ttl(s3, bucket):
+    s3.Object(bucket_name, "config.yaml").put(Body=yaml.dump({"a": 1}))
+    cache = S3ObjectCache(ttl=3600)
+
+    assert read_yaml_from_s3("s3://test/config.yaml", cache=cache) == {"a": 1}
+
+    # Within the TTL the cached copy is returned without contacting S3
+    s3.Object(bucket_name, "config.yaml").put(Body=yaml.dump({"a": 2}))
+    assert read_yaml_from_s3("s3://test/config.yaml", cache=cache) == {"a": 1}
+    assert cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "revalidations": 0,
+        "disk_hits": 0,
+        "evictions": 0,
+        "disk_evictions": 0,
+    }
+
+
+def test_cache_lru_eviction(s3, bucket):
+    cache = S3ObjectCache(max_items=2)
+    for i in range(3):
+        s3.Object(bucket_name, f"f{i}.json").put(Body="{}")
+        read_json_from_s3(f"s3://test/f{i}.json", cache=cache)
+
+    assert len(cache) == 2
+    assert "s3://test/f0.json" not in cache
+    assert cache.stats["evictions"] == 1
+
+
+def test_cache_invalidate_prefix(s3, bucket, tmp_path):
+    cache = S3ObjectCache(cache_dir=tmp_path)
+    paths = ["s3://test/a/1.json", "s3://test/a/2.json", "s3://test/b/1.json"]
+    for p in paths:
+        s3.Object(bucket_name, p.replace("s3://test/", "")).put(Body="{}")
+        read_json_from_s3(p, cache=cache)
+
+    assert cache.invalidate("s3://test/a/") == 2
+    assert "s3://test/b/1.json" in cache
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    cache.clear()
+    assert len(cache) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_disk_tier(s3, bucket, tmp_path):
+    s3.Object(bucket_name, "config.json").put(Body=json.dumps({"a": 1}))
+    read_json_from_s3("s3://test/config.json", cache=S3ObjectCache(cache_dir=tmp_path))
+
+    # A new cache sharing the folder starts warm
+    cache = S3ObjectCache(ttl=3600, cache_dir=tmp_path)
+    assert read_json_from_s3("s3://test/config.json", cache=cache) == {"a": 1}
+    assert cache.stats["disk_hits"] == 1
+    assert cache.stats["misses"] == 0
+
+
+def test_cache_shares_one_client(s3, bucket, tmp_path):
+    for i in range(3):
+        s3.Object(bucket_name, f"f{i}.json").put(Body="{}")
+    created = []
+
+    def count_client(**kwargs):
+        created.append(1)
+
+    cache = S3ObjectCache(cache_dir=tmp_path)
+    events = boto3._get_default_session().events
+    events.register("creating-client-class.s3", count_client)
+    try:
+        for _ in range(2):
+            for i in range(3):
+                read_json_from_s3(f"s3://test/f{i}.json", cache=cache)
+    finally:
+        events.unregister("creating-client-class.s3", count_client)
+    assert len(created) == 1
+    assert cache.stats["misses"] == 3
+    assert cache.stats["revalidations"] == 3
+
+
+def test_cache_revalidation_keeps_body_on_disk(s3, bucket, tmp_path):
+    s3.Object(bucket_name, "config.json").put(Body=json.dumps({"a": 1}))
+    cache = S3ObjectCache(cache_dir=tmp_path)
+    read_json_from_s3("s3://test/config.json", cache=cache)
+    body_path, meta_path = cache._disk_paths("s3://test/config.json")
+    body_inode = body_path.stat().st_ino
+    fetched_at = json.loads(meta_path.read_text())["fetched_at"]
+
+    assert read_json_from_s3("s3://test/config.json", cache=cache) == {"a": 1}
+    assert cache.stats["revalidations"] == 1
+    # Only the metadata was rewritten
+    assert body_path.stat().st_ino == body_inode
+    assert json.loads(meta_path.read_text())["fetched_at"] > fetched_at
+
+
+def test_cache_disk_limit(s3, bucket, tmp_path):
+    paths = [f"s3://test/f{i}.json" for i in range(4)]
+    for i, p in enumerate(paths):
+        s3.Object(bucket_name, f"f{i}.json").put(Body=json.dumps({"i": i}))
+
+    cache = S3ObjectCache(ttl=3600, cache_dir=tmp_path, max_disk_bytes=25)
+    for p in paths[:2]:
+        read_json_from_s3(p, cache=cache)
+    # Each body is 8 bytes, so a third fits and a fourth evicts the oldest
+    read_json_from_s3(paths[2], cache=cache)
+    assert cache.stats["disk_evictions"] == 0
+    read_json_from_s3(paths[3], cache=cache)
+    assert cache.stats["disk_evictions"] == 1
+    assert len(list(tmp_path.glob("*.body"))) == 3
+    assert not cache._disk_paths(paths[0])[0].exists()
+
+    # A cache opened with a lower limit keeps the most recently used objects
+    smaller = S3ObjectCache(ttl=3600, cache_dir=tmp_path, max_disk_bytes=16)
+    assert smaller.stats["disk_evictions"] == 1
+    assert read_json_from_s3(paths[3], cache=smaller) == {"i": 3}
+    assert smaller.stats["disk_hits"] == 1
+    assert not cache._disk_paths(paths[1])[0].exists()
+
+
+def test_cache_invalid_args():
+    with pytest.raises(ValueError):
+        S3ObjectCache(max_items=0)
+    with pytest.raises(ValueError):
+        S3ObjectCache(max_disk_bytes=-1)
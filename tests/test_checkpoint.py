@@ -0,0 +1,98 @@
+import pytest
+
+from dataengineeringutils3.checkpoint import (
+    CheckpointedJsonNlSplitFileWriter,
+    ExportCheckpoint,
+    resumable_export_query_to_s3,
+)
+from dataengineeringutils3.reader import JsonNlSplitFileReader
+from dataengineeringutils3.s3 import get_filepaths_from_s3_folder
+
+
+class FlakyCursor:
+    """Cursor whose fetchmany raises ConnectionError after fail_after calls"""
+
+    def __init__(self, cursor, fail_after):
+        self._cursor = cursor
+        self.fail_after = fail_after
+
+    def fetchmany(self, size):
+        if self.fail_after == 0:
+            raise ConnectionError("connection lost")
+        self.fail_after -= 1
+        return self._cursor.fetchmany(size)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_cursor", "fail_after"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+def resumable_export(cursor):
+    return resumable_export_query_to_s3(
+        cursor,
+        "SELECT id, name FROM people",
+        key_column="id",
+        s3_basepath="mem://bucket/people/",
+        filename_prefix="people",
+        checkpoint_path="mem://state/people.json",
+        fetch_size=50,
+        chunk_size=100,
+    )
+
+
+@pytest.mark.parametrize("fail_after,files_before_failure", [(6, 3), (7, 4)])
+def test_resumable_export_query_to_s3(
+    sqlite_connection_factory, mem, fail_after, files_before_failure
+):
+    connection = sqlite_connection_factory()
+    checkpoint = ExportCheckpoint("mem://state/people.json")
+
+    with pytest.raises(ConnectionError):
+        resumable_export(FlakyCursor(connection.cursor(), fail_after))
+    state = checkpoint.get()
+    assert state["num_files"] == files_before_failure
+    assert state["total_lines"] == fail_after * 50
+    assert state["resume_key"] == fail_after * 50
+    # A file written after the last checkpoint is overwritten on resume
+    mem.write_bytes(
+        f"mem://bucket/people/people-{files_before_failure}.jsonl.gz", b"partial"
+    )
+
+    result = resumable_export(connection.cursor())
+    assert result == {
+        "num_files": 10 + files_before_failure - 3,
+        "total_lines": 1000,
+        "resumed_from": fail_after * 50,
+    }
+    assert checkpoint.get() is None
+    records = list(JsonNlSplitFileReader("mem://bucket/people"))
+    assert sorted(r["id"] for r in records) == list(range(1, 1001))
+    assert len(get_filepaths_from_s3_folder("mem://bucket/people")) == (
+        result["num_files"]
+    )
+
+
+def test_checkpointed_writer(mem):
+    checkpoint = ExportCheckpoint("mem://state/c.json")
+    with CheckpointedJsonNlSplitFileWriter(
+        "mem://bucket/c/",
+        "c",
+        checkpoint,
+        key_func=int,
+        chunk_size=2,
+    ) as writer:
+        for i in range(3):
+            writer.write_line(str(i))
+            if i == 1:
+                assert checkpoint.get()["resume_key"] == 1
+    # close writes the last file
+    assert checkpoint.get()["num_files"] == 2
+    assert checkpoint.get()["resume_key"] == 2
+
+    with pytest.raises(ValueError):
+        CheckpointedJsonNlSplitFileWriter("mem://bucket/d/", "c", checkpoint, str)
@@ -0,0 +1,129 @@
+import boto3
+import pytest
+
+from dataengineeringutils3 import cli
+from dataengineeringutils3.cli import main
+from dataengineeringutils3.s3 import get_filepaths_from_s3_folder
+from tests.helpers import count_s3_requests, put_mock_s3_objects
+
+bucket_name = "test"
+
+
+@pytest.fixture
+def files(s3, bucket):
+    files = [
+        ("from/a.json", "a"),
+        ("from/b.csv", "bb"),
+        ("from/sub/c.json", "ccc"),
+        ("from/empty.json", ""),
+    ]
+    for key, body in files:
+        s3.Object(bucket_name, key).put(Body=body)
+    return files
+
+
+def test_cli_copy(files, capsys):
+    assert main(["copy", "s3://test/from", "s3://test/to", "--extension", "json"]) == 0
+    assert get_filepaths_from_s3_folder(
+        "s3://test/to", exclude_zero_byte_files=False
+    ) == ["s3://test/to/a.json", "s3://test/to/empty.json", "s3://test/to/sub/c.json"]
+    out = capsys.readouterr().out
+    assert out.startswith("copied 3 objects (0.00 MB) in ")
+    assert "objects/sec" in out and "MB/sec" in out
+
+
+def test_cli_dry_run(files, capsys):
+    with count_s3_requests() as requests:
+        code = main(
+            ["delete", "s3://test/from/", "--exclude-zero-byte-files", "--dry-run"]
+        )
+    assert code == 0
+    assert requests == {"ListObjectsV2": 1}
+    assert capsys.readouterr().out.splitlines() == [
+        "delete s3://test/from/a.json",
+        "delete s3://test/from/b.csv",
+        "delete s3://test/from/sub/c.json",
+        "would have deleted 3 objects (0.00 MB)",
+    ]
+    assert len(get_filepaths_from_s3_folder("s3://test/from")) == 3
+
+
+def test_cli_delete_batches(s3, bucket, capsys):
+    put_mock_s3_objects(bucket_name, [f"many/{i}.json" for i in range(2500)])
+    with count_s3_requests() as requests:
+        assert main(["delete", "s3://test/many"]) == 0
+    assert requests["DeleteObjects"] == 3
+    assert get_filepaths_from_s3_folder("s3://test/many") == []
+
+
+def test_cli_delete_errors(s3, bucket, capsys):
+    put_mock_s3_objects(bucket_name, [f"locked/{i}.json" for i in range(3)])
+
+    def fail_first_key(parsed, **kwargs):
+        parsed["Errors"] = [{"Key": "locked/0.json", "Code": "AccessDenied"}]
+
+    events = boto3._get_default_session().events
+    events.register("after-call.s3.DeleteObjects", fail_first_key)
+    try:
+        assert main(["delete", "s3://test/locked"]) == 1
+    finally:
+        events.unregister("after-call.s3.DeleteObjects", fail_first_key)
+    err = capsys.readouterr().err
+    assert "Failed to delete 1 objects" in err
+    assert "locked/0.json (AccessDenied)" in err
+
+
+def test_cli_initial_concurrency(files, monkeypatch, capsys):
+    limiters = []
+
+    class RecordingLimiter(cli.AdaptiveConcurrencyLimiter):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            limiters.append(kwargs)
+
+    monkeypatch.setattr(cli, "AdaptiveConcurrencyLimiter", RecordingLimiter)
+    assert main(["copy", "s3://test/from", "s3://test/a"]) == 0
+    assert main(["copy", "s3://test/from", "s3://test/b", "--concurrency", "4"]) == 0
+    args = ["copy", "s3://test/from", "s3://test/c", "--initial-concurrency", "16"]
+    assert main(args) == 0
+    assert limiters == [
+        {"initial_concurrency": 8, "max_concurrency": 32},
+        {"initial_concurrency": 4, "max_concurrency": 4},
+        {"initial_concurrency": 16, "max_concurrency": 32},
+    ]
+
+    assert main(args[:-1] + ["0"]) == 1
+    assert "concurrency" in capsys.readouterr().err
+
+
+def test_cli_upload_and_download(s3, bucket, tmp_path, capsys):
+    local = tmp_path / "local"
+    (local / "sub").mkdir(parents=True)
+    (local / "a.json").write_text("a")
+    (local / "sub" / "b.json").write_text("b")
+    (local / ".hidden.json").write_text("h")
+    (local / "c.txt").write_text("c")
+
+    args = ["upload", str(local), "s3://test/up", "--extension", ".json"]
+    assert main(args + ["--concurrency", "4"]) == 0
+    assert get_filepaths_from_s3_folder("s3://test/up") == [
+        "s3://test/up/a.json",
+        "s3://test/up/sub/b.json",
+    ]
+
+    assert main(args) == 1
+    assert "already exists" in capsys.readouterr().err
+    assert main(args + ["--overwrite"]) == 0
+
+    out = tmp_path / "out"
+    assert main(["download", "s3://test/up", str(out)]) == 0
+    assert (out / "up" / "a.json").read_text() == "a"
+    assert (out / "up" / "sub" / "b.json").read_text() == "b"
+    assert main(["download", "s3://test/up", str(out)]) == 1
+    assert main(["download", "s3://test/up", str(out), "--overwrite"]) == 0
+
+    s3.Object("test", "up/notes.txt").put(Body="n")
+    filtered = tmp_path / "filtered"
+    assert main(["download", "s3://test/up", str(filtered), "--extension", "json"]) == 0
+    assert not (filtered / "up" / "notes.txt").exists()
+    assert "downloaded 2 objects" in capsys.readouterr().out
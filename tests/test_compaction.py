@@ -0,0 +1,207 @@
+import gzip
+import os
+
+import pytest
+
+from dataengineeringutils3 import compaction
+from dataengineeringutils3.compaction import (
+    MAX_COPY_PART_BYTES,
+    MIN_MULTIPART_BYTES,
+    _group_objects,
+    _plan_parts,
+    compact_s3_folder,
+    delete_keys,
+)
+
+bucket_name = "test"
+
+
+def put_part(s3, key, lines):
+    body = gzip.compress("".join(f"{line}\n" for line in lines).encode("utf-8"))
+    s3.Object(bucket_name, key).put(Body=body)
+
+
+def read_lines(s3, key):
+    body = s3.Object(bucket_name, key).get()["Body"].read()
+    return gzip.decompress(body).decode("utf-8").splitlines()
+
+
+def list_keys(s3):
+    return sorted(o.key for o in s3.Bucket(bucket_name).objects.all())
+
+
+def test_group_objects():
+    objects = [("a", 5), ("b", 5), ("c", 20), ("d", 1)]
+    assert _group_objects(objects, 10) == [
+        [("a", 5), ("b", 5)],
+        [("c", 20)],
+        [("d", 1)],
+    ]
+
+
+def test_plan_parts():
+    large = MIN_MULTIPART_BYTES
+    # Too big for two copy parts, so split into three equal parts
+    huge = 3 * (MAX_COPY_PART_BYTES - 1)
+    third = MAX_COPY_PART_BYTES - 1
+    group = [
+        ("a", large),
+        ("b", 10),
+        ("c", large),
+        ("d", 10),
+        ("e", large),
+        ("f", large),
+        ("g", huge),
+        ("h", 10),
+    ]
+    assert _plan_parts(group) == [
+        ("copy", "a", f"bytes=0-{large - 1}"),
+        # Too small to be a part so c is downloaded with b
+        ("upload", ["b", "c"]),
+        ("upload", ["d", "e"]),
+        ("copy", "f", f"bytes=0-{large - 1}"),
+        ("copy", "g", f"bytes=0-{third - 1}"),
+        ("copy", "g", f"bytes={third}-{2 * third - 1}"),
+        ("copy", "g", f"bytes={2 * third}-{huge - 1}"),
+        ("upload", ["h"]),
+    ]
+    assert _plan_parts([("a", 10), ("b", 20)]) == [("upload", ["a", "b"])]
+
+
+class FailingDeleteClient:
+    """Client whose delete_objects fails for keys containing locked"""
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [o["Key"] for o in Delete["Objects"]]
+        return {
+            "Deleted": [{"Key": k} for k in keys if "locked" not in k],
+            "Errors": [
+                {"Key": k, "Code": "AccessDenied", "Message": "Access Denied"}
+                for k in keys
+                if "locked" in k
+            ],
+        }
+
+
+def test_delete_keys_errors():
+    keys = [f"data/{i}" for i in range(1500)] + ["data/locked-0", "data/locked-1"]
+    with pytest.raises(IOError, match="Failed to delete 2 objects") as e:
+        delete_keys(FailingDeleteClient(), "test", keys)
+    assert "data/locked-1 (AccessDenied)" in str(e.value)
+    delete_keys(FailingDeleteClient(), "test", keys[:1500])
+
+
+def test_compact_small_parts(s3, bucket):
+    for i in range(10):
+        put_part(s3, f"data/part-{i}.jsonl.gz", [f"line {i}.{j}" for j in range(3)])
+    s3.Object(bucket_name, "data/readme.txt").put(Body="keep me")
+
+    out = compact_s3_folder("s3://test/data", target_bytes=10**9)
+
+    assert out == ["s3://test/data/compacted-0.jsonl.gz"]
+    assert list_keys(s3) == ["data/compacted-0.jsonl.gz", "data/readme.txt"]
+    assert read_lines(s3, "data/compacted-0.jsonl.gz") == [
+        f"line {i}.{j}" for i in range(10) for j in range(3)
+    ]
+
+
+def test_compact_keep_source_and_output_folder(s3, bucket):
+    for i in range(4):
+        put_part(s3, f"data/part-{i}.jsonl.gz", [f"line {i}"])
+
+    out = compact_s3_folder(
+        "s3://test/data/",
+        output_s3_folder_path="s3://test/compacted/",
+        target_bytes=1,
+        delete_source=False,
+    )
+
+    # Every part is written out even though each group is a single file
+    assert len(out) == 4
+    assert len([k for k in list_keys(s3) if k.startswith("data/")]) == 4
+    assert read_lines(s3, "compacted/compacted-3.jsonl.gz") == ["line 3"]
+
+
+def test_compact_does_not_overwrite(s3, bucket):
+    put_part(s3, "data/compacted-0.jsonl.gz", ["old"])
+    put_part(s3, "data/compacted-1.jsonl.gz", ["older"])
+    put_part(s3, "data/part-0.jsonl.gz", ["new"])
+
+    out = compact_s3_folder("s3://test/data/")
+
+    assert out == ["s3://test/data/compacted-2.jsonl.gz"]
+    assert list_keys(s3) == ["data/compacted-2.jsonl.gz"]
+    assert read_lines(s3, "data/compacted-2.jsonl.gz") == ["old", "older", "new"]
+
+
+def test_compact_large_parts_server_side(s3, bucket):
+    # Random bytes do not compress so these parts are above the multipart limit
+    large = gzip.compress(os.urandom(MIN_MULTIPART_BYTES), compresslevel=1)
+    assert len(large) >= MIN_MULTIPART_BYTES
+    s3.Object(bucket_name, "data/part-0.bin.gz").put(Body=large)
+    small = gzip.compress(b"small\n")
+    s3.Object(bucket_name, "data/part-1.bin.gz").put(Body=small)
+    s3.Object(bucket_name, "data/part-2.bin.gz").put(Body=large)
+
+    out = compact_s3_folder("s3://test/data/", file_extension="bin.gz")
+
+    body = s3.Object(bucket_name, "data/compacted-0.bin.gz").get()["Body"].read()
+    assert out == ["s3://test/data/compacted-0.bin.gz"]
+    # The input order is kept
+    assert body == large + small + large
+
+
+def test_compact_partitioned_folder(s3, bucket):
+    for year in (2023, 2024):
+        for i in range(3):
+            put_part(s3, f"t/year={year}/part-{i}.jsonl.gz", [f"{year} {i}"])
+    put_part(s3, "t/part-0.jsonl.gz", ["top 0"])
+    put_part(s3, "t/part-1.jsonl.gz", ["top 1"])
+
+    out = compact_s3_folder("s3://test/t/", target_bytes=10**9)
+
+    # Files are never combined across folders
+    assert out == [
+        "s3://test/t/compacted-0.jsonl.gz",
+        "s3://test/t/year=2023/compacted-0.jsonl.gz",
+        "s3://test/t/year=2024/compacted-0.jsonl.gz",
+    ]
+    assert list_keys(s3) == [k.replace("s3://test/", "") for k in out]
+    assert read_lines(s3, "t/compacted-0.jsonl.gz") == ["top 0", "top 1"]
+    assert read_lines(s3, "t/year=2024/compacted-0.jsonl.gz") == [
+        f"2024 {i}" for i in range(3)
+    ]
+
+    compact_s3_folder("s3://test/t/", "s3://test/t/out/", target_bytes=1)
+    assert list_keys(s3) == [
+        "t/out/compacted-0.jsonl.gz",
+        "t/out/year=2023/compacted-0.jsonl.gz",
+        "t/out/year=2024/compacted-0.jsonl.gz",
+    ]
+
+
+def test_compact_write_error_deletes_written_sources(s3, bucket, monkeypatch):
+    for folder in ("a", "b"):
+        for i in range(2):
+            put_part(s3, f"t/{folder}/part-{i}.jsonl.gz", [f"{folder} {i}"])
+    write_group = compaction._write_group
+
+    def fail_in_b(s3_client, bucket, group, out_key):
+        if out_key.startswith("t/b/"):
+            raise IOError("upload failed")
+        return write_group(s3_client, bucket, group, out_key)
+
+    monkeypatch.setattr(compaction, "_write_group", fail_in_b)
+    with pytest.raises(IOError, match="upload failed"):
+        compact_s3_folder("s3://test/t/")
+    # The sources of the written output are deleted, the others are kept
+    assert list_keys(s3) == [
+        "t/a/compacted-0.jsonl.gz",
+        "t/b/part-0.jsonl.gz",
+        "t/b/part-1.jsonl.gz",
+    ]
+
+
+def test_compact_other_bucket():
+    with pytest.raises(ValueError):
+        compact_s3_folder("s3://test/data/", "s3://other/data/")
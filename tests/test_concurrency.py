@@ -0,0 +1,233 @@
+import threading
+import time
+from pathlib import Path
+
+import boto3
+import botocore
+import pytest
+
+from botocore.awsrequest import AWSResponse
+
+from dataengineeringutils3.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    is_throttling_error,
+    is_transient_error,
+)
+from dataengineeringutils3.s3 import (
+    copy_s3_folder_contents_to_new_folder,
+    delete_s3_folder_contents,
+    get_bulk_client,
+    write_local_folder_to_s3,
+    write_s3_folder_to_local,
+)
+
+bucket_name = "test"
+
+
+def client_error(code, status):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "CopyObject",
+    )
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(client_error("SlowDown", 503))
+    assert is_throttling_error(client_error("InternalError", 503))
+    assert not is_throttling_error(client_error("NoSuchKey", 404))
+    assert not is_throttling_error(ValueError())
+
+
+def test_limiter_increases_when_healthy():
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=2, max_concurrency=4)
+    assert limiter.map(lambda x: x * 2, range(50)) == [x * 2 for x in range(50)]
+    assert limiter.concurrency == 4
+    assert limiter.completed == 50
+
+
+def test_limiter_backs_off_on_throttling():
+    """
+    Fake service that throttles whenever more than 4 requests are in flight
+    """
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max_seen": 0}
+
+    def request(x):
+        with lock:
+            state["in_flight"] += 1
+            throttled = state["in_flight"] > 4
+        try:
+            time.sleep(0.002)
+            if throttled:
+                raise client_error("SlowDown", 503)
+            return x
+        finally:
+            with lock:
+                state["in_flight"] -= 1
+
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_concurrency=16, max_concurrency=32, cooldown=0, sample_interval=0
+    )
+    assert limiter.map(request, range(300)) == list(range(300))
+    assert limiter.throttles > 0
+    assert limiter.concurrency <= 8
+    stats = limiter.stats()
+    assert stats["completed"] == 300
+    assert stats["history"]
+    assert set(stats["history"][0]) == {
+        "time",
+        "concurrency",
+        "in_flight",
+        "completed",
+        "throttles",
+        "throughput",
+    }
+
+
+def test_limiter_raises_errors():
+    def request(x):
+        if x == 3:
+            raise ValueError("bad")
+        return x
+
+    limiter = AdaptiveConcurrencyLimiter()
+    with pytest.raises(ValueError):
+        limiter.map(request, range(10))
+    assert limiter.errors == 1
+
+    limiter = AdaptiveConcurrencyLimiter(max_retries=2)
+    with pytest.raises(botocore.exceptions.ClientError):
+        limiter.run(lambda: (_ for _ in ()).throw(client_error("SlowDown", 503)))
+    assert limiter.throttles == 3
+
+
+def test_is_transient_error():
+    assert is_transient_error(client_error("InternalError", 500))
+    assert is_transient_error(client_error("RequestTimeout", 400))
+    assert is_transient_error(
+        botocore.exceptions.EndpointConnectionError(endpoint_url="http://s3")
+    )
+    assert not is_transient_error(client_error("NoSuchKey", 404))
+    assert not is_transient_error(ValueError())
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        client_error("InternalError", 500),
+        client_error("RequestTimeout", 400),
+        botocore.exceptions.EndpointConnectionError(endpoint_url="http://s3"),
+    ],
+)
+def test_limiter_retries_transient_errors(error):
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) < 3:
+            raise error
+        return "ok"
+
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=4, max_concurrency=8)
+    assert limiter.run(request) == "ok"
+    assert len(calls) == 3
+    assert limiter.throttles == 0
+    assert limiter.concurrency == 4
+
+
+def test_limiter_map_stops_after_error():
+    started = []
+
+    def request(x):
+        started.append(x)
+        time.sleep(0.01)
+        if x == 0:
+            raise ValueError("bad")
+        return x
+
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=1, max_concurrency=8)
+    with pytest.raises(ValueError):
+        limiter.map(request, range(100))
+    assert len(started) < 10
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"initial_concurrency": 0},
+        {"min_concurrency": 4, "initial_concurrency": 2},
+        {"initial_concurrency": 100, "max_concurrency": 10},
+        {"decrease_factor": 1},
+    ],
+)
+def test_limiter_invalid_args(kwargs):
+    with pytest.raises(ValueError):
+        AdaptiveConcurrencyLimiter(**kwargs)
+
+
+def test_bulk_functions_with_limiter(s3, bucket, tmp_path):
+    local = tmp_path / "upload"
+    for i in range(20):
+        (local / "sub").mkdir(parents=True, exist_ok=True)
+        (local / "sub" / f"{i}.txt").write_text(str(i))
+
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=4, max_concurrency=8)
+    write_local_folder_to_s3(local, "s3://test/src", limiter=limiter)
+    with pytest.raises(ValueError):
+        write_local_folder_to_s3(local, "s3://test/src", limiter=limiter)
+
+    copy_s3_folder_contents_to_new_folder(
+        "s3://test/src", "s3://test/dest", limiter=limiter
+    )
+    delete_s3_folder_contents("s3://test/src", limiter=limiter)
+    keys = sorted(o.key for o in s3.Bucket(bucket_name).objects.all())
+    assert keys == sorted(f"dest/sub/{i}.txt" for i in range(20))
+
+    download = Path(tmp_path) / "download"
+    write_s3_folder_to_local("s3://test/dest", download, limiter=limiter)
+    assert (download / "dest" / "sub" / "7.txt").read_text() == "7"
+    assert limiter.completed == 80
+
+
+class RawBody:
+    """Raw HTTP body of a stubbed response"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def test_bulk_throttling_reaches_limiter(s3, bucket):
+    for i in range(10):
+        s3.Object(bucket_name, f"src/{i}.txt").put(Body=str(i))
+    slow_downs = []
+    lock = threading.Lock()
+
+    def slow_down(request, **kwargs):
+        # The first three copies are throttled, then S3 recovers
+        with lock:
+            if len(slow_downs) == 3:
+                return None
+            slow_downs.append(request.url)
+        body = b"<Error><Code>SlowDown</Code><Message>Slow down</Message></Error>"
+        return AWSResponse(request.url, 503, {}, RawBody(body))
+
+    limiter = AdaptiveConcurrencyLimiter(initial_concurrency=2, max_concurrency=4)
+    assert get_bulk_client(limiter).meta.config.retries["total_max_attempts"] == 1
+
+    events = boto3._get_default_session().events
+    events.register("before-send.s3.CopyObject", slow_down)
+    try:
+        copy_s3_folder_contents_to_new_folder(
+            "s3://test/src", "s3://test/dest", limiter=limiter
+        )
+    finally:
+        events.unregister("before-send.s3.CopyObject", slow_down)
+
+    # botocore did not retry the throttled requests itself, the limiter did
+    assert limiter.throttles == 3
+    keys = [o.key for o in s3.Bucket(bucket_name).objects.filter(Prefix="dest/")]
+    assert len(keys) == 10
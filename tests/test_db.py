@@ -1,7 +1,21 @@
+import sqlite3
+import time
+
+from array import array
 from unittest.mock import call
 
-from dataengineeringutils3.db import SelectQuerySet
-from tests.mocks import MockQs
+import pytest
+
+from dataengineeringutils3.db import (
+    AdaptiveFetchSize,
+    KeysetSelectQuerySet,
+    PartitionedSelectQuerySet,
+    SelectQuerySet,
+    key_range_partitions,
+    mod_partitions,
+    ora_hash_partitions,
+)
+from tests.mocks import ListCursor, MockQs, SlowCursor
 
 
 def test_select_queryset(select_queryset):
@@ -41,3 +55,481 @@ def loop_through_list(result_set):
             results.append(out)
         break
     return results
+
+
+def test_select_queryset_prefetch(select_queryset):
+    results = [row for rows in select_queryset.iter_chunks(prefetch=2) for row in rows]
+    assert (
+        results
+        == ['{"uuid": "fkjherpiutrgponfevpoir3qjgp8prueqhf9pq34hf89hwfpu92q"}'] * 15
+    )
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_select_queryset_prefetch_raise_error(prefetch):
+    qs = SelectQuerySet(SlowCursor(10, fail_after=2), "", 2)
+    chunks = list(qs.iter_chunks(prefetch=prefetch))
+    assert chunks == [[(0,), (1,)], [(2,), (3,)]]
+
+    qs = SelectQuerySet(SlowCursor(10, fail_after=2), "", 2)
+    with pytest.raises(ConnectionError):
+        list(qs.iter_chunks(raise_error=True, prefetch=prefetch))
+
+    # Errors fetching the first chunk are always raised
+    qs = SelectQuerySet(SlowCursor(10, fail_after=0), "", 2)
+    with pytest.raises(ConnectionError):
+        list(qs.iter_chunks(prefetch=prefetch))
+
+
+def test_select_queryset_prefetch_stops_early():
+    cursor = SlowCursor(1000, latency=0.001)
+    qs = SelectQuerySet(cursor, "", 10)
+    for i, rows in enumerate(qs.iter_chunks(prefetch=2)):
+        if i == 2:
+            break
+    # The background fetch stops once the consumer has stopped
+    fetches = cursor.fetches
+    time.sleep(0.05)
+    assert cursor.fetches == fetches <= 5
+
+
+@pytest.mark.benchmark
+def test_speed_of_prefetch():
+    """
+    Benchmark of overlapping fetches with processing, where a chunk takes as
+    long to process as to fetch
+    """
+    latency = 0.02
+
+    def run(prefetch):
+        qs = SelectQuerySet(SlowCursor(200, latency=latency), "", 20)
+        start = time.perf_counter()
+        rows = []
+        for chunk in qs.iter_chunks(prefetch=prefetch):
+            time.sleep(latency)
+            rows.extend(chunk)
+        assert rows == [(i,) for i in range(200)]
+        return time.perf_counter() - start
+
+    sequential = run(0)
+    prefetched = run(2)
+    # 11 fetches and 10 chunks processed one after the other, against mostly
+    # overlapping fetches
+    assert sequential > 20 * latency
+    assert prefetched < sequential * 0.75
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+        self.closed = False
+
+    def write_lines(self, lines, line_transform=lambda x: x):
+        self.lines.extend(line_transform(line) for line in lines)
+
+    def close(self):
+        self.closed = True
+
+
+def test_partition_predicates():
+    assert key_range_partitions("id", 1, 10, 3) == [
+        (
+            "id >= :partition_lower AND id < :partition_upper",
+            {"partition_lower": lower, "partition_upper": lower + 4},
+        )
+        for lower in (1, 5, 9)
+    ]
+    assert mod_partitions("id", 2)[1] == (
+        "MOD(id, :partition_count) = :partition_index",
+        {"partition_count": 2, "partition_index": 1},
+    )
+    assert ora_hash_partitions("id", 4)[3] == (
+        "ORA_HASH(id, 3) = :partition_index",
+        {"partition_index": 3},
+    )
+
+
+@pytest.mark.parametrize(
+    "partitions",
+    [
+        key_range_partitions("id", 1, 1000, 4),
+        mod_partitions("id", 3),
+        ora_hash_partitions("name", 5),
+        [{"lower": 1, "upper": 500}, {"lower": 501, "upper": 1000}],
+    ],
+)
+def test_partitioned_select_queryset(sqlite_connection_factory, partitions):
+    query = "SELECT id, name FROM people"
+    if isinstance(partitions[0], dict):
+        query += " WHERE id BETWEEN :lower AND :upper"
+    progress = []
+    qs = PartitionedSelectQuerySet(
+        sqlite_connection_factory,
+        query,
+        partitions,
+        fetch_size=100,
+        max_workers=2,
+        progress_callback=progress.append,
+    )
+    writer = ListWriter()
+    qs.write_to_file(writer, lambda row: row[0])
+
+    assert sorted(writer.lines) == list(range(1, 1001))
+    assert qs.headers == ["id", "name"]
+    assert [p["status"] for p in qs.progress] == ["done"] * len(partitions)
+    assert sum(p["rows"] for p in qs.progress) == 1000
+    assert progress[-1]["status"] == "done"
+
+
+def test_partitioned_select_queryset_per_partition_writers(sqlite_connection_factory):
+    qs = PartitionedSelectQuerySet(
+        sqlite_connection_factory,
+        "SELECT id FROM people WHERE score >= :min_score",
+        key_range_partitions("id", 1, 1000, 4),
+        fetch_size=64,
+        min_score=100,
+    )
+    writers = {}
+
+    def writer_factory(i):
+        writers[i] = ListWriter()
+        return writers[i]
+
+    qs.write_to_files(writer_factory, lambda row: row[0])
+    assert sorted(writers) == [0, 1, 2, 3]
+    assert all(w.closed for w in writers.values())
+    assert writers[0].lines == []
+    assert writers[1].lines == list(range(400, 501))
+    assert writers[3].lines == list(range(751, 1001))
+    assert [p["rows"] for p in qs.progress] == [0, 101, 250, 250]
+
+
+class FailingWriter(ListWriter):
+    def write_lines(self, lines, line_transform=lambda x: x):
+        raise IOError("upload failed")
+
+
+class SlowWriter(ListWriter):
+    def write_lines(self, lines, line_transform=lambda x: x):
+        time.sleep(0.01)
+        super().write_lines(lines, line_transform)
+
+
+def test_partitioned_select_queryset_per_partition_writers_errors(
+    sqlite_connection_factory,
+):
+    qs = PartitionedSelectQuerySet(
+        sqlite_connection_factory,
+        "SELECT id FROM people",
+        mod_partitions("id", 4),
+        fetch_size=10,
+    )
+    writers = {}
+
+    def writer_factory(i):
+        writers[i] = FailingWriter() if i == 0 else SlowWriter()
+        return writers[i]
+
+    with pytest.raises(IOError, match="upload failed"):
+        qs.write_to_files(writer_factory)
+    # The other partitions were stopped and no writer was closed
+    assert not any(w.closed for w in writers.values())
+    assert [p["status"] for p in qs.progress] == ["failed"] + ["stopped"] * 3
+    assert sum(p["rows"] for p in qs.progress) < 750
+
+
+def test_partitioned_select_queryset_errors(sqlite_connection_factory):
+    qs = PartitionedSelectQuerySet(
+        sqlite_connection_factory,
+        "SELECT id FROM missing_table",
+        mod_partitions("id", 2),
+    )
+    with pytest.raises(Exception, match="no such table"):
+        list(qs.iter_chunks())
+
+
+def test_partitioned_select_queryset_stops_early(sqlite_connection_factory):
+    qs = PartitionedSelectQuerySet(
+        sqlite_connection_factory,
+        "SELECT id FROM people",
+        mod_partitions("id", 4),
+        fetch_size=10,
+    )
+    for n, (i, rows) in enumerate(qs.iter_chunks()):
+        assert len(rows) == 10
+        if n == 3:
+            break
+    assert all(p["status"] in ("done", "stopped") for p in qs.progress)
+    assert sum(p["rows"] for p in qs.progress) < 1000
+
+
+def people_queryset(sqlite_connection_factory, fetch_size=300):
+    return SelectQuerySet(
+        sqlite_connection_factory().cursor(),
+        "SELECT id, name, score, CASE WHEN id % 2 THEN id END AS odd FROM people",
+        fetch_size,
+    )
+
+
+def test_iter_column_batches(sqlite_connection_factory):
+    qs = people_queryset(sqlite_connection_factory)
+    batches = list(qs.iter_column_batches())
+
+    assert [len(b["id"]) for b in batches] == [300, 300, 300, 100]
+    first = batches[0]
+    assert list(first) == ["id", "name", "score", "odd"]
+    assert first["id"] == array("q", range(1, 301))
+    assert first["score"] == array("d", [i / 4 for i in range(1, 301)])
+    assert first["name"][:2] == ["person 1", "person 2"]
+    assert first["odd"][:3] == [1, None, 3]
+    assert sum(sum(b["id"]) for b in batches) == sum(range(1, 1001))
+
+    with pytest.raises(ValueError):
+        next(people_queryset(sqlite_connection_factory).iter_column_batches("csv"))
+
+
+def test_iter_column_batches_numpy(sqlite_connection_factory):
+    np = pytest.importorskip("numpy")
+    qs = people_queryset(sqlite_connection_factory)
+    first = next(qs.iter_column_batches("numpy", prefetch=1))
+    assert first["id"].dtype == np.int64
+    assert first["score"].dtype == np.float64
+    assert first["name"].dtype == object
+    assert first["odd"].dtype == object
+    assert first["id"].tolist() == list(range(1, 301))
+
+
+def test_iter_column_batches_arrow(sqlite_connection_factory):
+    pa = pytest.importorskip("pyarrow")
+    qs = people_queryset(sqlite_connection_factory)
+    batches = list(qs.iter_column_batches("arrow"))
+    assert sum(b.num_rows for b in batches) == 1000
+    assert batches[0].schema.names == ["id", "name", "score", "odd"]
+    assert batches[0].schema.field("id").type == pa.int64()
+    assert batches[0].column(3).null_count == 150
+
+
+def mixed_queryset(big_int=2**70):
+    rows = [(1, 1), (2, 2.5), (2.5, 3), (3.7, 4), (4, big_int), (5, 6)]
+    return SelectQuerySet(ListCursor(rows, [("n",), ("m",)]), "query", 2)
+
+
+def test_iter_column_batches_mixed_types():
+    batches = list(mixed_queryset().iter_column_batches())
+    assert [b["n"] for b in batches] == [
+        array("q", [1, 2]),
+        array("d", [2.5, 3.7]),
+        # Widened types are kept for later batches
+        array("d", [4, 5]),
+    ]
+    assert batches[0]["m"] == array("d", [1, 2.5])
+    assert batches[1]["m"] == array("d", [3, 4])
+    assert batches[2]["m"] == [2**70, 6]
+
+
+def test_iter_column_batches_mixed_types_numpy():
+    np = pytest.importorskip("numpy")
+    batches = list(mixed_queryset().iter_column_batches("numpy"))
+    assert [b["n"].dtype for b in batches] == [np.int64, np.float64, np.float64]
+    assert batches[1]["n"].tolist() == [2.5, 3.7]
+    assert batches[2]["m"].dtype == object
+    assert batches[2]["m"].tolist() == [2**70, 6]
+
+
+def test_iter_column_batches_mixed_types_arrow(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    # Every arrow batch has the schema of the first, which has n as int64
+    with pytest.raises(ValueError, match="Column n"):
+        list(mixed_queryset(big_int=5).iter_column_batches("arrow"))
+
+    # Arrow has no column type for ints beyond 64 bits
+    qs = mixed_queryset(big_int=5)
+    batches = list(qs.iter_column_batches("arrow", column_types={"N": float}))
+    assert [b.schema for b in batches] == [batches[0].schema] * 3
+    assert batches[0].schema.field("n").type == pa.float64()
+    assert batches[1].column(0).to_pylist() == [2.5, 3.7]
+    assert batches[2].schema.field("m").type == pa.float64()
+
+    with pq.ParquetWriter(tmp_path / "mixed.parquet", batches[0].schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    assert pq.read_table(tmp_path / "mixed.parquet").num_rows == 6
+
+
+def test_iter_column_batches_arrow_stable_schema():
+    pa = pytest.importorskip("pyarrow")
+    rows = [(1, "a", 1), (2, None, 2), (None, "c", 3.0), (4, "d", 4)]
+    description = [
+        ("n", None, None, None, None, None, None),
+        ("s", None, None, None, None, None, None),
+        # e.g. cx_Oracle's description of a NUMBER(10, 2) column
+        ("x", None, None, None, 10, 2, None),
+    ]
+    qs = SelectQuerySet(ListCursor(rows, description), "query", 2)
+    batches = list(qs.iter_column_batches("arrow"))
+    assert [b.schema for b in batches] == [batches[0].schema] * 2
+    assert batches[0].schema.types == [pa.int64(), pa.string(), pa.float64()]
+    assert batches[1].column(0).to_pylist() == [None, 4]
+
+    qs = SelectQuerySet(ListCursor(rows, description), "query", 2)
+    assert [b["x"] for b in qs.iter_column_batches()] == [
+        array("d", [1, 2]),
+        array("d", [3, 4]),
+    ]
+
+
+def test_iter_column_batches_column_types():
+    batches = list(mixed_queryset().iter_column_batches(column_types={"n": float}))
+    assert [b["n"].typecode for b in batches] == ["d", "d", "d"]
+    with pytest.raises(ValueError, match="Column n"):
+        list(mixed_queryset().iter_column_batches(column_types={"n": int}))
+    with pytest.raises(ValueError):
+        list(mixed_queryset().iter_column_batches(column_types={"z": int}))
+
+
+def test_adaptive_fetch_size_targets_bytes():
+    cursor = SlowCursor(5000)
+    adaptive = AdaptiveFetchSize(
+        target_bytes=10000, min_fetch_size=10, size_func=lambda rows: 100 * len(rows)
+    )
+    qs = SelectQuerySet(cursor, "", 1000)
+    rows = [row for chunk in qs.iter_chunks(adaptive=adaptive) for row in chunk]
+
+    assert rows == [(i,) for i in range(5000)]
+    assert adaptive.fetch_sizes == [1000] + [100] * 40
+    assert adaptive.history[0] == {
+        "fetch_size": 1000,
+        "rows": 1000,
+        "bytes": 100000,
+        "latency": adaptive.history[0]["latency"],
+    }
+    assert cursor.arraysize == 100
+
+
+def test_adaptive_fetch_size_bounds():
+    adaptive = AdaptiveFetchSize(
+        target_bytes=10**9,
+        max_fetch_size=50000,
+        size_func=lambda rows: 10 * len(rows),
+    )
+    qs = SelectQuerySet(SlowCursor(200000), "", 1000)
+    chunks = list(qs.iter_chunks(adaptive=adaptive, prefetch=2))
+    assert sum(len(c) for c in chunks) == 200000
+    # Grows by at most growth_factor a step, up to max_fetch_size
+    assert adaptive.fetch_sizes[:5] == [1000, 4000, 16000, 50000, 50000]
+
+    adaptive = AdaptiveFetchSize(max_latency=0.5)
+    adaptive.fetch_size = 1000
+    assert adaptive._next_fetch_size(1000, 1000, latency=1.0) == 500
+    assert adaptive._next_fetch_size(1000, 10**12, latency=0.0) == 100
+
+    with pytest.raises(ValueError):
+        AdaptiveFetchSize(min_fetch_size=10, max_fetch_size=5)
+
+
+def test_adaptive_fetch_size_wide_and_narrow_rows(sqlite_connection_factory):
+    def fetch_sizes(query):
+        adaptive = AdaptiveFetchSize(
+            target_bytes=20000, min_fetch_size=10, initial_fetch_size=50
+        )
+        qs = SelectQuerySet(sqlite_connection_factory().cursor(), query, 50)
+        assert sum(len(c) for c in qs.iter_chunks(adaptive=adaptive)) == 1000
+        return adaptive.fetch_sizes
+
+    narrow = fetch_sizes("SELECT id FROM people")
+    wide = fetch_sizes("SELECT id, name, printf('%.500c', 'x') FROM people")
+    # About 5 bytes a row for the narrow query and 530 for the wide one
+    assert narrow == [50, 200, 800]
+    assert all(30 < size < 50 for size in wide[1:])
+
+
+class RecordingCursor:
+    """Wraps a cursor, recording the queries executed"""
+
+    def __init__(self, cursor):
+        self.__dict__["_cursor"] = cursor
+        self.__dict__["executed"] = []
+
+    def execute(self, query, params):
+        self.executed.append((query, params))
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+@pytest.mark.parametrize("page_size,pages", [(300, 4), (250, 5), (None, 11)])
+def test_keyset_select_queryset(sqlite_path, page_size, pages):
+    cursor = RecordingCursor(sqlite3.connect(sqlite_path).cursor())
+    qs = KeysetSelectQuerySet(
+        cursor, "SELECT id, name FROM people", "ID", 100, page_size=page_size
+    )
+    assert qs.headers == ["id", "name"]
+    chunks = list(qs.iter_chunks())
+    assert [r[0] for rows in chunks for r in rows] == list(range(1, 1001))
+    assert max(len(rows) for rows in chunks) == 100
+    assert qs.pages == len(cursor.executed) == pages
+    assert qs.last_key == 1000
+
+    first_query, first_params = cursor.executed[0]
+    assert first_query == (
+        "SELECT * FROM (SELECT id, name FROM people) keyset_query "
+        "ORDER BY ID LIMIT :page_size"
+    )
+    assert first_params == {"page_size": page_size or 100}
+    query, params = cursor.executed[1]
+    assert "WHERE ID > :last_key ORDER BY ID" in query
+    assert params == {"page_size": page_size or 100, "last_key": page_size or 100}
+
+
+def test_keyset_select_queryset_interface(sqlite_path):
+    # A plain sqlite3 cursor, which only takes bind params as a mapping
+    connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+    query = "SELECT * FROM people WHERE score >= :min_score"
+
+    qs = KeysetSelectQuerySet(connection.cursor(), "select * from people", "id")
+    assert [r[0] for r in qs] == list(range(1, 1001))
+
+    qs = KeysetSelectQuerySet(connection.cursor(), query, "id", 30, min_score=200)
+    assert [r[0] for r in qs] == list(range(800, 1001))
+
+    qs = KeysetSelectQuerySet(
+        connection.cursor(), query, "id", 30, min_score=200, start_after=900
+    )
+    batches = list(qs.iter_column_batches())
+    assert [i for b in batches for i in b["id"]] == list(range(901, 1001))
+
+    qs = KeysetSelectQuerySet(connection.cursor(), query, "id", 30, min_score=200)
+    rows = [r for rows in qs.iter_chunks(prefetch=2) for r in rows]
+    assert [r[0] for r in rows] == list(range(800, 1001))
+
+    with pytest.raises(ValueError):
+        KeysetSelectQuerySet(connection.cursor(), query, "id", limit="top")
+    with pytest.raises(ValueError):
+        KeysetSelectQuerySet(connection.cursor(), query, "id", paramstyle="qmark")
+
+
+def test_keyset_select_queryset_fetch_first():
+    cursor = RecordingCursor(SlowCursor(0))
+    KeysetSelectQuerySet(cursor, "select * from t", "id", limit="fetch_first")
+    assert cursor.executed[0][0] == (
+        "SELECT * FROM (select * from t) keyset_query "
+        "ORDER BY id FETCH FIRST :page_size ROWS ONLY"
+    )
+
+
+def test_keyset_select_queryset_pyformat():
+    cursor = RecordingCursor(SlowCursor(0))
+    qs = KeysetSelectQuerySet(
+        cursor, "select * from t", "id", paramstyle="pyformat", start_after=5
+    )
+    assert cursor.executed[0] == (
+        "SELECT * FROM (select * from t) keyset_query "
+        "WHERE id > %(last_key)s ORDER BY id LIMIT %(page_size)s",
+        {"page_size": 1000, "last_key": 5},
+    )
+    assert qs.last_key == 5
@@ -0,0 +1,155 @@
+import gzip
+import json
+import threading
+import time
+
+import pytest
+
+from dataengineeringutils3 import storage
+from dataengineeringutils3.db import SelectQuerySet
+from dataengineeringutils3.export import ExportPipeline, export_query_to_s3
+from dataengineeringutils3.reader import JsonNlSplitFileReader
+from dataengineeringutils3.s3 import get_filepaths_from_s3_folder
+from dataengineeringutils3.storage import MemoryBackend
+from tests.mocks import SlowCursor
+
+
+class SlowBackend(MemoryBackend):
+    """Memory backend that takes delay seconds for each write"""
+
+    def __init__(self, delay=0.0, fail_on=None):
+        super().__init__()
+        self.delay = delay
+        self.fail_on = fail_on
+        self.writing = 0
+        self.max_writing = 0
+        self._count_lock = threading.Lock()
+
+    def write_bytes(self, path, data):
+        if self.fail_on is not None and path.endswith(self.fail_on):
+            raise IOError("upload failed")
+        with self._count_lock:
+            self.writing += 1
+            self.max_writing = max(self.max_writing, self.writing)
+        time.sleep(self.delay)
+        super().write_bytes(path, data)
+        with self._count_lock:
+            self.writing -= 1
+
+
+@pytest.fixture
+def slow_backend():
+    backend = SlowBackend()
+    storage.register_backend("slow", backend)
+    yield backend
+    storage._BACKENDS.pop("slow")
+
+
+def test_export_query_to_s3(sqlite_connection_factory, mem):
+    qs = SelectQuerySet(
+        sqlite_connection_factory().cursor(), "SELECT * FROM people", 64
+    )
+    result = export_query_to_s3(qs, "mem://bucket/people/", "people", rows_per_file=300)
+
+    assert result["num_files"] == 4
+    assert result["total_lines"] == 1000
+    assert get_filepaths_from_s3_folder("mem://bucket/people") == [
+        f"mem://bucket/people/people-{i}.jsonl.gz" for i in range(4)
+    ]
+    first = gzip.decompress(mem.read_bytes("mem://bucket/people/people-0.jsonl.gz"))
+    assert first.decode("utf-8").splitlines()[0] == json.dumps(
+        {"id": 1, "name": "person 1", "score": 0.25}
+    )
+    records = list(JsonNlSplitFileReader("mem://bucket/people"))
+    assert [r["id"] for r in records] == list(range(1, 1001))
+
+    assert set(result["stages"]) == {"fetch", "encode", "compress", "upload"}
+    for stats in result["stages"].values():
+        assert stats["parts"] == 4
+        assert stats["rows"] == 1000
+    assert result["stages"]["upload"]["bytes"] == result["stages"]["compress"]["bytes"]
+    assert result["bottleneck"] in result["stages"]
+
+
+def test_export_query_to_s3_line_transform(s3, bucket):
+    qs = SelectQuerySet(SlowCursor(25), "query", 10)
+    result = export_query_to_s3(
+        qs,
+        "s3://test/ids/",
+        "ids",
+        rows_per_file=10,
+        line_transform=lambda row: json.dumps({"n": row[0]}),
+        encode_workers=2,
+        compress_workers=3,
+    )
+    assert result["num_files"] == 3
+    records = list(JsonNlSplitFileReader("s3://test/ids"))
+    assert sorted(r["n"] for r in records) == list(range(25))
+
+
+def test_export_pipeline_backpressure(slow_backend):
+    slow_backend.delay = 0.02
+    cursor = SlowCursor(200)
+    qs = SelectQuerySet(cursor, "query", 5)
+    pipeline = ExportPipeline(
+        qs, "slow://bucket/", "part", rows_per_file=5, upload_workers=2, queue_size=1
+    )
+
+    thread = threading.Thread(target=pipeline.run)
+    thread.start()
+    time.sleep(0.2)
+    # Uploads hold back the fetches: at most a queue and worker's worth of
+    # parts per stage are in flight
+    in_flight = cursor.fetches - len(slow_backend.list_objects("slow://bucket/"))
+    assert in_flight <= 3 * 2 + 2 + 1
+    thread.join()
+
+    assert slow_backend.max_writing <= 2
+    assert len(slow_backend.list_objects("slow://bucket/")) == 40
+    assert pipeline.stages[-1].parts == 40
+    assert pipeline.stages[0].blocked_seconds > 0
+
+
+def test_export_pipeline_reports_bottleneck(slow_backend):
+    slow_backend.delay = 0.01
+    qs = SelectQuerySet(SlowCursor(100), "query", 10)
+    result = export_query_to_s3(
+        qs, "slow://bucket/", "part", rows_per_file=10, upload_workers=1
+    )
+    assert result["bottleneck"] == "upload"
+    assert result["stages"]["upload"]["utilisation"] > 0.5
+    assert result["stages"]["upload"]["rows_per_second"] < 2000
+
+
+@pytest.mark.parametrize("failing_stage", ["fetch", "encode", "upload"])
+def test_export_pipeline_errors(slow_backend, failing_stage):
+    threads = threading.active_count()
+
+    def line_transform(row):
+        if failing_stage == "encode" and row[0] == 55:
+            raise ValueError("bad row")
+        return json.dumps(row)
+
+    fail_after = 5 if failing_stage == "fetch" else None
+    slow_backend.fail_on = "part-3.jsonl.gz" if failing_stage == "upload" else None
+    qs = SelectQuerySet(SlowCursor(1000, fail_after=fail_after), "query", 10)
+    expected = {"fetch": ConnectionError, "encode": ValueError, "upload": IOError}
+
+    with pytest.raises(expected[failing_stage]):
+        export_query_to_s3(
+            qs,
+            "slow://bucket/",
+            "part",
+            rows_per_file=10,
+            line_transform=line_transform,
+        )
+    assert threading.active_count() == threads
+
+
+def test_export_pipeline_empty(mem):
+    result = export_query_to_s3(
+        SelectQuerySet(SlowCursor(0), "query", 10), "mem://b/", "p"
+    )
+    assert result["num_files"] == 0
+    assert result["total_lines"] == 0
+    assert mem.list_objects("mem://b/") == []
@@ -0,0 +1,102 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from dataengineeringutils3.incremental import (
+    IncrementalSelectQuerySet,
+    S3WatermarkStore,
+    _decode_watermark,
+    _encode_watermark,
+)
+from dataengineeringutils3.s3 import read_json_from_s3
+
+
+@pytest.fixture
+def mem_store(mem):
+    return S3WatermarkStore("mem://state")
+
+
+def extract(connection, store, **kwargs):
+    qs = IncrementalSelectQuerySet(
+        connection.cursor(),
+        "SELECT id, name FROM people",
+        watermark_column="ID",
+        store=store,
+        name="people",
+        fetch_size=100,
+        **kwargs,
+    )
+    return qs, [row for rows in qs.iter_chunks() for row in rows]
+
+
+def test_incremental_select_queryset(sqlite_connection_factory, mem_store):
+    connection = sqlite_connection_factory()
+
+    qs, rows = extract(connection, mem_store)
+    assert len(rows) == 1000
+    assert qs.max_watermark == 1000
+    # Nothing is stored until the export is committed
+    assert mem_store.get("people") is None
+    assert qs.commit() == 1000
+    assert mem_store.get("people") == 1000
+
+    connection.executemany(
+        "INSERT INTO people VALUES (:id, :name, 0)",
+        [{"id": i, "name": f"new {i}"} for i in range(1001, 1006)],
+    )
+    qs, rows = extract(connection, mem_store)
+    assert [r[0] for r in rows] == list(range(1001, 1006))
+    qs.commit()
+    assert mem_store.get("people") == 1005
+
+    qs, rows = extract(connection, mem_store)
+    assert rows == []
+    assert qs.commit() == 1005
+
+
+def test_incremental_select_queryset_initial_watermark(
+    sqlite_connection_factory, mem_store
+):
+    connection = sqlite_connection_factory()
+    qs = IncrementalSelectQuerySet(
+        connection.cursor(),
+        "SELECT id FROM people",
+        "id",
+        mem_store,
+        "people",
+        initial_watermark=990,
+    )
+    assert [r[0] for r in qs] == list(range(991, 1001))
+    qs.commit()
+    assert mem_store.get("people") == 1000
+
+    with pytest.raises(ValueError):
+        IncrementalSelectQuerySet(
+            connection.cursor(), "SELECT id FROM people", "updated", mem_store, "x"
+        )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        datetime(2024, 1, 2, 3, 4, 5, 6),
+        date(2024, 1, 2),
+        Decimal("1.10"),
+        10,
+        "2024-01-02",
+    ],
+)
+def test_encode_watermark(value):
+    decoded = _decode_watermark(_encode_watermark(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_s3_watermark_store(s3, bucket):
+    store = S3WatermarkStore("s3://test/state")
+    assert store.get("table") is None
+    store.set("table", datetime(2024, 1, 2, 3, 4, 5))
+    assert store.get("table") == datetime(2024, 1, 2, 3, 4, 5)
+    state = read_json_from_s3("s3://test/state/table.json")
+    assert state["watermark"] == {"type": "datetime", "value": "2024-01-02T03:04:05"}
@@ -0,0 +1,100 @@
+import json
+
+import boto3
+import pytest
+
+from dataengineeringutils3.instrumentation import S3Stats, s3_stats
+from dataengineeringutils3.s3 import (
+    check_for_s3_file,
+    get_object_body,
+    write_json_to_s3,
+    write_local_file_to_s3,
+)
+
+bucket_name = "test"
+
+
+def test_s3_stats(s3, bucket):
+    with s3_stats() as stats:
+        write_json_to_s3({"a": 1}, "s3://test/a.json")
+        assert get_object_body("s3://test/a.json") == json.dumps({"a": 1})
+        assert not check_for_s3_file("s3://test/missing.json")
+
+    d = stats.to_dict()
+    assert sorted(d) == ["GetObject", "HeadObject", "PutObject"]
+    assert d["PutObject"]["requests"] == 1
+    assert d["PutObject"]["bytes_sent"] == len(json.dumps({"a": 1}))
+    assert d["GetObject"]["bytes_received"] == len(json.dumps({"a": 1}))
+    assert d["HeadObject"]["errors"] == 1
+    assert d["GetObject"]["retries"] == 0
+    assert d["GetObject"]["throttles"] == 0
+    assert sum(d["GetObject"]["latency_ms"]["histogram"].values()) == 1
+    assert stats.total_requests == 3
+
+    # Handlers are removed when the context exits
+    get_object_body("s3://test/a.json")
+    assert stats.total_requests == 3
+
+
+def test_s3_stats_only_instruments_new_clients(s3, bucket):
+    existing = boto3.client("s3", region_name="eu-west-1")
+    with s3_stats() as stats:
+        existing.list_buckets()
+        boto3.client("s3", region_name="eu-west-1").list_buckets()
+    assert stats.to_dict()["ListBuckets"]["requests"] == 1
+
+    session = boto3.Session(region_name="eu-west-1")
+    with s3_stats(session) as stats:
+        session.client("s3").list_buckets()
+        boto3.client("s3", region_name="eu-west-1").list_buckets()
+    assert stats.to_dict()["ListBuckets"]["requests"] == 1
+
+
+def test_s3_stats_local_file_upload(s3, bucket, tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("x" * 100)
+
+    with s3_stats() as stats:
+        write_local_file_to_s3(str(path), "s3://test/file.txt")
+
+    d = stats.to_dict()
+    # The existence check makes a HEAD request before every upload
+    assert d["HeadObject"]["requests"] == 1
+    assert d["PutObject"]["bytes_sent"] == 100
+
+
+def test_s3_stats_register_client(s3, bucket):
+    client = boto3.client("s3", region_name="eu-west-1")
+    stats = S3Stats()
+    stats.register(client.meta.events)
+    client.put_object(Bucket=bucket_name, Key="k", Body=b"body")
+    with pytest.raises(client.exceptions.NoSuchKey):
+        client.get_object(Bucket=bucket_name, Key="missing")
+
+    d = stats.to_dict()
+    assert d["PutObject"]["requests"] == 1
+    assert d["GetObject"]["errors"] == 1
+
+    stats.reset()
+    assert stats.to_dict() == {}
+    stats.unregister(client.meta.events)
+
+
+def test_s3_stats_throttling():
+    stats = S3Stats()
+    context = {}
+    event = "response-received.s3.GetObject"
+    stats._on_before_call(context=context)
+    for status, code in [(503, "SlowDown"), (503, "SlowDown"), (200, None)]:
+        stats._on_response_received(
+            response_dict={"status_code": status, "headers": {}},
+            parsed_response={"Error": {"Code": code}} if code else {},
+            context=context,
+            event_name=event,
+        )
+    stats._on_after_call_error(context=context, event_name="after-call.s3.GetObject")
+
+    d = stats.to_dict()["GetObject"]
+    assert d["throttles"] == 2
+    assert d["retries"] == 2
+    assert d["errors"] == 1
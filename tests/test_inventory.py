@@ -0,0 +1,105 @@
+import csv
+import gzip
+import io
+import json
+from urllib.parse import quote_plus
+
+import pytest
+
+from dataengineeringutils3.inventory import S3InventoryListing
+from dataengineeringutils3.s3 import (
+    copy_s3_folder_contents_to_new_folder,
+    delete_s3_folder_contents,
+    get_filepaths_from_s3_folder,
+)
+
+MANIFEST_PATH = "s3://inventory/test/all/2024-01-01T01-00Z/manifest.json"
+SCHEMA = ["Bucket", "Key", "VersionId", "IsLatest", "IsDeleteMarker", "Size"]
+
+
+@pytest.fixture
+def inventory(s3, bucket):
+    """
+    Generates an inventory of the test bucket split over several data files,
+    including a non-current version and a delete marker
+    """
+    s3.meta.client.create_bucket(
+        Bucket="inventory",
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-1"},
+    )
+    objects = [(f"data/part-{i}.jsonl.gz", 100 + i) for i in range(30)]
+    objects += [("data/sub/file with space.json", 5), ("data/empty.json", 0)]
+    objects += [("other/file.json", 10)]
+    for key, size in objects:
+        s3.Object("test", key).put(Body=b"x" * size)
+
+    rows = [["test", quote_plus(k), "v1", "true", "false", str(s)] for k, s in objects]
+    rows.append(["test", "data/old-version.json", "v0", "false", "false", "10"])
+    rows.append(["test", "data/deleted.json", "v2", "true", "true", ""])
+
+    files = []
+    for i, start in enumerate(range(0, len(rows), 10)):
+        out = io.StringIO()
+        csv.writer(out).writerows(rows[start:][:10])
+        key = f"test/all/data/{i}.csv.gz"
+        s3.Object("inventory", key).put(Body=gzip.compress(out.getvalue().encode()))
+        files.append({"key": key, "size": 0, "MD5checksum": ""})
+
+    manifest = {
+        "sourceBucket": "test",
+        "destinationBucket": "arn:aws:s3:::inventory",
+        "version": "2016-11-30",
+        "fileFormat": "CSV",
+        "fileSchema": ", ".join(SCHEMA),
+        "files": files,
+    }
+    s3.Object("inventory", MANIFEST_PATH.replace("s3://inventory/", "")).put(
+        Body=json.dumps(manifest)
+    )
+    return S3InventoryListing(MANIFEST_PATH, max_workers=3)
+
+
+@pytest.mark.parametrize(
+    "folder,file_extension,exclude_zero_byte_files",
+    [
+        ("s3://test/data", None, True),
+        ("s3://test/data/", None, False),
+        ("s3://test/data/", "json", False),
+        ("s3://test/data/sub", ".json", True),
+        ("s3://test/", "gz", True),
+    ],
+)
+def test_inventory_matches_listing(
+    inventory, folder, file_extension, exclude_zero_byte_files
+):
+    kwargs = {
+        "file_extension": file_extension,
+        "exclude_zero_byte_files": exclude_zero_byte_files,
+    }
+    assert get_filepaths_from_s3_folder(
+        folder, listing=inventory, **kwargs
+    ) == get_filepaths_from_s3_folder(folder, **kwargs)
+
+
+def test_inventory_list_objects(inventory):
+    assert inventory.source_bucket == "test"
+    assert inventory.list_objects("s3://test/data/", min_size=128) == [
+        ("s3://test/data/part-28.jsonl.gz", 128),
+        ("s3://test/data/part-29.jsonl.gz", 129),
+    ]
+    assert inventory.get_filepaths("s3://test/data/", max_size=5) == [
+        "s3://test/data/sub/file with space.json"
+    ]
+
+    with pytest.raises(ValueError):
+        inventory.get_filepaths("s3://other-bucket/data/")
+
+
+def test_bulk_functions_with_inventory(inventory, s3):
+    copy_s3_folder_contents_to_new_folder(
+        "s3://test/data/sub/", "s3://test/copy/", listing=inventory
+    )
+    delete_s3_folder_contents("s3://test/data/", listing=inventory)
+
+    keys = sorted(o.key for o in s3.Bucket("test").objects.all())
+    assert keys == ["copy/file with space.json", "other/file.json"]
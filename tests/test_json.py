@@ -1,10 +1,86 @@
-from datetime import datetime
+from datetime import date, datetime, timezone
+from decimal import Decimal
 import json
+import time
 
-from dataengineeringutils3.json import DateTimeEncoder
+import pytest
+
+from dataengineeringutils3.db import SelectQuerySet
+from dataengineeringutils3.json import DateTimeEncoder, RowEncoder, get_row_encoder
 
 
 def test_json_encoder():
     json_dict = {"datetime": datetime(2111, 1, 1, 1, 1, 1), "a": "b"}
     json_str = json.dumps(json_dict, cls=DateTimeEncoder)
     assert json_str == """{"datetime": "2111-01-01T01:01:01", "a": "b"}"""
+
+
+ROWS = [
+    (1, "person 1", 0.25, datetime(2024, 1, 2, 3, 4, 5), True, None),
+    (2, 'quote " and \\ and é', float("nan"), datetime(2024, 1, 2), False, -0.0),
+    (2**70, "", float("-inf"), datetime(2024, 1, 2, tzinfo=timezone.utc), 0, [1]),
+]
+HEADERS = ["id", "name", "score", "created", "flag", "note"]
+
+
+def test_row_encoder_matches_json_dumps():
+    encoder = RowEncoder([(h, None, None) for h in HEADERS])
+    for row in ROWS:
+        expected = json.dumps(dict(zip(HEADERS, row)), cls=DateTimeEncoder)
+        assert encoder(row) == expected
+    assert encoder.encode_rows(ROWS) == [encoder(r) for r in ROWS]
+    assert encoder.encode_lines(ROWS) == "".join(encoder(r) + "\n" for r in ROWS)
+    assert encoder.encode_lines([]) == ""
+
+
+def test_row_encoder_headers():
+    headers = ["a", "100%", 'say "hi"', "a"]
+    row = (1, 2, 3, 4)
+    expected = json.dumps(dict(zip(headers, row)))
+    assert RowEncoder(headers)(row) == expected
+    assert RowEncoder([])(()) == "{}"
+
+
+def test_row_encoder_dates_and_decimals():
+    encoder = RowEncoder(["d", "n", "x"])
+    line = encoder((date(2024, 1, 2), Decimal("1234567890.123456789012"), None))
+    assert line == '{"d": "2024-01-02", "n": 1234567890.123456789012, "x": null}'
+    assert encoder((None, Decimal("NaN"), None)) == '{"d": null, "n": NaN, "x": null}'
+
+
+def test_get_row_encoder(sqlite_connection_factory):
+    qs = SelectQuerySet(
+        sqlite_connection_factory().cursor(), "SELECT * FROM people", 100
+    )
+    encoder = get_row_encoder(qs)
+    assert encoder.headers == ["id", "name", "score"]
+    row = next(iter(qs))
+    assert encoder(row) == json.dumps(dict(zip(qs.headers, row)))
+
+
+def best_time(func, repeat=3):
+    """Returns the result of func and its fastest run time in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+@pytest.mark.benchmark
+def test_row_encoder_speed():
+    rows = [
+        (i, f"person {i}", i / 3, datetime(2024, 1, 1, 12, 0, i % 60), None)
+        for i in range(30_000)
+    ]
+    headers = ["id", "name", "score", "created", "note"]
+    encoder = RowEncoder(headers)
+
+    expected, json_dumps_time = best_time(
+        lambda: [json.dumps(dict(zip(headers, r)), cls=DateTimeEncoder) for r in rows]
+    )
+    lines, encoder_time = best_time(lambda: encoder.encode_rows(rows))
+
+    assert lines == expected
+    assert encoder_time < json_dumps_time / 1.5
@@ -0,0 +1,350 @@
+import tracemalloc
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dataengineeringutils3 import listing as listing_module
+from dataengineeringutils3.listing import (
+    S3Listing,
+    S3ListingIndex,
+    _glob_to_regex,
+    get_filepaths_from_s3_pattern,
+)
+from dataengineeringutils3.s3 import get_filepaths_from_s3_folder, s3_path_to_bucket_key
+from tests.helpers import count_s3_requests, put_mock_s3_objects
+
+bucket_name = "test"
+
+
+@pytest.fixture
+def files(s3, bucket):
+    files = [
+        ("f1/my_file.json", "test"),
+        ("f1/df.first.py", "test"),
+        ("f1/otherfile.json", ""),
+        ("f1/sub/big_file.json", "x" * 100),
+        ("f1/100%_done.json", "test"),
+        ("f/ffile.json", "test"),
+    ]
+    for key, body in files:
+        s3.Object(bucket_name, key).put(Body=body)
+    return files
+
+
+@pytest.mark.parametrize(
+    "file_extension,exclude_zero_byte_files",
+    [(None, True), (None, False), ("json", True), (".json", False), ("py", True)],
+)
+def test_listing_index_matches_get_filepaths(
+    files, tmp_path, file_extension, exclude_zero_byte_files
+):
+    index = S3ListingIndex(tmp_path / "listing.db")
+    assert index.get_filepaths(
+        "s3://test/f1",
+        file_extension=file_extension,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+    ) == get_filepaths_from_s3_folder(
+        "s3://test/f1",
+        file_extension=file_extension,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+    )
+
+
+def test_listing_index_filters(files, tmp_path):
+    index = S3ListingIndex(tmp_path / "listing.db")
+
+    assert index.get_filepaths("s3://test/f1/", glob="sub/*") == [
+        "s3://test/f1/sub/big_file.json"
+    ]
+    assert index.get_filepaths("s3://test/f1/", glob="*_*") == [
+        "s3://test/f1/100%_done.json",
+        "s3://test/f1/my_file.json",
+        "s3://test/f1/sub/big_file.json",
+    ]
+    assert index.get_filepaths("s3://test/f1/", min_size=50) == [
+        "s3://test/f1/sub/big_file.json"
+    ]
+    assert index.get_filepaths("s3://test/f1/", max_size=50) == [
+        "s3://test/f1/100%_done.json",
+        "s3://test/f1/df.first.py",
+        "s3://test/f1/my_file.json",
+    ]
+
+    now = datetime.now(timezone.utc)
+    assert index.get_filepaths("s3://test/f1/", modified_after=now + timedelta(1)) == []
+    assert (
+        len(index.get_filepaths("s3://test/f1/", modified_before=now + timedelta(1)))
+        == 4
+    )
+
+    objects = index.list_objects("s3://test/f/")
+    assert [o["s3_path"] for o in objects] == ["s3://test/f/ffile.json"]
+    assert objects[0]["size"] == 4
+    assert objects[0]["etag"]
+
+
+def test_listing_index_snapshot_reused(files, s3, tmp_path):
+    index = S3ListingIndex(tmp_path / "listing.db", ttl=None)
+    assert index.is_stale("s3://test/f1/")
+    index.get_filepaths("s3://test/f1/")
+    assert not index.is_stale("s3://test/f1/sub")
+
+    # New objects are not seen until the snapshot is refreshed
+    s3.Object(bucket_name, "f1/zz_new.json").put(Body="test")
+    s3.Object(bucket_name, "f1/aa_new.json").put(Body="test")
+    assert "s3://test/f1/zz_new.json" not in index.get_filepaths("s3://test/f1/")
+
+    # An incremental refresh only picks up keys after the last key listed
+    assert index.refresh("s3://test/f1/", incremental=True) == 1
+    paths = index.get_filepaths("s3://test/f1/")
+    assert "s3://test/f1/zz_new.json" in paths
+    assert "s3://test/f1/aa_new.json" not in paths
+
+    assert index.refresh("s3://test/f1/") == 7
+    assert "s3://test/f1/aa_new.json" in index.get_filepaths("s3://test/f1/")
+
+
+def test_listing_index_ttl_and_invalidate(files, s3, tmp_path):
+    index = S3ListingIndex(tmp_path / "listing.db", ttl=0)
+    index.get_filepaths("s3://test/f1/")
+    assert index.is_stale("s3://test/f1/")
+
+    index = S3ListingIndex(tmp_path / "listing.db", ttl=3600)
+    index.get_filepaths("s3://test/f/")
+    index.invalidate("s3://test/f/")
+    assert index.is_stale("s3://test/f/")
+    assert not index.is_stale("s3://test/f1/")
+
+    index.invalidate()
+    assert index.is_stale("s3://test/f1/")
+
+
+def test_listing_index_case_sensitive(s3, bucket, tmp_path):
+    for key in ("data/a.json", "DATA/b.json", "data/c.JSON"):
+        s3.Object(bucket_name, key).put(Body="test")
+    index = S3ListingIndex(tmp_path / "listing.db", ttl=None)
+
+    assert index.get_filepaths("s3://test/DATA/") == ["s3://test/DATA/b.json"]
+    assert index.get_filepaths("s3://test/data/") == [
+        "s3://test/data/a.json",
+        "s3://test/data/c.JSON",
+    ]
+    for folder in ("s3://test/data/", "s3://test/DATA/"):
+        for file_extension in ("json", "JSON"):
+            assert index.get_filepaths(
+                folder, file_extension=file_extension
+            ) == get_filepaths_from_s3_folder(folder, file_extension=file_extension)
+
+    # Refreshing or invalidating one casing leaves the other alone
+    index.refresh("s3://test/data/")
+    index.invalidate("s3://test/data/")
+    assert not index.is_stale("s3://test/DATA/")
+    with count_s3_requests() as requests:
+        assert index.get_filepaths("s3://test/DATA/") == ["s3://test/DATA/b.json"]
+    assert requests["ListObjectsV2"] == 0
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("data/*", []),
+        ("data/*/*", ["data/a/1.json", "data/a/2.txt", "data/b/1.json"]),
+        ("data/*/*.json", ["data/a/1.json", "data/b/1.json"]),
+        ("data/a/?.json", ["data/a/1.json"]),
+        ("data/[ab]/1.*", ["data/a/1.json", "data/b/1.json"]),
+        ("data/[!a]/*", ["data/b/1.json"]),
+        ("data/**/*.json", ["data/a/1.json", "data/b/1.json", "data/b/c/3.json"]),
+        (
+            "data/**",
+            ["data/a/1.json", "data/a/2.txt", "data/b/1.json", "data/b/c/3.json"],
+        ),
+        ("data/b/c/3.json", ["data/b/c/3.json"]),
+        ("other/*", []),
+    ],
+)
+def test_get_filepaths_from_s3_pattern(s3, bucket, pattern, expected):
+    keys = ["data/a/1.json", "data/a/2.txt", "data/b/1.json", "data/b/c/3.json"]
+    for key in keys:
+        s3.Object(bucket_name, key).put(Body="test")
+    s3.Object(bucket_name, "data/a/empty.json").put(Body="")
+
+    assert get_filepaths_from_s3_pattern(f"s3://test/{pattern}") == [
+        f"s3://test/{k}" for k in expected
+    ]
+
+
+def test_get_filepaths_from_s3_pattern_regex(s3, bucket):
+    for key in ["data/a/1.json", "data/a/2.json", "data/a/empty.json"]:
+        s3.Object(bucket_name, key).put(Body="" if "empty" in key else "test")
+
+    assert get_filepaths_from_s3_pattern("s3://test/data/a/*", regex=r"2\.json$") == [
+        "s3://test/data/a/2.json"
+    ]
+    assert get_filepaths_from_s3_pattern(
+        "s3://test/data/a/e*", exclude_zero_byte_files=False
+    ) == ["s3://test/data/a/empty.json"]
+
+
+def build_partition_tree(years, months, days, parts):
+    keys = [
+        f"data/year={y}/month={m:02}/day={d:02}/part-{p}.jsonl.gz"
+        for y in years
+        for m in range(1, months + 1)
+        for d in range(1, days + 1)
+        for p in range(parts)
+    ]
+    put_mock_s3_objects(bucket_name, keys)
+    return keys
+
+
+def test_pattern_listing_list_requests(s3, bucket):
+    """
+    Benchmark of the LIST requests saved by expanding wildcards with delimiter
+    listings rather than listing the whole tree and filtering
+    """
+    keys = build_partition_tree(range(2015, 2025), 12, 28, 3)
+    glob = "data/year=2024/month=06/day=0[1-3]/part-*.jsonl.gz"
+    regex = _glob_to_regex(glob)
+    expected = sorted(f"s3://test/{k}" for k in keys if regex.match(k))
+
+    with count_s3_requests() as naive_requests:
+        naive = [
+            p
+            for p in get_filepaths_from_s3_folder("s3://test/data/")
+            if regex.match(s3_path_to_bucket_key(p)[1])
+        ]
+
+    with count_s3_requests() as pattern_requests:
+        actual = get_filepaths_from_s3_pattern(f"s3://test/{glob}")
+
+    assert naive == actual == expected
+    assert len(expected) == 9
+    # The naive listing pages through all 10080 keys in the tree
+    assert naive_requests == {"ListObjects": 11}
+    # One delimiter listing of the days, then one listing per matched day
+    assert pattern_requests == {"ListObjectsV2": 4}
+
+
+@pytest.mark.parametrize(
+    "file_extension,exclude_zero_byte_files",
+    [(None, True), (None, False), ("json", True), (".py", False)],
+)
+def test_s3_listing_from_s3(files, file_extension, exclude_zero_byte_files):
+    listing = S3Listing.from_s3(
+        "s3://test/f1",
+        file_extension=file_extension,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+    )
+    assert listing.is_sorted
+    assert listing.get_filepaths() == get_filepaths_from_s3_folder(
+        "s3://test/f1",
+        file_extension=file_extension,
+        exclude_zero_byte_files=exclude_zero_byte_files,
+    )
+
+
+def test_s3_listing_columns_and_filters():
+    listing = S3Listing("test")
+    listing.append("b/2.json", 20, datetime(2024, 1, 2, tzinfo=timezone.utc))
+    listing.append("a/1.json", 10, 1000.0)
+    listing.append("b/10.csv", 0)
+    listing.append("a/é.json", 5)
+    assert not listing.is_sorted
+    assert len(listing) == 4
+    assert listing[0] == "s3://test/b/2.json"
+    assert listing.key(3) == "a/é.json"
+    assert listing.size(1) == 10
+    assert listing.last_modified(1) == 1000.0
+    assert listing.last_modified(0) == 1704153600.0
+    assert listing.total_size == 35
+
+    assert listing.sorted().get_filepaths() == [
+        "s3://test/a/1.json",
+        "s3://test/a/é.json",
+        "s3://test/b/10.csv",
+        "s3://test/b/2.json",
+    ]
+    assert listing.filter_prefix("a/").get_filepaths() == [
+        "s3://test/a/1.json",
+        "s3://test/a/é.json",
+    ]
+    assert list(listing.filter_extension("json")) == [
+        "s3://test/b/2.json",
+        "s3://test/a/1.json",
+        "s3://test/a/é.json",
+    ]
+    assert list(listing.filter_size(min_size=1, max_size=10)) == [
+        "s3://test/a/1.json",
+        "s3://test/a/é.json",
+    ]
+    assert list(listing.replace_prefix("b/", "c/")) == [
+        "s3://test/c/2.json",
+        "s3://test/c/10.csv",
+    ]
+
+
+def test_s3_listing_difference():
+    source = S3Listing("test")
+    for i in range(10):
+        source.append(f"data/{i}.json", i)
+    processed = S3Listing("test")
+    for i in (7, 3, 0, 11):
+        processed.append(f"out/{i}.json")
+
+    new = source.difference(processed.replace_prefix("out/", "data/"))
+    assert [new.key(i) for i in range(len(new))] == [
+        f"data/{i}.json" for i in (1, 2, 4, 5, 6, 8, 9)
+    ]
+    assert [new.size(i) for i in range(len(new))] == [1, 2, 4, 5, 6, 8, 9]
+    assert len(source.difference(S3Listing("test"))) == 10
+    assert len(source.difference(source)) == 0
+
+
+def test_s3_listing_sorted_in_chunks(monkeypatch):
+    monkeypatch.setattr(listing_module, "SORT_CHUNK_SIZE", 7)
+    keys = [f"data/{(i * 37) % 100}.json" for i in range(100)] + ["data/5.json"]
+    listing = S3Listing("test")
+    for i, k in enumerate(keys):
+        listing.append(k, i)
+    assert not listing.is_sorted
+
+    ordered = listing.sorted()
+    assert ordered.is_sorted
+    assert [ordered.key(i) for i in range(len(ordered))] == sorted(keys)
+    # Objects keep their sizes, and equal keys keep their order
+    i = sorted(keys).index("data/5.json")
+    assert [ordered.size(i), ordered.size(i + 1)] == [keys.index("data/5.json"), 100]
+    assert len(ordered.difference(listing)) == 0
+
+
+@pytest.mark.slow
+def test_s3_listing_memory():
+    """
+    Benchmark of the memory used to hold a listing of 1M objects, compared to a
+    list of (s3_path, size, last_modified) tuples
+    """
+    n = 1_000_000
+    keys = [f"data/day={i % 28:02}/part-{i:07}.jsonl.gz" for i in range(n)]
+
+    tracemalloc.start()
+    tuples = [
+        (f"s3://test/{k}", 1024 + i, 1704153600.0 + i) for i, k in enumerate(keys)
+    ]
+    tuples_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    listing = S3Listing("test")
+    for i, k in enumerate(keys):
+        listing.append(k, 1024 + i, 1704153600.0 + i)
+    listing_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(listing) == n
+    assert listing[n - 1] == tuples[-1][0]
+    assert listing.size(n - 1) == tuples[-1][1]
+    # About 36 bytes of key and 24 bytes of columns per object against about
+    # 200 bytes for each tuple, its str and its numbers
+    assert listing_bytes < tuples_bytes / 2
+    assert listing.nbytes < tuples_bytes / 2
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from dataengineeringutils3.db import SelectQuerySet
+from dataengineeringutils3.export import export_query_to_s3
+from dataengineeringutils3.loader import JsonNlBulkLoader, load_jsonl_from_s3_to_db
+from dataengineeringutils3.reader import JsonNlSplitFileReader
+from dataengineeringutils3.storage import get_backend
+from dataengineeringutils3.writer import JsonNlSplitFileWriter
+from tests.mocks import SlowConnection
+
+
+@pytest.fixture
+def target_factory(tmp_path):
+    """Returns a function that opens a connection to an empty people table"""
+    db_path = tmp_path / "target.db"
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, score REAL)"
+    )
+    connection.close()
+
+    def connection_factory():
+        return sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+
+    return connection_factory
+
+
+def target_rows(target_factory):
+    connection = target_factory()
+    rows = connection.execute("SELECT * FROM people ORDER BY id").fetchall()
+    connection.close()
+    return rows
+
+
+def write_people(s3_folder_path, n, chunk_size=1000):
+    with JsonNlSplitFileWriter(s3_folder_path, "people", chunk_size=chunk_size) as w:
+        for i in range(0, n, 100):
+            w.write_lines(
+                [
+                    json.dumps({"id": j, "name": f"person {j}", "score": j / 4})
+                    for j in range(i + 1, min(i + 100, n) + 1)
+                ]
+            )
+
+
+def test_load_jsonl_from_s3_to_db(sqlite_connection_factory, target_factory, mem):
+    qs = SelectQuerySet(
+        sqlite_connection_factory().cursor(), "SELECT * FROM people", 100
+    )
+    export_query_to_s3(qs, "mem://bucket/people/", "people", rows_per_file=300)
+
+    stats = load_jsonl_from_s3_to_db(
+        "mem://bucket/people/",
+        target_factory,
+        "INSERT INTO people VALUES (?, ?, ?)",
+        columns=["id", "name", "score"],
+        batch_size=64,
+        commit_every=3,
+    )
+    assert stats["files"] == 4
+    assert stats["rows"] == 1000
+    # Batches span files: 15 of 64 rows and a last one of 40
+    assert stats["batches"] == 16
+    assert stats["commits"] == 6
+    assert target_rows(target_factory) == [
+        (i, f"person {i}", i / 4) for i in range(1, 1001)
+    ]
+
+
+def test_bulk_loader_named_params_and_connections(target_factory, mem):
+    write_people("mem://bucket/people/", 1000, chunk_size=200)
+    opened = []
+
+    def connection_factory():
+        opened.append(target_factory())
+        return opened[-1]
+
+    loader = JsonNlBulkLoader(
+        connection_factory,
+        "INSERT INTO people VALUES (:id, :name, :score)",
+        batch_size=50,
+        num_connections=3,
+    )
+    stats = loader.load("mem://bucket/people/")
+    assert stats["rows"] == 1000
+    assert len(opened) == 3
+    assert [r[0] for r in target_rows(target_factory)] == list(range(1, 1001))
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        # Connections are closed after the load
+        opened[0].execute("SELECT 1")
+
+
+def test_bulk_loader_record_to_params(target_factory, mem):
+    write_people("mem://bucket/people/", 10)
+    loader = JsonNlBulkLoader(
+        target_factory,
+        "INSERT INTO people (id, name) VALUES (?, ?)",
+        record_to_params=lambda r: (r["id"], r["name"].upper()),
+    )
+    loader.load("mem://bucket/people/")
+    assert target_rows(target_factory)[0] == (1, "PERSON 1", None)
+
+    with pytest.raises(ValueError):
+        JsonNlBulkLoader(
+            target_factory, "", columns=["id"], record_to_params=lambda r: r
+        )
+
+
+def test_bulk_loader_errors(target_factory, mem):
+    write_people("mem://bucket/people/", 1000, chunk_size=100)
+    # Duplicate of a row in a later file
+    with JsonNlSplitFileWriter("mem://bucket/people/", "zzz") as w:
+        w.write_line(json.dumps({"id": 5, "name": "duplicate", "score": 0}))
+
+    loader = JsonNlBulkLoader(
+        target_factory,
+        "INSERT INTO people VALUES (:id, :name, :score)",
+        batch_size=100,
+        commit_every=1000,
+        decode_workers=1,
+    )
+    with pytest.raises(sqlite3.IntegrityError):
+        loader.load("mem://bucket/people/")
+    # Nothing was committed, so everything was rolled back
+    assert target_rows(target_factory) == []
+
+    get_backend("mem://").write_bytes("mem://bucket/bad/part-0.jsonl", b"{not json")
+    with pytest.raises(json.JSONDecodeError):
+        loader.load("mem://bucket/bad/")
+
+    # The loader can be reused after a failed load
+    assert loader.load("mem://bucket/empty/")["rows"] == 0
+
+
+@pytest.mark.benchmark
+def test_bulk_loader_speed(target_factory, mem):
+    n = 5000
+    write_people("mem://bucket/people/", n, chunk_size=1000)
+    insert_query = "INSERT INTO people VALUES (:id, :name, :score)"
+
+    def connection_factory():
+        return SlowConnection(target_factory(), latency=0.0005)
+
+    # A row at a time
+    connection = connection_factory()
+    start = time.perf_counter()
+    for record in JsonNlSplitFileReader("mem://bucket/people/"):
+        connection.execute(insert_query, record)
+    connection.commit()
+    row_at_a_time = n / (time.perf_counter() - start)
+    connection.execute("DELETE FROM people")
+    connection.commit()
+    connection.close()
+
+    stats = load_jsonl_from_s3_to_db(
+        "mem://bucket/people/", connection_factory, insert_query, batch_size=500
+    )
+    assert stats["rows"] == n
+    assert stats["rows_per_second"] > row_at_a_time * 5
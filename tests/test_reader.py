@@ -0,0 +1,90 @@
+import json
+import time
+
+import pytest
+
+from dataengineeringutils3.reader import JsonNlSplitFileReader, _natural_sort_key
+from dataengineeringutils3.writer import JsonNlSplitFileWriter
+
+S3_BASEPATH = "s3://test/dataset/"
+
+
+def write_dataset(num_lines, chunk_size):
+    with JsonNlSplitFileWriter(S3_BASEPATH, "test-file", chunk_size=chunk_size) as w:
+        for i in range(num_lines):
+            w.write_line(json.dumps({"i": i}))
+    return w.num_files
+
+
+def test_natural_sort_key():
+    paths = ["s3://b/f-10.jsonl.gz", "s3://b/f-2.jsonl.gz", "s3://b/f-1.jsonl.gz"]
+    assert sorted(paths, key=_natural_sort_key) == [
+        "s3://b/f-1.jsonl.gz",
+        "s3://b/f-2.jsonl.gz",
+        "s3://b/f-10.jsonl.gz",
+    ]
+
+
+@pytest.mark.parametrize("prefetch", [1, 3, 20])
+def test_json_nl_split_file_reader_ordered(s3, bucket, prefetch):
+    num_files = write_dataset(250, 20)
+    assert num_files == 13
+
+    reader = JsonNlSplitFileReader(S3_BASEPATH, "jsonl.gz", prefetch=prefetch)
+    assert [r["i"] for r in reader] == list(range(250))
+    assert reader.num_files == 13
+    assert reader.total_lines == 250
+
+
+def test_json_nl_split_file_reader_unordered(s3, bucket):
+    write_dataset(250, 20)
+
+    reader = JsonNlSplitFileReader(S3_BASEPATH, prefetch=4, ordered=False)
+    assert sorted(r["i"] for r in reader) == list(range(250))
+
+
+def test_json_nl_split_file_reader_iter_parts(s3, bucket):
+    write_dataset(5, 2)
+    s3.Object("test", "dataset/notes.txt").put(Body="not json")
+
+    reader = JsonNlSplitFileReader(S3_BASEPATH, "jsonl.gz", line_transform=str)
+    parts = list(reader.iter_parts())
+    assert [p for p, _ in parts] == [
+        f"{S3_BASEPATH}test-file-{i}.jsonl.gz" for i in range(3)
+    ]
+    assert parts[0][1] == ['{"i": 0}', '{"i": 1}']
+
+
+def test_json_nl_split_file_reader_early_exit(s3, bucket):
+    write_dataset(100, 10)
+
+    reader = JsonNlSplitFileReader(S3_BASEPATH, prefetch=2)
+    records = iter(reader)
+    assert next(records) == {"i": 0}
+    records.close()
+    assert reader.num_files == 1
+
+
+def test_json_nl_split_file_reader_prefetch_limit(s3, bucket, monkeypatch):
+    write_dataset(100, 10)
+    reader = JsonNlSplitFileReader(S3_BASEPATH, prefetch=3)
+    read_part = reader._read_part
+    reads = []
+
+    def counting_read_part(s3_client, s3_path):
+        reads.append(s3_path)
+        return read_part(s3_client, s3_path)
+
+    monkeypatch.setattr(reader, "_read_part", counting_read_part)
+    parts = reader.iter_parts()
+    next(parts)
+    # The part being consumed and two read ahead
+    time.sleep(0.2)
+    assert len(reads) == 3
+    assert sum(1 for _ in parts) == 9
+    assert len(reads) == 10
+
+
+def test_json_nl_split_file_reader_invalid_prefetch():
+    with pytest.raises(ValueError):
+        JsonNlSplitFileReader(S3_BASEPATH, prefetch=0)
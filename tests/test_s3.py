@@ -21,9 +21,21 @@ from dataengineeringutils3.s3 import (
     write_local_folder_to_s3,
     write_s3_file_to_local,
     write_s3_folder_to_local,
+    get_object_bytes_parallel,
+    write_s3_file_to_local_parallel,
+    read_json_many,
+    read_yaml_many,
+    write_json_many,
+    write_large_local_file_to_s3,
+    MIN_UPLOAD_PART_SIZE,
 )
+from dataengineeringutils3.concurrency import AdaptiveConcurrencyLimiter
 from pathlib import Path
 
+import boto3
+
+from tests.helpers import count_s3_requests
+
 bucket_name = "test"
 
 
@@ -369,3 +381,222 @@ def test_write_s3_folder_to_local(s3, bucket, tmpdir):
         "test-folder/folder/test-file-2.txt",
         "test-folder/test-file-1.txt",
     ]
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_folder_functions_filter_files(s3, bucket, tmp_path, concurrent):
+    limiter = None
+    if concurrent:
+        limiter = AdaptiveConcurrencyLimiter(initial_concurrency=4, max_concurrency=4)
+    local = tmp_path / "local"
+    (local / "sub").mkdir(parents=True)
+    (local / "a.json").write_text("a")
+    (local / "sub" / "b.json").write_text("b")
+    (local / "empty.json").write_text("")
+    (local / "c.txt").write_text("c")
+
+    write_local_folder_to_s3(
+        local,
+        "s3://test/up",
+        limiter=limiter,
+        file_extension="json",
+        exclude_zero_byte_files=True,
+    )
+    assert get_filepaths_from_s3_folder("s3://test/up") == [
+        "s3://test/up/a.json",
+        "s3://test/up/sub/b.json",
+    ]
+
+    copy_s3_folder_contents_to_new_folder(
+        "s3://test/up", "s3://test/copy", limiter=limiter, file_extension=".json"
+    )
+    s3.Object(bucket_name, "copy/notes.txt").put(Body="n")
+    s3.Object(bucket_name, "copy/empty.json").put(Body="")
+
+    out = tmp_path / "out"
+    write_s3_folder_to_local(
+        "s3://test/copy",
+        out,
+        limiter=limiter,
+        file_extension=".json",
+        exclude_zero_byte_files=True,
+    )
+    assert sorted(str(p.relative_to(out)) for p in out.rglob("*.*")) == [
+        "copy/a.json",
+        "copy/sub/b.json",
+    ]
+
+
+@pytest.mark.parametrize("part_size", [100, 1000, 4096, 10**6])
+def test_get_object_bytes_parallel(s3, bucket, part_size):
+    body = os.urandom(10000)
+    s3.Object(bucket_name, "large/file.bin").put(Body=body)
+
+    actual = get_object_bytes_parallel(
+        "s3://test/large/file.bin", part_size=part_size, max_concurrency=4
+    )
+    assert isinstance(actual, bytearray)
+    assert actual == body
+
+    view = get_object_bytes_parallel(
+        "s3://test/large/file.bin", part_size=part_size, as_memoryview=True
+    )
+    assert isinstance(view, memoryview)
+    assert view.tobytes() == body
+
+
+def test_get_object_bytes_parallel_empty_object(s3, bucket):
+    s3.Object(bucket_name, "empty.bin").put(Body=b"")
+    assert get_object_bytes_parallel("s3://test/empty.bin") == b""
+
+    with pytest.raises(ValueError):
+        get_object_bytes_parallel("s3://test/empty.bin", part_size=0)
+
+
+def test_write_s3_file_to_local_parallel(s3, bucket, tmpdir):
+    body = os.urandom(5000)
+    s3.Object(bucket_name, "large/file.bin").put(Body=body)
+    s3.Object(bucket_name, "empty.bin").put(Body=b"")
+
+    local = Path(tmpdir) / "subfolder" / "file.bin"
+    out = write_s3_file_to_local_parallel(
+        "s3://test/large/file.bin", local, part_size=512
+    )
+    assert out == str(local)
+    assert local.read_bytes() == body
+
+    with pytest.raises(FileExistsError):
+        write_s3_file_to_local_parallel("s3://test/large/file.bin", local)
+
+    write_s3_file_to_local_parallel("s3://test/empty.bin", local, overwrite=True)
+    assert local.read_bytes() == b""
+
+
+def test_write_s3_file_to_local_parallel_failure(s3, bucket, tmp_path):
+    s3.Object(bucket_name, "large/file.bin").put(Body=os.urandom(5000))
+    local = tmp_path / "file.bin"
+    local.write_bytes(b"old")
+
+    def fail_second_range(params, **kwargs):
+        if params.get("Range", "").startswith("bytes=512-"):
+            raise ConnectionError("link dropped")
+
+    events = boto3._get_default_session().events
+    events.register("before-parameter-build.s3.GetObject", fail_second_range)
+    try:
+        with pytest.raises(ConnectionError):
+            write_s3_file_to_local_parallel(
+                "s3://test/large/file.bin", local, overwrite=True, part_size=512
+            )
+    finally:
+        events.unregister("before-parameter-build.s3.GetObject", fail_second_range)
+    # The existing file is untouched and no temporary file is left behind
+    assert local.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [local]
+
+
+def test_read_json_many(s3, bucket):
+    for i in range(20):
+        s3.Object(bucket_name, f"f/{i}.json").put(Body=json.dumps({"i": i}))
+    s3.Object(bucket_name, "f/bad.json").put(Body="{not json")
+
+    paths = [f"s3://test/f/{i}.json" for i in range(20)]
+    paths += ["s3://test/f/bad.json", "s3://test/f/missing.json"]
+    data, errors = read_json_many(paths, max_workers=4)
+
+    assert data == [{"i": i} for i in range(20)] + [None, None]
+    assert sorted(errors) == ["s3://test/f/bad.json", "s3://test/f/missing.json"]
+    assert isinstance(errors["s3://test/f/bad.json"], json.JSONDecodeError)
+
+
+def test_read_yaml_many(s3, bucket):
+    s3.Object(bucket_name, "a.yaml").put(Body=yaml.dump({"a": 1}))
+    s3.Object(bucket_name, "b.yaml").put(Body=yaml.dump([1, 2]))
+
+    data, errors = read_yaml_many(["s3://test/b.yaml", "s3://test/a.yaml"])
+    assert data == [[1, 2], {"a": 1}]
+    assert errors == {}
+
+
+def test_write_json_many(s3, bucket):
+    to_write = {f"s3://test/out/{i}.json": {"i": i} for i in range(10)}
+    responses, errors = write_json_many(to_write, indent=2)
+
+    assert errors == {}
+    assert len(responses) == 10
+    for s3_path, expected in to_write.items():
+        assert read_json_from_s3(s3_path) == expected
+    body = s3.Object(bucket_name, "out/0.json").get()["Body"].read()
+    assert body == json.dumps({"i": 0}, indent=2).encode("utf-8")
+
+    responses, errors = write_json_many(
+        [("s3://test/ok.json", [1]), ("s3://missing-bucket/x.json", [2])]
+    )
+    assert responses[0] is not None and responses[1] is None
+    assert list(errors) == ["s3://missing-bucket/x.json"]
+
+
+@pytest.mark.parametrize("checksum_algorithm", [None, "SHA256"])
+def test_write_large_local_file_to_s3(s3, bucket, tmp_path, checksum_algorithm):
+    body = os.urandom(2 * MIN_UPLOAD_PART_SIZE + 1000)
+    local = tmp_path / "large.bin"
+    local.write_bytes(body)
+
+    with count_s3_requests() as requests:
+        write_large_local_file_to_s3(
+            local,
+            "s3://test/large.bin",
+            part_size=MIN_UPLOAD_PART_SIZE,
+            checksum_algorithm=checksum_algorithm,
+        )
+    assert requests["UploadPart"] == 3
+    assert s3.Object(bucket_name, "large.bin").get()["Body"].read() == body
+    assert not (tmp_path / "large.bin.upload.json").exists()
+
+    with pytest.raises(ValueError):
+        write_large_local_file_to_s3(local, "s3://test/large.bin")
+    with pytest.raises(ValueError):
+        write_large_local_file_to_s3(
+            local, "s3://test/other.bin", part_size=MIN_UPLOAD_PART_SIZE - 1
+        )
+
+
+def test_write_large_local_file_to_s3_resume(s3, bucket, tmp_path):
+    body = os.urandom(3 * MIN_UPLOAD_PART_SIZE)
+    local = tmp_path / "large.bin"
+    local.write_bytes(body)
+    state_file = tmp_path / "state.json"
+
+    def fail_part_two(params, **kwargs):
+        if params.get("PartNumber") == 2:
+            raise ConnectionError("link dropped")
+
+    events = boto3._get_default_session().events
+    events.register("before-parameter-build.s3.UploadPart", fail_part_two)
+    try:
+        with pytest.raises(ConnectionError):
+            write_large_local_file_to_s3(
+                local,
+                "s3://test/large.bin",
+                part_size=MIN_UPLOAD_PART_SIZE,
+                state_file_path=state_file,
+            )
+    finally:
+        events.unregister("before-parameter-build.s3.UploadPart", fail_part_two)
+
+    state = json.loads(state_file.read_text())
+    assert sorted(state["parts"]) == ["1", "3"]
+    assert not check_for_s3_file("s3://test/large.bin")
+
+    with count_s3_requests() as requests:
+        write_large_local_file_to_s3(
+            local,
+            "s3://test/large.bin",
+            part_size=MIN_UPLOAD_PART_SIZE,
+            state_file_path=state_file,
+        )
+    # The existing upload is resumed and only the missing part is sent
+    assert requests["CreateMultipartUpload"] == 0
+    assert requests["UploadPart"] == 1
+    assert s3.Object(bucket_name, "large.bin").get()["Body"].read() == body
+    assert not state_file.exists()
@@ -0,0 +1,249 @@
+import asyncio
+import json
+
+import boto3
+import pytest
+import yaml
+
+from dataengineeringutils3 import s3_async
+from dataengineeringutils3.s3_async import AsyncS3
+
+bucket_name = "test"
+
+
+def run(coro_func, **kwargs):
+    """Runs coro_func(s3) inside an AsyncS3 context using the executor backend"""
+
+    async def main():
+        async with AsyncS3(use_aiobotocore=False, **kwargs) as s3:
+            return await coro_func(s3)
+
+    return asyncio.run(main())
+
+
+def test_async_read_write(s3, bucket):
+    async def main(as3):
+        await as3.write_json_to_s3({"a": 1}, "s3://test/one.json")
+        await as3.gzip_string_write_to_s3("text", "s3://test/two.txt.gz")
+        return (
+            await as3.read_json_from_s3("s3://test/one.json"),
+            await as3.get_object_body("s3://test/one.json"),
+            await as3.get_object_bytes("s3://test/two.txt.gz"),
+        )
+
+    data, body, gz = run(main)
+    assert data == {"a": 1}
+    assert body == json.dumps({"a": 1})
+    assert gz[:2] == b"\x1f\x8b"
+
+
+def test_async_read_yaml(s3, bucket):
+    s3.Object(bucket_name, "config.yaml").put(Body=yaml.dump({"a": [1, 2]}))
+    assert run(lambda as3: as3.read_yaml_from_s3("s3://test/config.yaml")) == {
+        "a": [1, 2]
+    }
+
+
+def test_async_check_for_s3_files(s3, bucket):
+    for i in range(0, 200, 2):
+        s3.Object(bucket_name, f"f/{i}.json").put(Body="{}")
+
+    paths = [f"s3://test/f/{i}.json" for i in range(200)]
+    exists = run(lambda as3: as3.check_for_s3_files(paths), max_concurrency=16)
+    assert exists == [i % 2 == 0 for i in range(200)]
+
+
+def test_async_folder_operations(s3, bucket):
+    for i in range(20):
+        s3.Object(bucket_name, f"src/{i}.json").put(Body=str(i))
+    s3.Object(bucket_name, "src/empty.json").put(Body="")
+
+    async def main(as3):
+        await as3.copy_s3_folder_contents_to_new_folder(
+            "s3://test/src", "s3://test/dest", exclude_zero_byte_files=True
+        )
+        copied = await as3.get_filepaths_from_s3_folder("s3://test/dest/")
+        bodies = await as3.get_object_bodies(copied)
+        await as3.delete_s3_folder_contents("s3://test/src")
+        return copied, bodies
+
+    copied, bodies = run(main)
+    assert copied == [f"s3://test/dest/{i}.json" for i in sorted(map(str, range(20)))]
+    assert bodies == sorted(map(str, range(20)))
+    assert [o.key for o in s3.Bucket(bucket_name).objects.filter(Prefix="src/")] == []
+
+
+def test_async_local_files(s3, bucket, tmp_path):
+    local = tmp_path / "file.txt"
+    local.write_text("content")
+
+    async def main(as3):
+        await as3.write_local_file_to_s3(str(local), "s3://test/file.txt")
+        await as3.write_s3_file_to_local("s3://test/file.txt", tmp_path / "out.txt")
+        return await as3.check_for_s3_file("s3://test/file.txt")
+
+    assert run(main)
+    assert (tmp_path / "out.txt").read_text() == "content"
+
+
+def test_async_errors_propagate(s3, bucket):
+    with pytest.raises(Exception):
+        run(lambda as3: as3.get_object_body("s3://test/missing.json"))
+
+    results = run(
+        lambda as3: as3.gather(
+            [as3.get_object_body("s3://test/missing.json")], return_exceptions=True
+        )
+    )
+    assert isinstance(results[0], Exception)
+
+
+def test_async_invalid_concurrency():
+    with pytest.raises(ValueError):
+        AsyncS3(max_concurrency=0)
+
+
+class FakeAioStream:
+    def __init__(self, body):
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.body.close()
+
+    async def read(self):
+        return self.body.read()
+
+
+class FakeAioClient:
+    """Async client with aiobotocore's interface calling a boto3 client"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.client = boto3.client("s3")
+        self.calls = []
+        self.closed = False
+
+    async def __aenter__(self):
+        # Opening a real client awaits, letting other tasks run
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *args):
+        self.closed = True
+
+    def __getattr__(self, operation):
+        async def call(**kwargs):
+            self.calls.append(operation)
+            resp = getattr(self.client, operation)(**kwargs)
+            if "Body" in resp:
+                resp["Body"] = FakeAioStream(resp["Body"])
+            return resp
+
+        return call
+
+
+class FakeAioSession:
+    def __init__(self):
+        self.clients = []
+
+    def create_client(self, service_name, **kwargs):
+        self.clients.append(FakeAioClient(**kwargs))
+        return self.clients[-1]
+
+
+def test_async_aiobotocore_backend(s3, bucket, monkeypatch):
+    session = FakeAioSession()
+    monkeypatch.setattr(s3_async, "get_session", lambda: session)
+    monkeypatch.setattr(s3_async, "AioConfig", dict, raising=False)
+
+    async def main():
+        async with AsyncS3(max_concurrency=4) as as3:
+            assert as3.use_aiobotocore
+            await as3.write_json_to_s3({"a": 1}, "s3://test/one.json")
+            return (
+                await as3.read_json_from_s3("s3://test/one.json"),
+                await as3.check_for_s3_files(
+                    ["s3://test/one.json", "s3://test/two.json"]
+                ),
+            )
+
+    assert asyncio.run(main()) == ({"a": 1}, [True, False])
+    [client] = session.clients
+    assert client.kwargs["config"] == {"max_pool_connections": 4}
+    assert client.calls == ["put_object", "get_object", "head_object", "head_object"]
+    assert client.closed
+
+
+def test_async_closes_boto3_client(s3, bucket):
+    closed = []
+
+    async def main():
+        as3 = AsyncS3(use_aiobotocore=False)
+        async with as3:
+            as3._client.close = lambda: closed.append(True)
+        return as3
+
+    assert asyncio.run(main())._client is None
+    assert closed == [True]
+
+
+ENDPOINT_URL = "http://s3.local.test"
+
+
+@pytest.fixture
+def custom_endpoint(monkeypatch):
+    # moto serves S3 requests sent to this endpoint as well as AWS's
+    monkeypatch.setenv("MOTO_S3_CUSTOM_ENDPOINTS", ENDPOINT_URL)
+
+
+def test_async_endpoint_url(custom_endpoint, s3, bucket, tmp_path):
+    local = tmp_path / "file.txt"
+    local.write_text("content")
+    urls = []
+
+    def record_url(request, **kwargs):
+        urls.append(request.url)
+
+    async def main(as3):
+        await as3.write_local_file_to_s3(str(local), "s3://test/a/file.txt")
+        await as3.write_large_local_file_to_s3(str(local), "s3://test/b/file.txt")
+        await as3.write_local_folder_to_s3(str(tmp_path), "s3://test/c/")
+        await as3.copy_s3_folder_contents_to_new_folder("s3://test/a", "s3://test/d")
+        await as3.write_s3_file_to_local("s3://test/a/file.txt", tmp_path / "1.txt")
+        await as3.write_s3_folder_to_local("s3://test/d", tmp_path / "out")
+        await as3.write_s3_file_to_local_parallel(
+            "s3://test/b/file.txt", tmp_path / "2.txt"
+        )
+        return await as3.get_object_bytes_parallel("s3://test/c/file.txt")
+
+    events = boto3._get_default_session().events
+    events.register("before-send.s3", record_url)
+    try:
+        assert run(main, endpoint_url=ENDPOINT_URL) == b"content"
+    finally:
+        events.unregister("before-send.s3", record_url)
+    assert (tmp_path / "out" / "d" / "file.txt").read_text() == "content"
+    assert (tmp_path / "2.txt").read_text() == "content"
+    assert len(urls) > 10
+    assert all(url.startswith(ENDPOINT_URL) for url in urls)
+
+
+def test_async_opens_one_client(s3, bucket, monkeypatch):
+    session = FakeAioSession()
+    monkeypatch.setattr(s3_async, "get_session", lambda: session)
+    monkeypatch.setattr(s3_async, "AioConfig", dict, raising=False)
+    paths = [f"s3://test/{i}.json" for i in range(50)]
+
+    async def main():
+        as3 = AsyncS3(max_concurrency=8)
+        # The first operations all start before any client has been opened
+        exists = await as3.check_for_s3_files(paths)
+        await as3.close()
+        return exists
+
+    assert asyncio.run(main()) == [False] * 50
+    assert len(session.clients) == 1
+    assert session.clients[0].closed
@@ -0,0 +1,269 @@
+import gzip
+import json
+
+import pytest
+
+from dataengineeringutils3 import storage
+from dataengineeringutils3.cache import S3ObjectCache
+from dataengineeringutils3.concurrency import AdaptiveConcurrencyLimiter
+from dataengineeringutils3.reader import JsonNlSplitFileReader
+from dataengineeringutils3.s3 import (
+    check_for_s3_file,
+    copy_s3_folder_contents_to_new_folder,
+    copy_s3_object,
+    delete_s3_folder_contents,
+    get_filepaths_from_s3_folder,
+    get_object_body,
+    get_object_bytes_parallel,
+    gzip_string_write_to_s3,
+    read_json_from_s3,
+    read_json_many,
+    read_yaml_many,
+    write_json_many,
+    write_json_to_s3,
+    write_large_local_file_to_s3,
+    write_local_file_to_s3,
+    write_local_folder_to_s3,
+    write_s3_file_to_local,
+    write_s3_file_to_local_parallel,
+    write_s3_folder_to_local,
+)
+from dataengineeringutils3.storage import (
+    LocalBackend,
+    MemoryBackend,
+    S3Backend,
+    StorageBackend,
+    get_backend,
+    register_backend,
+    split_url,
+)
+from dataengineeringutils3.writer import BytesSplitFileWriter, JsonNlSplitFileWriter
+
+
+@pytest.fixture(params=["file", "mem"])
+def base_url(request, tmp_path, mem):
+    if request.param == "file":
+        return f"file://{tmp_path}/bucket"
+    return "mem://bucket"
+
+
+def test_get_backend():
+    assert split_url("mem://bucket/key") == ("mem", "bucket/key")
+    assert split_url("bucket/key") == ("s3", "bucket/key")
+    assert isinstance(get_backend("s3://bucket/key"), S3Backend)
+    assert isinstance(get_backend("bucket/key"), S3Backend)
+    assert isinstance(get_backend("file:///tmp/key"), LocalBackend)
+    assert isinstance(get_backend("mem://bucket/key"), MemoryBackend)
+    with pytest.raises(ValueError):
+        get_backend("gs://bucket/key")
+
+    backend = MemoryBackend()
+    register_backend("test", backend)
+    try:
+        assert get_backend("test://bucket/key") is backend
+    finally:
+        storage._BACKENDS.pop("test")
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class ReadOnlyBackend(StorageBackend):
+        def read_bytes(self, path):
+            return b""
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
+
+
+def test_backend_operations(base_url):
+    backend = get_backend(base_url)
+    path = f"{base_url}/folder/a.bin"
+    assert not backend.exists(path)
+    backend.write_bytes(path, memoryview(b"abc"))
+    backend.write_bytes(path, b"abcd")
+    assert backend.read_bytes(path) == b"abcd"
+    backend.copy(path, f"{base_url}/folder/sub/b.bin")
+    assert backend.list_objects(f"{base_url}/folder/") == [
+        (f"{base_url}/folder/a.bin", 4),
+        (f"{base_url}/folder/sub/b.bin", 4),
+    ]
+    backend.delete(path)
+    backend.delete(path)
+    assert not backend.exists(path)
+    with pytest.raises(FileNotFoundError):
+        backend.read_bytes(path)
+
+
+def test_local_backend_atomic_write(tmp_path):
+    backend = LocalBackend()
+    path = f"file://{tmp_path}/a.json"
+    backend.write_bytes(path, b"old")
+
+    def failing_write(f):
+        f.write(b"partial")
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        backend._replace_with(path, failing_write)
+    assert backend.read_bytes(path) == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["a.json"]
+
+
+def test_memory_backend_zero_copy(mem):
+    data = b"x" * 1000
+    mem.write_bytes("mem://bucket/a", data)
+    assert mem.read_bytes("mem://bucket/a") is data
+
+
+def test_s3_functions_with_backends(base_url):
+    write_json_to_s3({"a": 1}, f"{base_url}/from/a.json")
+    write_json_to_s3({"b": 2}, f"{base_url}/from/sub/b.json")
+    get_backend(base_url).write_bytes(f"{base_url}/from/empty.json", b"")
+
+    assert read_json_from_s3(f"{base_url}/from/a.json") == {"a": 1}
+    assert check_for_s3_file(f"{base_url}/from/a.json")
+    assert not check_for_s3_file(f"{base_url}/from/missing.json")
+    assert get_filepaths_from_s3_folder(f"{base_url}/from") == [
+        f"{base_url}/from/a.json",
+        f"{base_url}/from/sub/b.json",
+    ]
+
+    copy_s3_folder_contents_to_new_folder(f"{base_url}/from", f"{base_url}/to")
+    assert read_json_from_s3(f"{base_url}/to/sub/b.json") == {"b": 2}
+    assert len(get_filepaths_from_s3_folder(f"{base_url}/to", None, False)) == 3
+
+    delete_s3_folder_contents(f"{base_url}/from")
+    assert get_filepaths_from_s3_folder(f"{base_url}/from", None, False) == []
+
+
+def test_writers_and_reader_with_backends(base_url):
+    with JsonNlSplitFileWriter(f"{base_url}/json", "part", chunk_size=3) as w:
+        w.write_lines([json.dumps({"i": i}) for i in range(10)])
+        w.write_line(json.dumps({"i": 10}))
+
+    reader = JsonNlSplitFileReader(f"{base_url}/json")
+    assert list(reader) == [{"i": i} for i in range(11)]
+    assert reader.num_files == 2
+
+    with BytesSplitFileWriter(
+        f"{base_url}/bytes", "part", max_bytes=5, file_extension="jsonl.gz"
+    ) as f:
+        for i in range(3):
+            f.write(json.dumps({"i": i}).encode("utf-8") + b"\n")
+    paths = get_filepaths_from_s3_folder(f"{base_url}/bytes")
+    assert len(paths) == 3
+    body = get_backend(base_url).read_bytes(paths[0])
+    assert gzip.decompress(body) == b'{"i": 0}\n'
+
+    with BytesSplitFileWriter(
+        f"{base_url}/raw", "part", compress_on_upload=False, file_extension="txt"
+    ) as f:
+        f.write(b"some text")
+    assert get_backend(base_url).read_bytes(f"{base_url}/raw/part-0.txt") == (
+        b"some text"
+    )
+
+
+def test_s3_backend(s3, bucket):
+    backend = get_backend("s3://test/")
+    backend.write_bytes("s3://test/folder/a.txt", memoryview(b"abc"))
+    backend.copy("s3://test/folder/a.txt", "s3://test/folder/b.txt")
+    assert backend.read_bytes("s3://test/folder/b.txt") == b"abc"
+    assert backend.list_objects("s3://test/folder/") == [
+        ("s3://test/folder/a.txt", 3),
+        ("s3://test/folder/b.txt", 3),
+    ]
+    backend.delete("s3://test/folder/a.txt")
+    assert not backend.exists("s3://test/folder/a.txt")
+    assert backend.exists("s3://test/folder/b.txt")
+
+
+def test_object_functions_with_backends(base_url, tmp_path):
+    local = tmp_path / "local.bin"
+    local.write_bytes(b"x" * 100)
+    path = f"{base_url}/objects/x.bin"
+
+    write_local_file_to_s3(local, path)
+    with pytest.raises(ValueError):
+        write_local_file_to_s3(local, path)
+    with pytest.raises(ValueError):
+        write_large_local_file_to_s3(local, path)
+    write_large_local_file_to_s3(local, path, overwrite=True)
+    assert get_backend(base_url).read_bytes(path) == b"x" * 100
+
+    assert bytes(get_object_bytes_parallel(path, part_size=7)) == b"x" * 100
+    assert get_object_bytes_parallel(path, as_memoryview=True).nbytes == 100
+
+    write_s3_file_to_local(path, tmp_path / "down" / "x.bin")
+    write_s3_file_to_local_parallel(path, tmp_path / "down" / "y.bin")
+    with pytest.raises(FileExistsError):
+        write_s3_file_to_local_parallel(path, tmp_path / "down" / "y.bin")
+    assert (tmp_path / "down" / "x.bin").read_bytes() == b"x" * 100
+    assert (tmp_path / "down" / "y.bin").read_bytes() == b"x" * 100
+
+    gzip_string_write_to_s3("some text", f"{base_url}/objects/t.gz")
+    body = get_backend(base_url).read_bytes(f"{base_url}/objects/t.gz")
+    assert gzip.decompress(body) == b"some text"
+
+    # Only S3 objects are cached
+    cache = S3ObjectCache()
+    assert get_object_body(path, cache=cache) == "x" * 100
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_folder_functions_with_backends(base_url, tmp_path, concurrent):
+    limiter = AdaptiveConcurrencyLimiter(2, max_concurrency=4) if concurrent else None
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    (src / "a.txt").write_bytes(b"a")
+    (src / "sub" / "b.txt").write_bytes(b"bb")
+
+    write_local_folder_to_s3(src, f"{base_url}/up", limiter=limiter)
+    assert get_filepaths_from_s3_folder(f"{base_url}/up") == [
+        f"{base_url}/up/a.txt",
+        f"{base_url}/up/sub/b.txt",
+    ]
+    with pytest.raises(ValueError):
+        write_local_folder_to_s3(src, f"{base_url}/up", limiter=limiter)
+
+    down = tmp_path / "down"
+    write_s3_folder_to_local(f"{base_url}/up", down, limiter=limiter)
+    # Files keep the whole of their key under the local folder
+    key = split_url(f"{base_url}/up")[1].split("/", 1)[1]
+    assert (down / key / "a.txt").read_bytes() == b"a"
+    assert (down / key / "sub" / "b.txt").read_bytes() == b"bb"
+    with pytest.raises(FileExistsError):
+        write_s3_folder_to_local(f"{base_url}/up", down, limiter=limiter)
+
+
+def test_many_functions_with_backends(base_url):
+    paths = [f"{base_url}/many/{i}.json" for i in range(5)]
+    responses, errors = write_json_many({p: {"i": i} for i, p in enumerate(paths)})
+    assert errors == {}
+    assert len(responses) == 5
+
+    missing = f"{base_url}/many/missing.json"
+    data, errors = read_json_many(paths + [missing])
+    assert data == [{"i": i} for i in range(5)] + [None]
+    assert list(errors) == [missing]
+
+    data, errors = read_yaml_many(paths[:1])
+    assert data == [{"i": 0}]
+
+
+def test_copy_between_backends(s3, bucket, tmp_path, mem):
+    local = f"file://{tmp_path}/a.json"
+    write_json_to_s3({"a": 1}, local)
+    copy_s3_object(local, "s3://test/a.json")
+    copy_s3_object("s3://test/a.json", "mem://bucket/a.json")
+    copy_s3_object("mem://bucket/a.json", f"file://{tmp_path}/b.json")
+    assert read_json_from_s3("s3://test/a.json") == {"a": 1}
+    assert read_json_from_s3(f"file://{tmp_path}/b.json") == {"a": 1}
+
+    copy_s3_folder_contents_to_new_folder(
+        "s3://test/", "mem://bucket/copy/", limiter=AdaptiveConcurrencyLimiter()
+    )
+    assert read_json_from_s3("mem://bucket/copy/a.json") == {"a": 1}